@@ -0,0 +1,189 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import functools
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lmsusingselenium.replay import (StageTimer, start_services, run_pipeline, add_pipeline_arguments, command_profile,
+                                     within_command_budgets)
+from lmsusingselenium.profiler import CommandProfiler, parse_command_budgets
+
+# Full lecture pipeline against the offline fixture site and the mock LLM: navigation chain, player
+# start and the interaction loop, repeated --runs times, with p50/p95 per stage.
+# Example: python benchmarks/lecture_pipeline.py --runs 5 --lecture 2
+# Needs Chrome and chromedriver (set CHROMEDRIVER_PATH offline); runs headless unless --headed.
+# --profile-commands adds WebDriver command counts per step; --command-budget STEP=COUNT fails the
+# benchmark when any run's step goes over its count.
+
+INTERACTION_STEPS = ("extract_question_and_options", "answer_question_with_fallback", "select_answer_in_ui")
+STEP_STAGES = {"extract_question_and_options": "extract", "answer_question_with_fallback": "answer",
+               "select_answer_in_ui": "select"}
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    k = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+class StepTimings:
+    """Wraps the whynot interaction steps and records their exclusive time.
+
+    select_answer_in_ui extracts, answers and selects the next question of a multi-question
+    interaction itself, so nested steps are subtracted from the caller's time.
+    """
+
+    def __init__(self):
+        self.samples = {stage: [] for stage in STEP_STAGES.values()}
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def wrap(self, name, func):
+        stage = STEP_STAGES[name]
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            stack = getattr(self.local, "stack", None)
+            if stack is None:
+                stack = self.local.stack = []
+            stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                nested = stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+                with self.lock:
+                    self.samples[stage].append(elapsed - nested)
+        return timed
+
+    def install(self):
+        from lmsusingselenium import whynot
+
+        originals = {name: getattr(whynot, name) for name in INTERACTION_STEPS}
+        for name, func in originals.items():
+            setattr(whynot, name, self.wrap(name, func))
+        return originals
+
+    @staticmethod
+    def uninstall(originals):
+        from lmsusingselenium import whynot
+
+        for name, func in originals.items():
+            setattr(whynot, name, func)
+
+
+def clear_stored_answers(fixtures_dir):
+    """Drop stored answers for the fixture questions and the cached completions so every run goes
+    through the LLM"""
+    from lmsusingselenium.whynot import sanitize_filename, answer_folder
+    from edpuzzlesolver.providers import ProviderLayer
+
+    with open(os.path.join(fixtures_dir, "site.json"), encoding="utf-8") as f:
+        site = json.load(f)
+    for lecture in site["lectures"].values():
+        for interaction in lecture["interactions"]:
+            for question in interaction["questions"]:
+                path = os.path.join(answer_folder(), f"{sanitize_filename(question['question'])}.json")
+                if os.path.exists(path):
+                    os.remove(path)
+    ProviderLayer.clear_shared_cache()
+
+
+def summarize(values):
+    return {"count": len(values), "p50_seconds": round(percentile(values, 50), 3),
+            "p95_seconds": round(percentile(values, 95), 3), "max_seconds": round(max(values), 3) if values else 0.0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the lecture pipeline against local fixtures")
+    add_pipeline_arguments(parser)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--warm", action="store_true", help="keep stored and cached answers between runs")
+    parser.add_argument("--output", default=os.path.join("benchmarks", "results", "lecture_pipeline.json"))
+    args = parser.parse_args()
+    args.mock_llm = True
+    args.command_budgets = parse_command_budgets(args.command_budget)
+
+    server, mock = start_services(args)
+    site = server.RequestHandlerClass.site
+    steps = StepTimings()
+    originals = steps.install()
+    stages = {}
+    command_counts = {}
+    runs = []
+    try:
+        for run in range(1, args.runs + 1):
+            if not args.warm:
+                clear_stored_answers(args.fixtures)
+            site.reset()
+            CommandProfiler.shared().reset()
+            timer = StageTimer({})
+            start = time.perf_counter()
+            activity_id, answers, expected = run_pipeline(site, timer, args)
+            wall = time.perf_counter() - start
+            lecture = site.lecture(site.activities.get(activity_id, {}).get("lecture")) or {}
+            duration = lecture.get("duration")
+            for result in timer.results:
+                if result["ok"]:
+                    stages.setdefault(result["stage"], []).append(result["seconds"])
+            profile = command_profile(args)
+            for step, totals in (profile["steps"] if profile else {}).items():
+                command_counts.setdefault(step, []).append(totals["count"])
+            passed = within_command_budgets(args) and timer.passed
+            runs.append({
+                "run": run,
+                "passed": passed,
+                "wall_seconds": round(wall, 3),
+                "video_seconds": duration,
+                "wall_vs_video": round(wall / duration, 2) if duration else None,
+                "answers": len(answers),
+                "expected_answers": expected,
+                "correct": sum(1 for a in answers if a.get("correct")),
+                "stages": timer.results,
+                "commands": profile,
+            })
+            print(f"Run {run}: {wall:.1f}s wall for a {duration}s video, "
+                  f"{len(answers)}/{expected} answered, {'ok' if passed else 'FAILED'}")
+    finally:
+        steps.uninstall(originals)
+        server.shutdown()
+        mock.shutdown()
+
+    report = {
+        "runs": args.runs,
+        "selection": {k: getattr(args, k) for k in ("subject", "module", "week", "lecture")},
+        "dwell_seconds": args.dwell,
+        "warm_answers": args.warm,
+        "mock": dict(mock.RequestHandlerClass.behaviour.stats),
+        "stages": {name: summarize(values) for name, values in stages.items()},
+        "interaction_steps": {name: summarize(values) for name, values in steps.samples.items()},
+        "wall": summarize([r["wall_seconds"] for r in runs]),
+        "commands_per_step": {step: {"p50": percentile(counts, 50), "p95": percentile(counts, 95),
+                                     "budget": args.command_budgets.get(step)}
+                              for step, counts in command_counts.items()},
+        "passed": all(r["passed"] for r in runs),
+        "details": runs,
+    }
+    print(f"{'stage':<14}{'p50':>9}{'p95':>9}  n")
+    for name, row in list(report["stages"].items()) + list(report["interaction_steps"].items()):
+        print(f"{name:<14}{row['p50_seconds']:>9.2f}{row['p95_seconds']:>9.2f}  {row['count']}")
+    print(f"{'wall':<14}{report['wall']['p50_seconds']:>9.2f}{report['wall']['p95_seconds']:>9.2f}  {len(runs)}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+    print(f"Results written to {args.output}")
+    sys.exit(0 if report["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from edpuzzlesolver.llminit import LLMManager
+from edpuzzlesolver.mockllm import start_mock_server, as_text
+
+# Reproducible fallback / voting throughput run against the local mock LLM server.
+# Example: python benchmarks/llm_fallback.py --questions 200 --concurrency 8 --burst-429-every 10
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    k = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark LLMManager against the mock LLM server")
+    parser.add_argument("--config", default="config.ini")
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--mode", choices=["fallback", "vote"], default="fallback")
+    parser.add_argument("--latency", help="Override [mock_llm] latency distribution")
+    parser.add_argument("--error-rate", type=float)
+    parser.add_argument("--burst-429-every", type=int)
+    parser.add_argument("--output", default=os.path.join("benchmarks", "results", "llm_fallback.json"))
+    args = parser.parse_args()
+
+    manager = LLMManager(args.config)
+    settings = dict(manager.config.get('mock_llm', {}))
+    if args.latency:
+        settings['latency'] = args.latency
+    if args.error_rate is not None:
+        settings['error_rate'] = args.error_rate
+    if args.burst_429_every is not None:
+        settings['burst_429_every'] = args.burst_429_every
+    server = start_mock_server(settings)
+    manager.config.setdefault('mock_llm', {})
+    manager.config['mock_llm']['enabled'] = 'true'
+    manager.config['mock_llm']['port'] = str(server.server_address[1])
+
+    order = manager.DEFAULT_FALLBACK_ORDER
+    llm_instances = manager.setup_llm_with_fallback(order)
+    ensemble = manager.ensemble_settings()
+    options = ["alpha", "beta", "gamma", "delta"]
+
+    def one(i):
+        start = time.perf_counter()
+        if args.mode == "vote":
+            index, _, _ = manager.answer_with_vote(llm_instances, ensemble["providers"], f"Question {i}",
+                                                   options, ensemble["quorum"], ensemble["samples"])
+        else:
+            index, _ = manager.answer_with_fallback(llm_instances, order, f"Question {i}", options)
+        return time.perf_counter() - start, index is not None
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(one, range(args.questions)))
+    wall = time.perf_counter() - wall_start
+    server.shutdown()
+
+    latencies = [seconds for seconds, _ in results]
+    report = {
+        "mode": args.mode,
+        "providers": sorted(llm_instances),
+        "questions": args.questions,
+        "concurrency": args.concurrency,
+        "mock": {k: as_text(settings.get(k, "")) for k in ("latency", "error_rate", "burst_429_every", "burst_429_length", "seed")},
+        "server": server.RequestHandlerClass.behaviour.stats,
+        "answered": sum(1 for _, ok in results if ok),
+        "p50_seconds": percentile(latencies, 50),
+        "p95_seconds": percentile(latencies, 95),
+        "mean_seconds": statistics.mean(latencies) if latencies else 0.0,
+        "throughput_per_second": args.questions / wall if wall else 0.0,
+        "wall_seconds": wall,
+    }
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    main()
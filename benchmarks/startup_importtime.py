@@ -0,0 +1,79 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+# Startup import cost of the automation entry points, from `python -X importtime`.
+# Example: python benchmarks/startup_importtime.py --baseline benchmarks/results/startup_importtime.json
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure(module):
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=ROOT, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    packages = {}
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        match = LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = int(match.group(1)), int(match.group(2)), match.group(3), match.group(4)
+        top = name.split('.')[0]
+        packages[top] = packages.get(top, 0) + self_us
+        if len(indent) == 1:
+            # Top-level import of the measured process; cumulative already includes children
+            total_us += cumulative_us
+    return {
+        "module": module,
+        "ok": proc.returncode == 0,
+        "error": proc.stderr.strip().splitlines()[-1] if proc.returncode != 0 and proc.stderr.strip() else None,
+        "wall_seconds": wall,
+        "import_seconds": total_us / 1e6,
+        "by_package_seconds": {k: v / 1e6 for k, v in sorted(packages.items(), key=lambda kv: -kv[1])},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report python -X importtime breakdown for entry modules")
+    parser.add_argument("modules", nargs="*", default=["main", "lmsusingselenium.whynot", "edpuzzlesolver.llminit"])
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--output", default=os.path.join(ROOT, "benchmarks", "results", "startup_importtime.json"))
+    parser.add_argument("--baseline", help="Previous report; exit non-zero when import time regresses")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed fractional regression")
+    args = parser.parse_args()
+
+    reports = [measure(module) for module in args.modules]
+    for report in reports:
+        status = "ok" if report["ok"] else f"FAILED ({report['error']})"
+        print(f"\n{report['module']}: import {report['import_seconds']:.3f}s, process {report['wall_seconds']:.3f}s [{status}]")
+        for package, seconds in list(report["by_package_seconds"].items())[:args.top]:
+            print(f"  {package:<30} {seconds * 1000:8.1f} ms")
+
+    regressions = []
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = {r["module"]: r for r in json.load(f)["reports"]}
+        for report in reports:
+            previous = baseline.get(report["module"])
+            if previous and report["import_seconds"] > previous["import_seconds"] * (1 + args.tolerance):
+                regressions.append(f"{report['module']}: {previous['import_seconds']:.3f}s -> {report['import_seconds']:.3f}s")
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"python": sys.version.split()[0], "reports": reports}, f, indent=4)
+    print(f"\nReport written to {args.output}")
+
+    if regressions:
+        print("Import time regressions:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
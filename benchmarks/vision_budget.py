@@ -0,0 +1,105 @@
+import os
+import sys
+import glob
+import json
+import time
+import base64
+import argparse
+import configparser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from edpuzzlesolver.capture import Screenshot, CaptureSettings, shrink_screenshot
+
+# Vision extraction latency and accuracy per pixel budget / format, over saved screenshots.
+# Example: python benchmarks/vision_budget.py old/screenshots/*/*.png --labels labels.json --budgets 0,1000000,400000,150000
+# labels.json maps an image file name to its Question JSON ({"Question": ..., "Option 1": ...}).
+
+PROMPT = ("Extract the question and options from this image of a webpage. List each option exactly as it "
+          "appears, including any leading symbols like '*', one per line.")
+
+
+def accuracy(extracted, label):
+    """Share of ground-truth question/option strings that appear in the extracted text"""
+    if not label:
+        return None
+    expected = [value.strip().lower() for value in label.values() if isinstance(value, str) and value.strip()]
+    found = sum(1 for value in expected if value in extracted.lower())
+    return found / len(expected) if expected else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark vision extraction across pixel budgets")
+    parser.add_argument("images", nargs="+")
+    parser.add_argument("--budgets", default="0,1000000,600000,300000,150000")
+    parser.add_argument("--formats", default="png,jpeg")
+    parser.add_argument("--quality", type=int, default=80)
+    parser.add_argument("--roi", default="", help="left,top,right,bottom fractions applied before resizing")
+    parser.add_argument("--labels")
+    parser.add_argument("--base-url", default="https://api.groq.com/openai/v1",
+                        help="OpenAI-compatible endpoint (use http://127.0.0.1:8765/v1 for the mock)")
+    parser.add_argument("--model")
+    parser.add_argument("--output", default=os.path.join("benchmarks", "results", "vision_budget.json"))
+    args = parser.parse_args()
+
+    from openai import OpenAI
+    from dotenv import load_dotenv
+    load_dotenv()
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+    model = args.model or config.get('groq', 'VISION_MODEL', fallback='llama-3.2-90b-vision-preview')
+    client = OpenAI(base_url=args.base_url, api_key=os.getenv('GROQ_API_KEY') or "mock")
+
+    labels = {}
+    if args.labels:
+        with open(args.labels, "r", encoding="utf-8") as f:
+            labels = json.load(f)
+    roi = [float(v) for v in args.roi.split(',') if v.strip()] or None
+    paths = [p for pattern in args.images for p in glob.glob(pattern)]
+
+    results = []
+    for image_format in args.formats.split(','):
+        for budget in [int(b) for b in args.budgets.split(',')]:
+            settings = CaptureSettings(roi=roi, pixel_budget=budget, image_format=image_format, quality=args.quality)
+            latencies, scores, sizes = [], [], []
+            for path in paths:
+                with open(path, "rb") as f:
+                    original = Screenshot(base64_data=base64.b64encode(f.read()).decode('utf-8'))
+                start = time.perf_counter()
+                shot = shrink_screenshot(original, settings)
+                prepare = time.perf_counter() - start
+                start = time.perf_counter()
+                completion = client.chat.completions.create(
+                    model=model,
+                    temperature=0.0,
+                    messages=[{"role": "user", "content": [
+                        {"type": "text", "text": PROMPT},
+                        {"type": "image_url", "image_url": {"url": shot.data_url}},
+                    ]}],
+                )
+                latencies.append(prepare + time.perf_counter() - start)
+                sizes.append(len(shot.data))
+                score = accuracy(completion.choices[0].message.content or "", labels.get(os.path.basename(path)))
+                if score is not None:
+                    scores.append(score)
+            row = {
+                "format": image_format,
+                "pixel_budget": budget,
+                "images": len(paths),
+                "mean_bytes": sum(sizes) / len(sizes) if sizes else 0,
+                "mean_seconds": sum(latencies) / len(latencies) if latencies else 0,
+                "max_seconds": max(latencies) if latencies else 0,
+                "accuracy": sum(scores) / len(scores) if scores else None,
+            }
+            results.append(row)
+            print(f"{image_format:>5} budget={budget:>8}: {row['mean_seconds']:.2f}s avg, "
+                  f"{row['mean_bytes'] / 1024:.0f} KiB, accuracy={row['accuracy']}")
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"model": model, "roi": roi, "results": results}, f, indent=4)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import os
+import time
+import base64
+import queue
+import threading
+
+
+class Screenshot:
+    """One captured frame; decoded bytes and base64 text are each produced at most once"""
+
+    def __init__(self, base64_data=None, image_bytes=None, mime="image/png"):
+        self._base64 = base64_data
+        self._bytes = image_bytes
+        self.mime = mime
+        self.path = None
+        self.captured_at = time.time()
+
+    @property
+    def base64(self):
+        if self._base64 is None:
+            self._base64 = base64.b64encode(self._bytes).decode('utf-8')
+        return self._base64
+
+    @property
+    def data(self):
+        if self._bytes is None:
+            self._bytes = base64.b64decode(self._base64)
+        return self._bytes
+
+    @property
+    def data_url(self):
+        return f"data:{self.mime};base64,{self.base64}"
+
+
+ELEMENT_RECT_JS = """
+const rects = arguments[0].map(sel => document.querySelector(sel)).filter(el => el)
+    .map(el => el.getBoundingClientRect());
+if (!rects.length) return null;
+const left = Math.min(...rects.map(r => r.left)), top = Math.min(...rects.map(r => r.top));
+const right = Math.max(...rects.map(r => r.right)), bottom = Math.max(...rects.map(r => r.bottom));
+return {x: left + window.scrollX, y: top + window.scrollY, width: right - left, height: bottom - top};
+"""
+
+IFRAME_RECTS_JS = """
+return Array.from(document.querySelectorAll('iframe')).map(f => {
+    const r = f.getBoundingClientRect();
+    return {x: r.left + window.scrollX, y: r.top + window.scrollY};
+});
+"""
+
+
+class CaptureSettings:
+    """Region and size limits for vision screenshots, from the [screenshots] config section"""
+
+    def __init__(self, selectors=None, roi=None, pixel_budget=0, image_format="png", quality=80, padding=8):
+        self.selectors = [sel.strip() for sel in (selectors or []) if sel.strip()]
+        self.roi = roi
+        self.pixel_budget = int(pixel_budget)
+        self.image_format = image_format.lower().replace('jpg', 'jpeg')
+        self.quality = int(quality)
+        self.padding = int(padding)
+
+    @classmethod
+    def from_config(cls, config):
+        get = lambda key, fallback: config.get('screenshots', key, fallback=fallback)
+        roi = [float(v) for v in get('roi', '').split(',') if v.strip()]
+        return cls(
+            selectors=get('question_selectors', '').split(','),
+            roi=roi if len(roi) == 4 else None,
+            pixel_budget=get('pixel_budget', '0'),
+            image_format=get('format', 'png'),
+            quality=get('quality', '80'),
+            padding=get('padding', '8'),
+        )
+
+
+def element_clip(driver, selectors, padding=0):
+    """Page-coordinate box around the first matching elements, searching same-session iframes too"""
+    rect = driver.execute_script(ELEMENT_RECT_JS, selectors)
+    if not rect:
+        offsets = driver.execute_script(IFRAME_RECTS_JS) or []
+        frames = driver.find_elements("tag name", "iframe")
+        for frame, offset in zip(frames, offsets):
+            try:
+                driver.switch_to.frame(frame)
+                rect = driver.execute_script(ELEMENT_RECT_JS, selectors)
+            finally:
+                driver.switch_to.default_content()
+            if rect:
+                rect["x"] += offset["x"]
+                rect["y"] += offset["y"]
+                break
+    if not rect or rect["width"] <= 0 or rect["height"] <= 0:
+        return None
+    return {
+        "x": max(0, rect["x"] - padding),
+        "y": max(0, rect["y"] - padding),
+        "width": rect["width"] + 2 * padding,
+        "height": rect["height"] + 2 * padding,
+    }
+
+
+def budget_scale(width, height, pixel_budget):
+    if not pixel_budget or width * height <= pixel_budget:
+        return 1.0
+    return (pixel_budget / float(width * height)) ** 0.5
+
+
+def capture_screenshot(driver, settings=None):
+    """Grab the viewport without touching disk. The browser already returns base64, so keep it as is.
+
+    With settings, the question region is clipped and scaled by the browser itself (CDP clip.scale);
+    otherwise a configured ROI crop and resize is applied locally.
+    """
+    settings = settings or CaptureSettings()
+    params = {"format": settings.image_format}
+    if settings.image_format != "png":
+        params["quality"] = settings.quality
+    try:
+        clip = element_clip(driver, settings.selectors, settings.padding) if settings.selectors else None
+        if clip:
+            clip["scale"] = budget_scale(clip["width"], clip["height"], settings.pixel_budget)
+            params["clip"] = clip
+        result = driver.execute_cdp_cmd("Page.captureScreenshot", params)
+        screenshot = Screenshot(base64_data=result["data"], mime=f"image/{settings.image_format}")
+        if clip:
+            return screenshot
+    except Exception:
+        # Non-Chromium drivers: same base64 payload through the WebDriver endpoint
+        screenshot = Screenshot(base64_data=driver.get_screenshot_as_base64())
+    if settings.roi or settings.pixel_budget or screenshot.mime != f"image/{settings.image_format}":
+        screenshot = shrink_screenshot(screenshot, settings)
+    return screenshot
+
+
+def shrink_screenshot(screenshot, settings):
+    """Crop to the ROI fractions (left, top, right, bottom), fit the pixel budget and re-encode"""
+    from io import BytesIO
+    from PIL import Image
+
+    image = Image.open(BytesIO(screenshot.data))
+    if settings.roi:
+        left, top, right, bottom = settings.roi
+        width, height = image.size
+        image = image.crop((int(left * width), int(top * height), int(right * width), int(bottom * height)))
+    scale = budget_scale(image.width, image.height, settings.pixel_budget)
+    if scale < 1.0:
+        image = image.resize((max(1, int(image.width * scale)), max(1, int(image.height * scale))), Image.LANCZOS)
+    buffer = BytesIO()
+    if settings.image_format in ("jpeg", "webp"):
+        image.convert("RGB").save(buffer, format=settings.image_format.upper(), quality=settings.quality)
+    else:
+        image.save(buffer, format="PNG", optimize=False)
+    return Screenshot(image_bytes=buffer.getvalue(), mime=f"image/{settings.image_format}")
+
+
+class ScreenshotWriter:
+    """Persists screenshots on a background thread so capture never waits on disk"""
+
+    def __init__(self, folder):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def save(self, screenshot, name):
+        extension = screenshot.mime.split('/')[-1].replace('jpeg', 'jpg')
+        screenshot.path = os.path.join(self.folder, f"{name}.{extension}")
+        self.queue.put(screenshot)
+        return screenshot.path
+
+    def _run(self):
+        while True:
+            screenshot = self.queue.get()
+            try:
+                with open(screenshot.path, "wb") as f:
+                    f.write(screenshot.data)
+            except Exception as e:
+                print(f"Failed to save screenshot {screenshot.path}: {e}")
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        self.queue.join()
+
+
+def encode_image(image):
+    """Base64 for a Screenshot (cached on the object) or for an image file path"""
+    if isinstance(image, Screenshot):
+        return image.base64, image.mime
+    with open(image, "rb") as image_file:
+        return base64.b64encode(image_file.read()).decode('utf-8'), "image/png"
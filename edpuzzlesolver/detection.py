@@ -0,0 +1,82 @@
+import time
+import threading
+from contextlib import contextmanager
+
+
+class DetectionCancelled(Exception):
+    """Raised inside a detection once a newer trigger has superseded it"""
+
+
+class DetectionJob:
+    """One detection run: its generation number plus the time spent in each stage"""
+
+    def __init__(self, executor, generation):
+        self.executor = executor
+        self.generation = generation
+        self.timings = []
+
+    @property
+    def stale(self):
+        return self.generation != self.executor.generation
+
+    def check(self):
+        if self.stale:
+            raise DetectionCancelled(f"detection #{self.generation} superseded by #{self.executor.generation}")
+
+    @contextmanager
+    def stage(self, name):
+        self.check()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings.append((name, time.perf_counter() - start))
+            self.executor.report(self)
+
+
+class DetectionExecutor:
+    """Single-flight detection: the newest trigger wins.
+
+    Triggers arriving within `coalesce_window` seconds of the running detection's start are folded into it.
+    A later trigger bumps the generation; the older run stops at its next stage boundary, and anything that
+    acts on the page must call job.check() while holding `driver_lock`, so a stale run never clicks.
+    """
+
+    def __init__(self, pipeline, on_timings=None, coalesce_window=0.75):
+        self.pipeline = pipeline
+        self.on_timings = on_timings
+        self.coalesce_window = float(coalesce_window)
+        self.driver_lock = threading.RLock()
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.started_at = 0.0
+        self.running = None
+
+    def trigger(self):
+        with self.lock:
+            now = time.monotonic()
+            if self.running and self.running.is_alive() and now - self.started_at < self.coalesce_window:
+                print("Detection already starting; trigger coalesced")
+                return False
+            self.generation += 1
+            job = DetectionJob(self, self.generation)
+            self.started_at = now
+            self.running = threading.Thread(target=self._run, args=(job,), daemon=True)
+            self.running.start()
+            return True
+
+    def _run(self, job):
+        try:
+            self.pipeline(job)
+        except DetectionCancelled as e:
+            print(f"Cancelled stale {e}")
+        except Exception as e:
+            print(f"Error in detection: {e}")
+
+    def report(self, job):
+        if self.on_timings and not job.stale:
+            self.on_timings(job.timings)
+
+
+def format_timings(timings):
+    return "  ".join(f"{name} {seconds:.2f}s" for name, seconds in timings)
@@ -1,16 +1,11 @@
-import base64
 import pyautogui
 import speech_recognition as sr
-import pyttsx3
-import ollama
-from groq import Groq
 import configparser
 import os
 from dotenv import load_dotenv
 import threading
 import tkinter as tk
 from abc import ABC, abstractmethod
-import json
 from datetime import datetime
 import time
 from selenium import webdriver
@@ -18,6 +13,17 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
+from edpuzzlesolver.capture import capture_screenshot, encode_image, ScreenshotWriter, CaptureSettings
+from edpuzzlesolver.visioncache import VisionCache
+from edpuzzlesolver.historylog import HistoryLog
+from edpuzzlesolver.providers import ProviderLayer, ProviderError
+from edpuzzlesolver.detection import DetectionExecutor, format_timings
+from edpuzzlesolver.wakeword import KeywordSpotter, microphone_frames
+from edpuzzlesolver.tts import TTSWorker, PRIORITY_INTERRUPT, PRIORITY_ANSWER, PRIORITY_ANNOUNCE
+from edpuzzlesolver.questiondom import find_question_in_frames
+
+# Run from the repository root as a module so the edpuzzlesolver package resolves:
+#   python -m edpuzzlesolver.hi
 
 # Read session ID from file or create new session
 session_file = "lmsusingselenium\session.txt"
@@ -54,258 +60,219 @@ class Config:
         self.config.read('config.ini')
         load_dotenv()
         
-        self.GROQ_API_KEY = os.getenv('GROQ_API_KEY')
-        self.preferred_source = self.config.get('llms', 'preferred_source', fallback='groq').lower()
+        self.preferred_source = self.config.get(
+            'llms', 'preferred_source', fallback=self.config.get('llms', 'source', fallback='groq')).lower()
         self.temperature = float(self.config.get('llms', 'temperature', fallback='0.0'))
+        # Models come from [llms_groq] / [llms_ollama] (model, vision_model), falling back to the legacy
+        # [groq] / [ollama] ANSWER_MODEL and VISION_MODEL keys
+        self.providers = ProviderLayer.shared(self.config)
+        self.sources = [self.preferred_source] + [s for s in ('groq', 'ollama') if s != self.preferred_source]
         
-        self.GROQ_VISION_MODEL = self.config.get('groq', 'VISION_MODEL', fallback='llama-3.2-90b-vision-preview')
-        self.GROQ_ANSWER_MODEL = self.config.get('groq', 'ANSWER_MODEL', fallback='llama-3.3-70b-versatile')
-        self.OLLAMA_VISION_MODEL = self.config.get('ollama', 'VISION_MODEL', fallback='llama3.2-vision:latest')
-        self.OLLAMA_ANSWER_MODEL = self.config.get('ollama', 'ANSWER_MODEL', fallback='mistral:latest')
+        # Screenshots stay in memory; saving a copy to disk happens on a background thread
+        self.SAVE_SCREENSHOTS = self.config.getboolean('screenshots', 'save', fallback=True)
+        self.capture_settings = CaptureSettings.from_config(self.config)
+
+EXTRACT_INSTRUCTION = ("Extract the question and options from this image of a webpage. List each option exactly "
+                       "as it appears, including any leading symbols like '*', one per line.")
+ANSWER_INSTRUCTION = ("Provide only the final answer (the exact text of the chosen option, excluding any leading "
+                      "symbols like '*') without any explanation.")
 
 class LLMProcessor(ABC):
     @abstractmethod
-    def process_image(self, image_path):
+    def process_image(self, image):
         pass
     
     @abstractmethod
     def get_answer(self, question_and_options):
         pass
 
-class GroqProcessor(LLMProcessor):
-    def __init__(self, config):
+class ProviderProcessor(LLMProcessor):
+    """Vision extraction and answering for one source through the shared provider layer"""
+    def __init__(self, config, source):
         self.config = config
-        if not config.GROQ_API_KEY:
-            raise ValueError("Groq API key not found")
-        self.client = Groq(api_key=config.GROQ_API_KEY)
+        self.source = source
+        self.providers = config.providers
     
-    def process_image(self, image_path):
-        base64_image = self._encode_image(image_path)
-        try:
-            chat_completion = self.client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": "Extract the question and options from this image of a webpage. List each option exactly as it appears, including any leading symbols like '*', one per line."},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/png;base64,{base64_image}",
-                                },
-                            },
-                        ],
-                    }
-                ],
-                model=self.config.GROQ_VISION_MODEL,
-                temperature=self.config.temperature
-            )
-            return chat_completion.choices[0].message.content
-        except Exception as e:
-            print(f"Error with Groq API: {e}")
-            raise
+    def process_image(self, image):
+        base64_image, mime = encode_image(image)
+        return self.providers.vision(self.source, EXTRACT_INSTRUCTION, base64_image, mime)
     
     def get_answer(self, question_and_options):
-        try:
-            chat_completion = self.client.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": "Provide only the final answer (the exact text of the chosen option, excluding any leading symbols like '*') without any explanation."},
-                    {"role": "user", "content": question_and_options}
-                ],
-                model=self.config.GROQ_ANSWER_MODEL,
-                temperature=self.config.temperature
-            )
-            return chat_completion.choices[0].message.content.strip().lower()
-        except Exception as e:
-            print(f"Error with Groq API: {e}")
-            raise
-    
-    def _encode_image(self, image_path):
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
-
-class OllamaProcessor(LLMProcessor):
-    def __init__(self, config):
-        self.config = config
-    
-    def process_image(self, image_path):
-        base64_image = self._encode_image(image_path)
-        try:
-            response = ollama.chat(
-                model=self.config.OLLAMA_VISION_MODEL,
-                messages=[
-                    {"role": "system", "content": "Extract questions and options from webpage screenshot. List each option exactly as it appears, including any leading symbols like '*', one per line."},
-                    {"role": "user", "content": f"data:image/png;base64,{base64_image}"}
-                ]
-            )
-            return response['message']['content']
-        except Exception as e:
-            print(f"Error with Ollama: {e}")
-            raise
-    
-    def get_answer(self, question_and_options):
-        try:
-            response = ollama.chat(
-                model=self.config.OLLAMA_ANSWER_MODEL,
-                messages=[
-                    {"role": "system", "content": "Provide only the final answer (the exact text of the chosen option, excluding any leading symbols like '*') without any explanation."},
-                    {"role": "user", "content": question_and_options}
-                ]
-            )
-            return response['message']['content'].strip().lower()
-        except Exception as e:
-            print(f"Error with Ollama: {e}")
-            raise
-    
-    def _encode_image(self, image_path):
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
+        answer, _ = self.providers.chat(
+            self.source,
+            [{"role": "system", "content": ANSWER_INSTRUCTION}, {"role": "user", "content": question_and_options}],
+            temperature=self.config.temperature,
+        )
+        return answer.strip().lower()
 
 class ImageProcessor:
     def __init__(self, config, driver):
         self.config = config
         self.driver = driver
-        self.groq_processor = GroqProcessor(config)
-        self.ollama_processor = OllamaProcessor(config)
+        self.processors = {source: ProviderProcessor(config, source) for source in config.sources}
         self.history = []
+        self.history_lock = threading.Lock()
+        self.current = threading.local()
         self.run_timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         self.screenshot_folder = os.path.join("screenshots", self.run_timestamp)
-        os.makedirs(self.screenshot_folder, exist_ok=True)
-        self.history_file = os.path.join("history", f"conversation_history_{self.run_timestamp}.json")
-        os.makedirs("history", exist_ok=True)
+        self.screenshot_writer = ScreenshotWriter(self.screenshot_folder) if config.SAVE_SCREENSHOTS else None
+        self.vision_cache = VisionCache.from_config(config.config)
+        self.history_file = os.path.join("history", f"conversation_history_{self.run_timestamp}.jsonl")
+        self.history_log = HistoryLog.from_config(config.config, self.history_file)
 
-    def save_history(self):
-        with open(self.history_file, "w") as history_file:
-            json.dump(self.history, history_file, indent=4)
+    def add_history(self, entry):
+        with self.history_lock:
+            self.history.append(entry)
+            entry_id = len(self.history) - 1
+        # Each detection runs on its own thread, so later updates go to this thread's entry, not history[-1]
+        self.current.entry_id = entry_id
+        self.history_log.add(entry_id, entry)
+    
+    def update_history(self, **fields):
+        entry_id = getattr(self.current, 'entry_id', None)
+        if entry_id is None:
+            # No entry on this thread; history[-1] may belong to an overlapping detection
+            print(f"No history entry for this detection; not recording {sorted(fields)}")
+            return
+        with self.history_lock:
+            self.history[entry_id].update(fields)
+        self.history_log.update(entry_id, **fields)
     
     def take_screenshot(self):
-        """Take screenshot of current browser window"""
-        screenshot_path = os.path.join(self.screenshot_folder, f"screenshot_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png")
-        self.driver.save_screenshot(screenshot_path)
-        print(f"Browser screenshot saved as {screenshot_path}")
-        return screenshot_path
+        """Capture the current browser window in memory (optionally persisted in the background)"""
+        start = time.perf_counter()
+        screenshot = capture_screenshot(self.driver, self.config.capture_settings)
+        print(f"Browser screenshot captured in {time.perf_counter() - start:.3f}s")
+        if self.screenshot_writer:
+            path = self.screenshot_writer.save(screenshot, f"screenshot_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+            print(f"Browser screenshot queued for {path}")
+        return screenshot
     
-    def process_image(self, image_path):
-        errors = []
-        if self.config.preferred_source == 'groq':
-            try:
-                result = self.groq_processor.process_image(image_path)
-                self.history.append({"screenshot": image_path, "question_and_options": result})
-                self.save_history()
-                return result
-            except Exception as e:
-                errors.append(f"Groq: {str(e)}")
-                try:
-                    result = self.ollama_processor.process_image(image_path)
-                    self.history.append({"screenshot": image_path, "question_and_options": result})
-                    self.save_history()
-                    return result
-                except Exception as e:
-                    errors.append(f"Ollama: {str(e)}")
-                    return f"Unable to process image. Errors: {'; '.join(errors)}"
+    def capture_question(self):
+        """Browser-side half of detection: DOM question data, or a screenshot when the DOM has none"""
+        self.current.entry_id = None
+        start = time.perf_counter()
+        try:
+            data = find_question_in_frames(self.driver)
+        except Exception as e:
+            print(f"DOM extraction failed: {e}")
+            data = None
+        screenshot = None if data else self.take_screenshot()
+        return start, data, screenshot
+    
+    def extract_question(self, captured):
+        """Question text and options (None when only vision text is available) from capture_question()"""
+        start, data, screenshot = captured
+        options = None
+        if data:
+            options = [value for key, value in data.items() if key.startswith("Option")]
+            text = data["Question"] + "\n" + "\n".join(f"* {option}" for option in options)
+            self.add_history({"screenshot": None, "question_and_options": text})
+            source = "dom"
         else:
-            try:
-                result = self.ollama_processor.process_image(image_path)
-                self.history.append({"screenshot": image_path, "question_and_options": result})
-                self.save_history()
-                return result
-            except Exception as e:
-                errors.append(f"Ollama: {str(e)}")
-                try:
-                    result = self.groq_processor.process_image(image_path)
-                    self.history.append({"screenshot": image_path, "question_and_options": result})
-                    self.save_history()
-                    return result
-                except Exception as e:
-                    errors.append(f"Groq: {str(e)}")
-                    return f"Unable to process image. Errors: {'; '.join(errors)}"
+            text = self.process_image(screenshot)
+            source = "vision"
+        seconds = time.perf_counter() - start
+        if self.current.entry_id is not None:
+            self.update_history(source=source, extraction_seconds=round(seconds, 3))
+        print(f"Question extracted via {source} in {seconds:.3f}s")
+        return text, options
+    
+    def detect_question(self):
+        """Question text from the live DOM when possible; screenshot + vision model only as fallback"""
+        return self.extract_question(self.capture_question())
+    
+    def process_image(self, image):
+        """Question text for a screenshot; near-identical frames are answered from the vision cache"""
+        key = None
+        if self.vision_cache and hasattr(image, 'data'):
+            key = self.vision_cache.key_for(image.data)
+            cached = self.vision_cache.get(key)
+            print(self.vision_cache.report())
+            if cached is not None:
+                self.add_history({"screenshot": image.path, "question_and_options": cached, "vision_cache": "hit"})
+                return cached
+        result = self.extract_with_fallback(image)
+        if key is not None and not result.startswith("Unable to process image"):
+            self.vision_cache.put(key, result)
+        return result
+    
+    def extract_with_fallback(self, image):
+        try:
+            _, result = self.config.providers.with_fallback(
+                self.config.sources, lambda source: self.processors[source].process_image(image))
+        except ProviderError as e:
+            return f"Unable to process image. Errors: {e}"
+        self.add_history({"screenshot": getattr(image, "path", image), "question_and_options": result})
+        return result
     
     def get_answer(self, question_and_options):
-        errors = []
-        if self.config.preferred_source == 'groq':
-            try:
-                answer = self.groq_processor.get_answer(question_and_options)
-                self.history[-1]["answer"] = answer
-                self.save_history()
-                return answer
-            except Exception as e:
-                errors.append(f"Groq: {str(e)}")
-                try:
-                    answer = self.ollama_processor.get_answer(question_and_options)
-                    self.history[-1]["answer"] = answer
-                    self.save_history()
-                    return answer
-                except Exception as e:
-                    errors.append(f"Ollama: {str(e)}")
-                    return f"Unable to get answer. Errors: {'; '.join(errors)}"
-        else:
-            try:
-                answer = self.ollama_processor.get_answer(question_and_options)
-                self.history[-1]["answer"] = answer
-                self.save_history()
-                return answer
-            except Exception as e:
-                errors.append(f"Ollama: {str(e)}")
-                try:
-                    answer = self.groq_processor.get_answer(question_and_options)
-                    self.history[-1]["answer"] = answer
-                    self.save_history()
-                    return answer
-                except Exception as e:
-                    errors.append(f"Groq: {str(e)}")
-                    return f"Unable to get answer. Errors: {'; '.join(errors)}"
+        try:
+            _, answer = self.config.providers.with_fallback(
+                self.config.sources, lambda source: self.processors[source].get_answer(question_and_options))
+        except ProviderError as e:
+            return f"Unable to get answer. Errors: {e}"
+        self.update_history(answer=answer)
+        print(self.config.providers.report())
+        return answer
 
 class SpeechManager:
-    def __init__(self):
-        self.speaking = False
+    def __init__(self, config=None):
         self.running = True
-        self.recognizer = sr.Recognizer()
-        self.mic = sr.Microphone()
-    
+        self.config = config
+        get = lambda key, fallback: config.get('speech', key, fallback=fallback) if config else fallback
+        phrases = [p.strip() for p in get('presynthesize', '').split(',') if p.strip()]
+        self.tts = TTSWorker(voice_index=get('voice_index', '1'), rate=get('rate', '') or None, phrases=phrases)
+
+    @property
+    def speaking(self):
+        return self.tts.speaking
+
     def announce(self, text):
-        try:
-            engine = pyttsx3.init()
-            voices = engine.getProperty('voices')
-            engine.setProperty('voice', voices[1].id)
-            engine.say(text)
-            engine.runAndWait()
-        except Exception as e:
-            print(f"Error in announcement: {e}")
+        self.tts.say(text, PRIORITY_ANNOUNCE)
     
     def speak_answer(self, answer):
-        self.speaking = True
-        engine = pyttsx3.init()
-        voices = engine.getProperty('voices')
-        engine.setProperty('voice', voices[1].id)
-        try:
-            engine.say(answer)
-            engine.runAndWait()
-        except:
-            pass
-        finally:
-            self.speaking = False
-            self.announce("Listening for wake up.")
+        self.tts.say(answer, PRIORITY_ANSWER, interrupt=True)
+        self.tts.say("Listening for wake up.", PRIORITY_ANNOUNCE)
     
     def stop_speaking(self):
         if self.speaking:
-            engine = pyttsx3.init()
-            engine.stop()
-            self.speaking = False
-            self.announce("Silenced. Listening for wake up.")
+            self.tts.say("Silenced. Listening for wake up.", PRIORITY_INTERRUPT, interrupt=True)
     
+    def dispatch_command(self, command, callback_detect, callback_silence, callback_close):
+        if "wake up" in command:
+            callback_detect()
+        elif "silence" in command and self.speaking:
+            callback_silence()
+        elif "close" in command:
+            callback_close()
+
     def listen_for_commands(self, callback_detect, callback_silence, callback_close):
+        try:
+            spotter = KeywordSpotter.from_config(self.config or configparser.ConfigParser())
+        except Exception as e:
+            print(f"Offline wake word unavailable ({e}); using online recognition")
+            return self.listen_with_google(callback_detect, callback_silence, callback_close)
+
+        print("Listening for voice commands (offline)...")
+        frames = microphone_frames(spotter.sample_rate, spotter.frame_samples, lambda: self.running)
+        try:
+            spotter.run(frames, lambda command: self.dispatch_command(
+                command, callback_detect, callback_silence, callback_close))
+        finally:
+            print(spotter.report())
+
+    def listen_with_google(self, callback_detect, callback_silence, callback_close):
+        # Only the online path opens the microphone through speech_recognition
+        self.recognizer = sr.Recognizer()
+        self.mic = sr.Microphone()
         while self.running:
             with self.mic as source:
                 print("Listening for voice commands...")
                 try:
                     audio = self.recognizer.listen(source)
                     command = self.recognizer.recognize_google(audio).lower()
-                    if "wake up" in command:
-                        callback_detect()
-                    elif "silence" in command and self.speaking:
-                        callback_silence()
-                    elif "close" in command:
-                        callback_close()
+                    self.dispatch_command(command, callback_detect, callback_silence, callback_close)
                 except sr.UnknownValueError:
                     pass
                 except Exception as e:
@@ -320,7 +287,12 @@ class FloatingUI:
         
         self.driver = driver
         self.image_processor = ImageProcessor(config, driver)
-        self.speech_manager = SpeechManager()
+        self.speech_manager = SpeechManager(config.config)
+        self.detector = DetectionExecutor(
+            self.process_detection,
+            on_timings=lambda timings: self.root.after(0, self.show_timings, timings),
+            coalesce_window=config.config.get('detection', 'coalesce_window', fallback='0.75'),
+        )
         
         self.setup_ui()
         
@@ -347,6 +319,9 @@ class FloatingUI:
                                  bg='#95a5a6', fg='white', width=10)
         self.close_btn.pack(side=tk.LEFT, padx=2)
         
+        self.timings_label = tk.Label(self.root, text="", bg='#2c3e50', fg='#ecf0f1', font=('Consolas', 8))
+        self.timings_label.pack(fill=tk.X)
+        
         self.frame.bind('<Button-1>', self.start_drag)
         self.frame.bind('<B1-Motion>', self.drag)
     
@@ -362,7 +337,10 @@ class FloatingUI:
         self.root.geometry(f"+{x}+{y}")
     
     def handle_detect(self):
-        threading.Thread(target=self.process_detection, daemon=True).start()
+        self.detector.trigger()
+    
+    def show_timings(self, timings):
+        self.timings_label.config(text=format_timings(timings))
     
     def handle_silence(self):
         self.speech_manager.stop_speaking()
@@ -433,27 +411,29 @@ class FloatingUI:
         except Exception as e:
             print(f"Error selecting option: {e}")
 
-    def process_detection(self):
-        try:
-            self.speech_manager.announce("Processing webpage")
-            screenshot_path = self.image_processor.take_screenshot()
-            question_and_options = self.image_processor.process_image(screenshot_path)
-            print("\nExtracted Text:\n", question_and_options)
-            
+    def process_detection(self, job):
+        self.speech_manager.announce("Processing webpage")
+        with job.stage("capture"), self.detector.driver_lock:
+            captured = self.image_processor.capture_question()
+        with job.stage("extract"):
+            question_and_options, options = self.image_processor.extract_question(captured)
+        print("\nExtracted Text:\n", question_and_options)
+        
+        if not options:
             options = self.get_options_from_extracted_text(question_and_options)
-            if not options:
-                print("No valid options extracted from the webpage.")
-                return
-            
+        if not options:
+            print("No valid options extracted from the webpage.")
+            return
+        
+        with job.stage("answer"):
             answer = self.image_processor.get_answer(question_and_options)
-            print("\nFinal Answer:\n", answer)
-            
-            time.sleep(1)
+        print("\nFinal Answer:\n", answer)
+        
+        time.sleep(1)
+        with self.detector.driver_lock, job.stage("select"):
             self.select_option(answer)
-            
-            self.speech_manager.speak_answer(answer)
-        except Exception as e:
-            print(f"Error in detection: {e}")
+        
+        self.speech_manager.speak_answer(answer)
     
     def run(self):
         self.root.mainloop()
@@ -0,0 +1,145 @@
+import os
+import sys
+import json
+import time
+import atexit
+import argparse
+import threading
+
+# Append-only conversation history. Each line is one operation:
+#   {"op": "add", "id": 3, ...entry fields}   or   {"op": "update", "id": 3, ...changed fields}
+# rebuild() replays the operations into the list of entries the old JSON file used to hold.
+
+
+class HistoryLog:
+    """Buffered JSONL writer; flushes every `flush_every` records or `flush_interval` seconds"""
+
+    FSYNC_POLICIES = ("always", "batch", "never")
+
+    def __init__(self, path, flush_every=8, flush_interval=2.0, fsync="batch"):
+        if fsync not in self.FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {self.FSYNC_POLICIES}, got {fsync!r}")
+        self.path = path
+        self.flush_every = int(flush_every)
+        self.flush_interval = float(flush_interval)
+        self.fsync = fsync
+        self.buffer = []
+        self.lock = threading.Lock()
+        self.closed = False
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, "a", encoding="utf-8")
+        self.last_flush = time.monotonic()
+        self.timer = threading.Thread(target=self._flush_periodically, daemon=True)
+        self.timer.start()
+        atexit.register(self.close)
+
+    @classmethod
+    def from_config(cls, config, path):
+        return cls(
+            path,
+            flush_every=config.get('history', 'flush_every', fallback='8'),
+            flush_interval=config.get('history', 'flush_interval', fallback='2.0'),
+            fsync=config.get('history', 'fsync', fallback='batch'),
+        )
+
+    def add(self, entry_id, entry):
+        self._append(dict({"op": "add", "id": entry_id}, **entry))
+
+    def update(self, entry_id, **fields):
+        self._append(dict({"op": "update", "id": entry_id}, **fields))
+
+    def _append(self, record):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self.lock:
+            if self.closed:
+                return
+            self.buffer.append(line)
+            if self.fsync == "always" or len(self.buffer) >= self.flush_every:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if not self.buffer:
+            return
+        self.file.write("".join(self.buffer))
+        self.buffer.clear()
+        self.file.flush()
+        if self.fsync != "never":
+            os.fsync(self.file.fileno())
+        self.last_flush = time.monotonic()
+
+    def _flush_periodically(self):
+        while not self.closed:
+            time.sleep(self.flush_interval)
+            with self.lock:
+                if not self.closed and time.monotonic() - self.last_flush >= self.flush_interval:
+                    self._flush_locked()
+
+    def flush(self):
+        with self.lock:
+            self._flush_locked()
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self._flush_locked()
+            self.closed = True
+            self.file.close()
+
+
+def rebuild(path):
+    """Replay a history log into a list of entries; a torn final line from a crash is skipped"""
+    entries = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Skipping unreadable line {number} in {path}")
+                continue
+            op = record.pop("op", "add")
+            entry_id = record.pop("id")
+            if op == "add":
+                entries[entry_id] = record
+            else:
+                entries.setdefault(entry_id, {}).update(record)
+    return [entries[key] for key in sorted(entries)]
+
+
+def compact(path):
+    """Rewrite a log so it holds one 'add' line per entry"""
+    entries = rebuild(path)
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        for entry_id, entry in enumerate(entries):
+            f.write(json.dumps(dict({"op": "add", "id": entry_id}, **entry), ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild or compact an append-only conversation history log")
+    parser.add_argument("log")
+    parser.add_argument("--output", help="Write the rebuilt entries as a JSON list (default: stdout)")
+    parser.add_argument("--compact", action="store_true", help="Rewrite the log in place with one line per entry")
+    args = parser.parse_args()
+
+    entries = compact(args.log) if args.compact else rebuild(args.log)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(entries, f, indent=4, ensure_ascii=False)
+        print(f"Wrote {len(entries)} entries to {args.output}")
+    else:
+        json.dump(entries, sys.stdout, indent=4, ensure_ascii=False)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,62 @@
 import os
-from configobj import ConfigObj
+import time
+import contextvars
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import Lock
 from dotenv import load_dotenv
-from langchain_ollama import ChatOllama
-from langchain_groq import ChatGroq
-from openai import OpenAI
-from langchain_core.runnables import Runnable
+from edpuzzlesolver.prompts import PromptRegistry, reasoning_kwargs, usage_from_result, parse_option_index, estimate_tokens
+from edpuzzlesolver.streaming import stream_decide
+from edpuzzlesolver.providers import ProviderLayer, PROVIDER_KEYS, count_fallback
+from edpuzzlesolver.tracing import span, traced, annotate
 
 # Load environment variables from .env
 load_dotenv()
 
+# Calls go through the shared provider layer (edpuzzlesolver.providers), which imports each SDK on
+# first use of a provider, so runs answered entirely from the cache never load one.
+BACKEND_KEYS = PROVIDER_KEYS
+
+
+class LazyLLMInstances(dict):
+    """Maps source -> LLM, constructing each backend the first time it is looked up.
+
+    Each source has its own lock, so concurrent lookups of different sources build in parallel.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.factories = {}
+        self.locks = {}
+
+    def register(self, source, factory):
+        self.factories[source] = factory
+        self.locks[source] = Lock()
+        super().__setitem__(source, None)
+
+    def __getitem__(self, source):
+        llm = super().__getitem__(source)
+        if llm is not None:
+            return llm
+        with self.locks[source]:
+            llm = super().__getitem__(source)
+            if llm is None:
+                start = time.perf_counter()
+                llm = self.factories[source]()
+                print(f"Loaded {source} backend in {time.perf_counter() - start:.2f}s")
+                super().__setitem__(source, llm)
+            return llm
+
 class LLMManager:
     def __init__(self, config_path='config.ini'):
         self.config = self.load_config(config_path)
         self.DEFAULT_FALLBACK_ORDER = ['openrouter', 'groq', 'ollama']
+        self.prompts = PromptRegistry(self.config)
+        self.templates = {}
+        self.providers = ProviderLayer.shared(self.config)
 
     def load_config(self, config_path):
+        from configobj import ConfigObj
         try:
             config = ConfigObj(config_path)
             if not config:
@@ -23,46 +65,40 @@ class LLMManager:
         except Exception as e:
             raise Exception(f"Failed to load {config_path}: {e}")
 
+    def mock_enabled(self):
+        # MOCK_LLM=1 lets a harness (e.g. the offline replay) switch to the mock without editing config.ini
+        enabled = os.getenv('MOCK_LLM') or self.config.get('mock_llm', {}).get('enabled', 'false')
+        return str(enabled).lower() in ('true', 'yes', '1')
+
+    def endpoint(self, source, cfg, env_key):
+        """Base URL and API key for a provider; everything points at the local mock when enabled"""
+        if self.mock_enabled():
+            mock = self.config['mock_llm']
+            root = f"http://{mock.get('host', '127.0.0.1')}:{mock.get('port', 8765)}"
+            # OpenAI clients append /chat/completions, the Groq SDK appends /openai/v1/...
+            return (root + "/v1" if source == 'openrouter' else root), "mock"
+        return cfg.get('base_url'), os.getenv(env_key) if env_key else None
+
     def setup_llm_with_fallback(self, fallback_order=None):
+        """Validate config and keys now; the backend module is imported when a provider is first used"""
         if fallback_order is None:
             fallback_order = self.DEFAULT_FALLBACK_ORDER
         
-        llm_instances = {}
+        llm_instances = LazyLLMInstances()
         for source in fallback_order:
             try:
-                cfg = self.config[f'llms_{source}']
-                if source == 'openrouter':
-                    api_key = os.getenv('OPENROUTER_API_KEY')
-                    if not api_key:
-                        raise ValueError("OPENROUTER_API_KEY not found")
-                    client = OpenAI(
-                        base_url="https://openrouter.ai/api/v1",
-                        api_key=api_key,
-                    )
-                    llm_instances[source] = OpenRouterLLM(
-                        client=client,
-                        model=cfg['model'],
-                        temperature=cfg['temperature'],
-                        site_url=cfg['site_url'],
-                        site_name=cfg['site_name']
-                    )
-                elif source == 'groq':
-                    api_key = os.getenv('GROQ_API_KEY')
-                    if not api_key:
-                        raise ValueError("GROQ_API_KEY not found")
-                    llm_instances[source] = ChatGroq(
-                        model=cfg['model'],
-                        temperature=float(cfg['temperature']),
-                        api_key=api_key
-                    )
-                elif source == 'ollama':
-                    llm_instances[source] = ChatOllama(
-                        model=cfg['model'],
-                        temperature=float(cfg['temperature'])
-                    )
-                else:
+                if source not in BACKEND_KEYS:
                     print(f"Unsupported LLM source in fallback: {source}")
                     continue
+                cfg = self.config[f'llms_{source}']
+                template = self.prompts.get(source, cfg['model'])
+                self.templates[source] = template
+                base_url, api_key = self.endpoint(source, cfg, BACKEND_KEYS[source])
+                if BACKEND_KEYS[source] and not api_key:
+                    raise ValueError(f"{BACKEND_KEYS[source]} not found")
+                llm_instances.register(source, lambda source=source, cfg=cfg, template=template,
+                                       base_url=base_url, api_key=api_key:
+                                       self.build_llm(source, cfg, template, base_url, api_key))
             except Exception as e:
                 print(f"Failed to setup {source}: {e}")
                 continue
@@ -70,45 +106,180 @@ class LLMManager:
             raise Exception("No LLMs could be set up from the fallback order.")
         return llm_instances
 
+    def build_llm(self, source, cfg, template, base_url, api_key):
+        # Opening the client here keeps the one-off SDK import inside the lazy first lookup
+        self.providers.client(source, base_url, api_key)
+        return ProviderLLM(
+            self.providers,
+            source,
+            model=cfg['model'],
+            temperature=cfg['temperature'],
+            max_tokens=template.max_tokens,
+            extra=reasoning_kwargs(source, template.reasoning),
+            endpoint=(base_url, api_key),
+        )
+
+    @traced("llm.invoke_with_fallback")
     def invoke_with_fallback(self, llm_instances, fallback_order, input_data):
         for source in fallback_order:
             if source in llm_instances:
                 try:
-                    result = llm_instances[source].invoke(input_data)
+                    with span("llm.invoke", provider=source):
+                        result = llm_instances[source].invoke(input_data)
                     if hasattr(result, 'content'):  # For AIMessage from Groq/Ollama
                         result = result.content
                     if not isinstance(result, str):
                         raise ValueError(f"Unexpected result type from {source}: {type(result)}")
                     print(f"Successfully used {source} LLM.")
+                    annotate(provider=source)
                     return result
                 except Exception as e:
                     print(f"Failed with {source}: {e}. Falling back to next LLM.")
+                    count_fallback(source, "error")
                     continue
         return "Error: All LLMs in fallback chain failed."
 
-class OpenRouterLLM(Runnable):
-    def __init__(self, client, model, temperature, site_url, site_name):
-        super().__init__()
-        self.client = client
+    def ask_for_index(self, source, llm, question, options):
+        """One templated call to a single provider; returns (index or None, raw_reply)"""
+        with span("llm.ask_for_index", provider=source, model=getattr(llm, 'model', None)) as current:
+            template = self.templates[source]
+            prompt = template.build(question, options)
+            if template.stream:
+                index, text, ttft, elapsed = stream_decide(llm.stream(prompt), options)
+                ttft_label = f"{ttft:.2f}s" if ttft is not None else "n/a"
+                print(f"{source}: first token {ttft_label}, decision {elapsed:.2f}s")
+                current.set(ttft_ms=round(ttft * 1000, 1) if ttft is not None else None)
+                self.prompts.stats.record(template, source, elapsed, estimate_tokens(prompt),
+                                          estimate_tokens(text), ttft=ttft or 0.0)
+            else:
+                start = time.perf_counter()
+                result = llm.invoke(prompt)
+                elapsed = time.perf_counter() - start
+                text = result.content if hasattr(result, 'content') else result
+                if not isinstance(text, str):
+                    raise ValueError(f"Unexpected result type from {source}: {type(text)}")
+                input_tokens, output_tokens = usage_from_result(result, llm, prompt, text)
+                self.prompts.stats.record(template, source, elapsed, input_tokens, output_tokens)
+                index = parse_option_index(text, options)
+            print(f"Successfully used {source} LLM ({elapsed:.2f}s, template '{template.name}').")
+            current.set(template=template.name, answer_index=index + 1 if index is not None else None)
+            return index, text
+
+    def answer_with_fallback(self, llm_instances, fallback_order, question, options):
+        """Ask for an option index using each provider's template; returns (index, raw_reply)"""
+        raw = None
+        for source in fallback_order:
+            if source not in llm_instances:
+                continue
+            if not self.providers.health.available(source):
+                print(f"Skipping {source}: cooling down after repeated failures.")
+                count_fallback(source, "cooldown")
+                continue
+            try:
+                index, text = self.ask_for_index(source, llm_instances[source], question, options)
+                if index is not None:
+                    return index, text
+                raw = text
+                print(f"Could not map reply from {source} to an option: {text!r}. Falling back to next LLM.")
+                count_fallback(source, "unmapped")
+            except Exception as e:
+                print(f"Failed with {source}: {e}. Falling back to next LLM.")
+                count_fallback(source, "error")
+                continue
+        return None, raw if raw is not None else "Error: All LLMs in fallback chain failed."
+
+    def ensemble_settings(self):
+        section = self.config.get('ensemble', {})
+        providers = section.get('providers', self.DEFAULT_FALLBACK_ORDER)
+        if isinstance(providers, str):
+            providers = [providers]
+        return {
+            "enabled": str(section.get('enabled', 'false')).lower() in ('true', 'yes', '1'),
+            "providers": list(providers),
+            "samples": int(section.get('samples_per_provider', 1)),
+            "quorum": int(section.get('quorum', 2)),
+            "settled_agreement": float(section.get('settled_agreement', 1.0)),
+        }
+
+    def answer_with_vote(self, llm_instances, providers, question, options, quorum, samples=1):
+        """Query providers concurrently and majority-vote on the option index.
+
+        Returns (index, agreement, votes) as soon as `quorum` replies agree; outstanding
+        calls are abandoned. Without a quorum the plurality answer wins. Agreement is the
+        winning count over every call dispatched, so a vote cut short by the quorum never
+        reads as unanimous.
+        """
+        calls = []
+        for source in providers:
+            if source not in llm_instances:
+                continue
+            repeats = samples
+            if samples > 1 and self.providers.settings(source)['temperature'] == 0.0:
+                # Temperature 0 repeats are the same reply (served from the answer cache): one sample only
+                print(f"Ignoring samples_per_provider={samples} for {source}: temperature is 0")
+                repeats = 1
+            calls.extend([source] * repeats)
+        if not calls:
+            return None, 0.0, {}
+        votes = Counter()
+        answered = 0
+        start = time.perf_counter()
+        executor = ThreadPoolExecutor(max_workers=len(calls))
+        try:
+            # Each vote runs under a copy of this context so its span nests under the caller's
+            # The backend is looked up inside the worker so first-use construction runs in parallel too
+            ask = lambda source: self.ask_for_index(source, llm_instances[source], question, options)
+            futures = {executor.submit(contextvars.copy_context().run, ask, source): source for source in calls}
+            for future in as_completed(futures):
+                source = futures[future]
+                try:
+                    index, text = future.result()
+                except Exception as e:
+                    print(f"Vote from {source} failed: {e}")
+                    continue
+                if index is None:
+                    print(f"Vote from {source} unusable: {text!r}")
+                    continue
+                answered += 1
+                votes[index] += 1
+                if votes[index] >= quorum:
+                    print(f"Quorum of {quorum} reached after {answered} vote(s) in {time.perf_counter() - start:.2f}s")
+                    break
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        if not votes:
+            return None, 0.0, {}
+        index, count = votes.most_common(1)[0]
+        return index, count / len(calls), {str(i + 1): n for i, n in votes.items()}
+
+class ProviderLLM:
+    # Same invoke()/stream() surface as the LangChain chat models, backed by the shared provider layer
+    def __init__(self, providers, source, model, temperature, max_tokens=None, extra=None, endpoint=None):
+        self.providers = providers
+        self.source = source
         self.model = model
         self.temperature = temperature
-        self.site_url = site_url
-        self.site_name = site_name
+        self.max_tokens = max_tokens
+        self.extra = extra or {}
+        self.endpoint = endpoint
+        self.last_usage = None
+
+    def _messages(self, input):
+        return [{"role": "user", "content": str(input)}]
 
     def invoke(self, input, config=None):
-        prompt = str(input)
+        self.last_usage = None
         try:
-            completion = self.client.chat.completions.create(
-                extra_headers={"HTTP-Referer": self.site_url, "X-Title": self.site_name},
-                extra_body={},
-                model=self.model,
-                temperature=float(self.temperature),
-                messages=[{"role": "user", "content": prompt}]
-            )
-            result = completion.choices[0].message.content
-            if not result:
-                raise ValueError("LLM returned an empty response")
+            result, self.last_usage = self.providers.chat(
+                self.source, self._messages(input), model=self.model, temperature=self.temperature,
+                max_tokens=self.max_tokens, extra=self.extra, endpoint=self.endpoint)
             return result
         except Exception as e:
-            print(f"Error during OpenRouter invocation: {e}")
-            raise
\ No newline at end of file
+            print(f"Error during {self.source} invocation: {e}")
+            raise
+
+    def stream(self, input, config=None, **kwargs):
+        """Yield content deltas; closing the generator closes the HTTP stream"""
+        return self.providers.stream(
+            self.source, self._messages(input), model=self.model, temperature=self.temperature,
+            max_tokens=self.max_tokens, extra=self.extra, endpoint=self.endpoint)
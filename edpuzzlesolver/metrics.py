@@ -0,0 +1,243 @@
+import os
+import time
+import atexit
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# In-process metrics registry: counters, gauges and histograms with labels, written to dump_path at
+# exit and, when [metrics] port is set, served as Prometheus text on http://<host>:<port>/metrics.
+# Metrics are created on first use, e.g. counter("llm_requests_total", "...", ("provider",)).inc(provider="groq")
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        return self.header() + [f"{self.name}{format_labels(self.labels, k)} {format_value(v)}" for k, v in items]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def render(self):
+        with self.lock:
+            items = sorted((k, dict(v, counts=list(v["counts"]))) for k, v in self.values.items())
+        lines = self.header()
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state["counts"]):
+                cumulative += count
+                labels = format_labels(self.labels, key, {"le": format_value(bound)})
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {format_value(state['sum'])}")
+            lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    registry = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class Registry:
+    """Named metrics for the whole process; get-or-create so callers need no setup"""
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, dump_path=None):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self.dump_path = dump_path
+        self.server = None
+        if dump_path:
+            atexit.register(self.dump)
+
+    @classmethod
+    def from_config(cls, config):
+        # Imported here: providers records its own metrics through this module
+        from edpuzzlesolver.providers import config_value
+
+        enabled = str(config_value(config, 'metrics', 'enabled', 'true')).lower() in ('true', 'yes', '1')
+        registry = cls(config_value(config, 'metrics', 'dump_path', os.path.join('logs', 'metrics.prom'))
+                       if enabled else None)
+        port = int(config_value(config, 'metrics', 'port', '0') or 0)
+        if enabled and port:
+            registry.serve(config_value(config, 'metrics', 'host', '127.0.0.1'), port)
+        return registry
+
+    @classmethod
+    def shared(cls, config=None):
+        """The process-wide registry; built from config (or ./config.ini) on first use"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                if config is None:
+                    from configobj import ConfigObj
+                    config = ConfigObj('config.ini')
+                cls._shared = cls.from_config(config)
+            return cls._shared
+
+    def get(self, kind, name, help, labels, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = kind(name, help, labels, **kwargs)
+            elif not isinstance(metric, kind):
+                raise ValueError(f"{name} is already registered as a {metric.kind}")
+            return metric
+
+    def render(self):
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda m: m.name)
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+    def serve(self, host="127.0.0.1", port=9464):
+        """Serve /metrics from a daemon thread; a busy port (another worker) only disables serving"""
+        handler = type("RegistryMetricsHandler", (MetricsHandler,), {"registry": self})
+        try:
+            self.server = ThreadingHTTPServer((host, port), handler)
+        except OSError as e:
+            print(f"Metrics endpoint not started on {host}:{port}: {e}")
+            return None
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        print(f"Metrics on http://{host}:{self.server.server_address[1]}/metrics")
+        return self.server
+
+    def dump(self, path=None):
+        path = path or self.dump_path
+        if not path or not self.metrics:
+            return
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        print(f"Metrics written to {path}")
+
+
+def counter(name, help, labels=()):
+    return Registry.shared().get(Counter, name, help, labels)
+
+
+def gauge(name, help, labels=()):
+    return Registry.shared().get(Gauge, name, help, labels)
+
+
+def histogram(name, help, labels=(), buckets=DEFAULT_BUCKETS):
+    return Registry.shared().get(Histogram, name, help, labels, buckets=buckets)
+
+
+def cache_lookup(tier, hit):
+    """One answer-cache lookup: tier is stored_answer, answer_cache or vision_cache"""
+    counter("answer_cache_lookups_total", "Answer cache lookups by tier and result",
+            ("tier", "result")).inc(tier=tier, result="hit" if hit else "miss")
@@ -0,0 +1,248 @@
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from configobj import ConfigObj
+
+# Local stand-in for OpenRouter / Groq (OpenAI chat-completions) and Ollama (/api/chat).
+# Start with `python -m edpuzzlesolver.mockllm` and set `enabled = true` under [mock_llm]
+# in config.ini so LLMManager points every provider at it.
+
+
+def as_text(value):
+    # ConfigObj turns comma-separated values into lists
+    if isinstance(value, (list, tuple)):
+        return ",".join(str(v) for v in value)
+    return str(value)
+
+
+def parse_distribution(spec):
+    """'fixed:0.2', 'uniform:0.1,0.5', 'normal:0.3,0.1' or 'lognormal:-1.5,0.5' -> sampler"""
+    kind, _, args = as_text(spec).partition(':')
+    values = [float(v) for v in args.split(',') if v.strip()] if args else []
+    if kind == 'fixed':
+        return lambda rng: values[0]
+    if kind == 'uniform':
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == 'normal':
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == 'lognormal':
+        return lambda rng: rng.lognormvariate(values[0], values[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class MockBehaviour:
+    """Latency, failures and scripted answers shared by all handler threads"""
+
+    def __init__(self, settings):
+        self.rng = random.Random(int(settings.get('seed', 42)))
+        self.latency = parse_distribution(settings.get('latency', 'fixed:0.05'))
+        self.token_interval = float(settings.get('token_interval', 0.01))
+        self.error_rate = float(settings.get('error_rate', 0.0))
+        self.burst_every = int(settings.get('burst_429_every', 0))
+        self.burst_length = int(settings.get('burst_429_length', 3))
+        self.default_answer = as_text(settings.get('default_answer', '1'))
+        self.reasoning_prefix = as_text(settings.get('reasoning_prefix', ''))
+        self.answers = {}
+        script = settings.get('answers_file', '')
+        if script:
+            with open(script, "r", encoding="utf-8") as f:
+                self.answers = json.load(f)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.stats = {"requests": 0, "errors": 0, "rate_limited": 0}
+
+    def next_outcome(self):
+        """Returns (status, delay) for the next request"""
+        with self.lock:
+            self.requests += 1
+            self.stats["requests"] += 1
+            n = self.requests
+            # The last burst_length requests of every burst_every window, so each run starts with successes
+            if self.burst_every and (n - 1) % self.burst_every >= self.burst_every - self.burst_length:
+                self.stats["rate_limited"] += 1
+                return 429, 0.0
+            if self.rng.random() < self.error_rate:
+                self.stats["errors"] += 1
+                return 500, self.latency(self.rng)
+            return 200, self.latency(self.rng)
+
+    def answer_for(self, prompt):
+        question = prompt
+        match = re.search(r"^Q:\s*(.+)$", prompt, re.MULTILINE) or re.search(r"Question:\s*(.+)", prompt)
+        if match:
+            question = match.group(1).strip()
+        if question in self.answers:
+            return str(self.answers[question])
+        for key, answer in self.answers.items():
+            if key in prompt:
+                return str(answer)
+        return self.default_answer
+
+    def reply_text(self, prompt):
+        return self.reasoning_prefix + self.answer_for(prompt)
+
+
+def last_user_text(messages):
+    for message in reversed(messages or []):
+        content = message.get('content', '')
+        if isinstance(content, list):
+            content = " ".join(part.get('text', '') for part in content if isinstance(part, dict))
+        if content:
+            return content
+    return ""
+
+
+def chunk_text(text):
+    return re.findall(r"\s*\S+|\s+", text) or [text]
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    behaviour = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if status == 429:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.startswith("/api/tags"):
+            self.send_json(200, {"models": [{"name": "mock"}]})
+        elif self.path.startswith("/api/version"):
+            self.send_json(200, {"version": "mock"})
+        elif self.path.startswith("/stats"):
+            self.send_json(200, self.behaviour.stats)
+        elif self.path.endswith("/models"):
+            self.send_json(200, {"object": "list", "data": [{"id": "mock", "object": "model"}]})
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self.send_json(400, {"error": "invalid json"})
+            return
+
+        status, delay = self.behaviour.next_outcome()
+        time.sleep(delay)
+        if status != 200:
+            message = "Rate limit exceeded" if status == 429 else "Mock upstream error"
+            self.send_json(status, {"error": {"message": message, "type": "mock_error", "code": status}})
+            return
+
+        if self.path.endswith("/chat/completions"):
+            self.openai_chat(request)
+        elif self.path.startswith("/api/chat"):
+            self.ollama_chat(request)
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def openai_chat(self, request):
+        prompt = last_user_text(request.get('messages'))
+        text = self.behaviour.reply_text(prompt)
+        model = request.get('model', 'mock')
+        created = int(time.time())
+        usage = {"prompt_tokens": max(1, len(prompt) // 4), "completion_tokens": max(1, len(text) // 4)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        if not request.get('stream'):
+            self.send_json(200, {
+                "id": "chatcmpl-mock", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        try:
+            for piece in chunk_text(text):
+                chunk = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": created, "model": model,
+                         "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                time.sleep(self.behaviour.token_interval)
+            done = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+            self.wfile.write(f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+        except (BrokenPipeError, ConnectionResetError):
+            # Client cancelled the stream after an early decision
+            pass
+
+    def ollama_chat(self, request):
+        prompt = last_user_text(request.get('messages'))
+        text = self.behaviour.reply_text(prompt)
+        model = request.get('model', 'mock')
+        base = {"model": model, "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}
+        counts = {"prompt_eval_count": max(1, len(prompt) // 4), "eval_count": max(1, len(text) // 4)}
+        if request.get('stream') is False:
+            self.send_json(200, dict(base, message={"role": "assistant", "content": text},
+                                     done=True, done_reason="stop", **counts))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        try:
+            for piece in chunk_text(text):
+                line = dict(base, message={"role": "assistant", "content": piece}, done=False)
+                self.wfile.write((json.dumps(line) + "\n").encode("utf-8"))
+                self.wfile.flush()
+                time.sleep(self.behaviour.token_interval)
+            final = dict(base, message={"role": "assistant", "content": ""}, done=True, done_reason="stop", **counts)
+            self.wfile.write((json.dumps(final) + "\n").encode("utf-8"))
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def start_mock_server(settings, host=None, port=None):
+    """Start the mock in a daemon thread; returns the server (call shutdown() to stop)"""
+    host = host or settings.get('host', '127.0.0.1')
+    port = int(port if port is not None else settings.get('port', 8765))
+    handler = type("ConfiguredMockHandler", (MockHandler,), {"behaviour": MockBehaviour(settings)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Mock LLM server listening on http://{host}:{server.server_address[1]}")
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deterministic local stand-in for the LLM providers")
+    parser.add_argument("--config", default="config.ini")
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int)
+    args = parser.parse_args()
+
+    settings = ConfigObj(args.config).get('mock_llm', {})
+    server = start_mock_server(settings, args.host, args.port)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print(f"Stopping mock server. Stats: {server.RequestHandlerClass.behaviour.stats}")
+        server.shutdown()
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
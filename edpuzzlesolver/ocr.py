@@ -0,0 +1,190 @@
+import re
+import time
+import hashlib
+import difflib
+from threading import Lock
+from collections import OrderedDict
+
+# Screen OCR for locating option text: one capture of the region of interest, one Tesseract
+# image_to_data pass, and a line/paragraph index that answers every locate() for that frame.
+
+TESSERACT_CONFIG = r'--oem 3 --psm 6'
+
+
+def normalize(text):
+    return re.sub(r"\s+", " ", text).strip().rstrip('.').lower()
+
+
+def union_box(boxes):
+    left = min(b[0] for b in boxes)
+    top = min(b[1] for b in boxes)
+    right = max(b[0] + b[2] for b in boxes)
+    bottom = max(b[1] + b[3] for b in boxes)
+    return left, top, right - left, bottom - top
+
+
+class OcrFrame:
+    """Words from one image_to_data pass, regrouped into lines and paragraphs.
+
+    Boxes are (x, y, w, h) relative to the captured region; `offset` converts them to screen coordinates.
+    """
+
+    def __init__(self, image, offset, data, seconds=0.0):
+        self.image = image
+        self.offset = offset
+        self.seconds = seconds
+        self.words = []
+        lines = OrderedDict()
+        for i, text in enumerate(data['text']):
+            text = text.strip()
+            if not text or float(data['conf'][i]) < 0:
+                continue
+            word = {
+                "text": text,
+                "box": (data['left'][i], data['top'][i], data['width'][i], data['height'][i]),
+                "conf": float(data['conf'][i]),
+            }
+            self.words.append(word)
+            key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+            lines.setdefault(key, []).append(word)
+
+        self.lines = []
+        paragraphs = OrderedDict()
+        for (block, par, _), words in lines.items():
+            line = {"text": " ".join(w["text"] for w in words), "box": union_box([w["box"] for w in words]),
+                    "words": words}
+            self.lines.append(line)
+            paragraphs.setdefault((block, par), []).append(line)
+        self.paragraphs = [
+            {"text": " ".join(l["text"] for l in group), "box": union_box([l["box"] for l in group]), "lines": group}
+            for group in paragraphs.values()
+        ]
+
+    @property
+    def text(self):
+        return "\n\n".join("\n".join(l["text"] for l in p["lines"]) for p in self.paragraphs)
+
+    def _span(self, words, target):
+        """Box of the shortest run of words in a line whose text contains the target"""
+        texts = [w["text"] for w in words]
+        for end in range(len(words)):
+            if target not in normalize(" ".join(texts[:end + 1])):
+                continue
+            start = end
+            while start > 0 and target not in normalize(" ".join(texts[start:end + 1])):
+                start -= 1
+            return union_box([w["box"] for w in words[start:end + 1]])
+        return None
+
+    def locate(self, target_text, min_ratio=0.8):
+        """Best match for target_text as {"text", "box", "screen_box", "center"}, or None.
+
+        Tries an exact span within a line, then a paragraph (options that wrap), then the closest line by
+        similarity ratio.
+        """
+        target = normalize(target_text)
+        if not target:
+            return None
+        for line in self.lines:
+            if target in normalize(line["text"]):
+                return self._match(line["text"], self._span(line["words"], target) or line["box"])
+        for paragraph in self.paragraphs:
+            if target in normalize(paragraph["text"]):
+                return self._match(paragraph["text"], paragraph["box"])
+        best, best_ratio = None, min_ratio
+        for line in self.lines:
+            ratio = difflib.SequenceMatcher(None, target, normalize(line["text"])).ratio()
+            if ratio >= best_ratio:
+                best, best_ratio = line, ratio
+        return self._match(best["text"], best["box"]) if best else None
+
+    def _match(self, text, box):
+        x, y, w, h = box
+        screen_box = (x + self.offset[0], y + self.offset[1], w, h)
+        return {"text": text, "box": box, "screen_box": screen_box,
+                "center": (screen_box[0] + w // 2, screen_box[1] + h // 2)}
+
+    def crop(self, box, padding=10):
+        """RGB numpy crop of the captured region around a frame-relative box"""
+        x, y, w, h = box
+        height, width = self.image.shape[:2]
+        return self.image[max(y - padding, 0):min(y + h + padding, height),
+                          max(x - padding, 0):min(x + w + padding, width)]
+
+
+class OcrService:
+    """Captures the ROI once per read() and memoizes OCR results by a hash of the captured pixels.
+
+    roi is (left, top, right, bottom) as fractions of the monitor, e.g. (0.7, 0, 1, 1) for the right 30%.
+    """
+
+    def __init__(self, roi=(0.0, 0.0, 1.0, 1.0), monitor_index=1, cache_size=8,
+                 tesseract_config=TESSERACT_CONFIG, tesseract_cmd=None):
+        self.roi = roi
+        self.monitor_index = monitor_index
+        self.cache_size = int(cache_size)
+        self.tesseract_config = tesseract_config
+        self.tesseract_cmd = tesseract_cmd
+        self.cache = OrderedDict()
+        self.lock = Lock()
+        self.frame = None
+
+    def capture(self):
+        """Grab only the ROI rectangle; returns (RGB numpy array, (x, y) screen offset)"""
+        import mss
+        import numpy as np
+
+        with mss.mss() as sct:
+            monitor = sct.monitors[self.monitor_index]
+            left, top, right, bottom = self.roi
+            region = {
+                "left": monitor["left"] + int(monitor["width"] * left),
+                "top": monitor["top"] + int(monitor["height"] * top),
+                "width": max(1, int(monitor["width"] * (right - left))),
+                "height": max(1, int(monitor["height"] * (bottom - top))),
+            }
+            shot = sct.grab(region)
+            image = np.frombuffer(shot.rgb, dtype=np.uint8).reshape(shot.height, shot.width, 3)
+        return image, (region["left"], region["top"])
+
+    @staticmethod
+    def preprocess(image):
+        import cv2
+
+        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        return thresh
+
+    def read(self, image=None, offset=(0, 0)):
+        """OCR a new capture (or the given RGB array); identical frames reuse the earlier pass"""
+        import pytesseract
+
+        if image is None:
+            image, offset = self.capture()
+        key = hashlib.blake2b(image.tobytes(), digest_size=16).hexdigest()
+        with self.lock:
+            frame = self.cache.get(key)
+            if frame is not None:
+                self.cache.move_to_end(key)
+                frame.offset = offset
+                self.frame = frame
+                print("OCR frame unchanged; reusing previous pass")
+                return frame
+        if self.tesseract_cmd:
+            pytesseract.pytesseract.tesseract_cmd = self.tesseract_cmd
+        start = time.perf_counter()
+        data = pytesseract.image_to_data(self.preprocess(image), config=self.tesseract_config,
+                                         output_type=pytesseract.Output.DICT)
+        frame = OcrFrame(image, offset, data, time.perf_counter() - start)
+        print(f"OCR pass: {len(frame.words)} words, {len(frame.lines)} lines in {frame.seconds:.2f}s")
+        with self.lock:
+            self.cache[key] = frame
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+            self.frame = frame
+        return frame
+
+    def locate(self, target_text, frame=None):
+        """Find text in the given frame, else the last one read (capturing only if none exists yet)"""
+        frame = frame or self.frame or self.read()
+        return frame.locate(target_text)
@@ -14,10 +14,9 @@ import json
 from datetime import datetime
 import time
 import cv2
-import numpy as np
 import pytesseract
-import mss
 from PIL import Image
+from edpuzzlesolver.ocr import OcrService
 
 # Set pyautogui pause to ensure actions are not too fast
 pyautogui.PAUSE = 0.5
@@ -151,6 +150,8 @@ class ImageProcessor:
         os.makedirs(self.option_screenshot_folder, exist_ok=True)
         self.history_file = os.path.join("history", f"conversation_history_{self.run_timestamp}.json")
         os.makedirs("history", exist_ok=True)
+        # Questions and options appear on the right ~30% of the screen
+        self.ocr = OcrService(roi=(0.7, 0.0, 1.0, 1.0))
 
     def save_history(self):
         with open(self.history_file, "w") as history_file:
@@ -255,76 +256,32 @@ class ImageProcessor:
                     errors.append(f"Groq: {str(e)}")
                     return f"Unable to get answer. Errors: {'; '.join(errors)}"
 
-    def capture_screen(self, monitor_index=1):
-        with mss.mss() as sct:
-            monitor = sct.monitors[monitor_index]
-            screenshot = sct.grab(monitor)
-            img = Image.frombytes('RGB', screenshot.size, screenshot.rgb)
-            return img
-
-    def preprocess_image(self, img_cv):
-        gray = cv2.cvtColor(img_cv, cv2.COLOR_RGB2GRAY)
-        _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        return thresh
-
-def find_and_crop_option(self, target_text, option_index=None, padding=10):
-        print(f"Capturing screen to find option: {target_text}")
+    def find_and_crop_option(self, target_text, option_index=None, padding=10, frame=None):
+        """Locate option text in an OCR frame (read once per detection) and save a crop of it"""
+        print(f"Looking up option: {target_text}")
         try:
-            # Capture full screen
-            img_pil = self.capture_screen()
-            img_cv = np.array(img_pil)
-            
-            # Get screen dimensions
-            screen_height, screen_width = img_cv.shape[:2]
-            
-            # Define the right side area (approximately 30% of the screen width)
-            right_side_width = int(screen_width * 0.3)
-            right_side_x = screen_width - right_side_width
-            
-            # Crop to just the right side where questions and options appear
-            right_side_img = img_cv[:, right_side_x:screen_width]
-            
-            print("Preprocessing image for OCR...")
-            processed_img = self.preprocess_image(right_side_img)
+            frame = frame or self.ocr.read()
+            match = frame.locate(target_text)
+            if not match:
+                print(f"Option '{target_text}' not found on the screen.")
+                return None, None
             
-            print("Running OCR...")
-            custom_config = r'--oem 3 --psm 6'
-            data = pytesseract.image_to_data(processed_img, config=custom_config, output_type=pytesseract.Output.DICT)
-            extracted_text = pytesseract.image_to_string(processed_img, config=custom_config)
-            print("Extracted Text from Screen:\n", extracted_text)
+            cropped_img = frame.crop(match["box"], padding)
+            if option_index is not None:
+                # Use option_index to name the file
+                option_name = f"option_{option_index}"
+            else:
+                option_name = f"option_{target_text.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            option_path = os.path.join(self.option_screenshot_folder, f"{option_name}.png")
+            cv2.imwrite(option_path, cv2.cvtColor(cropped_img, cv2.COLOR_RGB2BGR))
+            print(f"Screenshot saved as {option_path}")
             
-            # Normalize target text (remove trailing period and extra whitespace)
-            target_text_normalized = target_text.strip().rstrip('.').lower()
-            
-            for i in range(len(data['text'])):
-                ocr_text = data['text'][i].strip().rstrip('.').lower()
-                if ocr_text and (target_text_normalized in ocr_text or ocr_text in target_text_normalized):
-                    # These coordinates are relative to the cropped image
-                    x, y, w, h = data['left'][i], data['top'][i], data['width'][i], data['height'][i]
-                    x_start, y_start = max(x - padding, 0), max(y - padding, 0)
-                    x_end, y_end = min(x + w + padding, right_side_img.shape[1]), min(y + h + padding, right_side_img.shape[0])
-                    
-                    # Create cropped image of just the option
-                    cropped_img = right_side_img[y_start:y_end, x_start:x_end]
-                    if option_index is not None:
-                        # Use option_index to name the file
-                        option_name = f"option_{option_index}"
-                    else:
-                        option_name = f"option_{target_text.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-                    option_path = os.path.join(self.option_screenshot_folder, f"{option_name}.png")
-                    cv2.imwrite(option_path, cv2.cvtColor(cropped_img, cv2.COLOR_RGB2BGR))
-                    print(f"Screenshot saved as {option_path}")
-                    
-                    # Convert back to global screen coordinates for clicking
-                    global_center_x = right_side_x + x_start + (x_end - x_start) // 2
-                    global_center_y = y_start + (y_end - y_start) // 2
-                    return option_path, (global_center_x, global_center_y)
-            
-            print(f"Option '{target_text}' not found on the screen.")
-            return None, None
+            # Screen coordinates for clicking
+            return option_path, match["center"]
         except Exception as e:
             print(f"Error in find_and_crop_option: {e}")
             return None, None
+
 class SpeechManager:
     def __init__(self):
         self.speaking = False
@@ -452,17 +409,20 @@ class FloatingUI:
         return options
     def select_option(self, answer, options):
         option_mapping = {}
+        # One capture and one OCR pass serve the question and every option lookup
+        frame = self.image_processor.ocr.read()
+        print("Extracted Text from Screen:\n", frame.text)
         
         # Save the first item as the question (option_0)
         question_text = question_and_options.split('\n')[0].strip()  # Assuming first line is the question
-        question_path, _ = self.image_processor.find_and_crop_option(question_text, option_index=0)
+        question_path, _ = self.image_processor.find_and_crop_option(question_text, option_index=0, frame=frame)
         if question_path:
             option_mapping["option_0"] = question_text
             print(f"Question saved as {question_path}")
         
         # Save each option as option_1, option_2, etc.
         for idx, option in enumerate(options, start=1):
-            option_path, _ = self.image_processor.find_and_crop_option(option, option_index=idx)
+            option_path, _ = self.image_processor.find_and_crop_option(option, option_index=idx, frame=frame)
             if option_path:
                 option_mapping[f"option_{idx}"] = option
                 print(f"Option {idx} saved as {option_path}")
@@ -0,0 +1,158 @@
+import os
+import re
+import json
+from threading import Lock
+
+# Built-in template used when config.ini has no [prompts_<source>:<model>], [prompts_<source>] or
+# [prompts_default] section for a provider/model.
+DEFAULT_TEMPLATE = {
+    "instruction": "Reply with the number of the correct option only.",
+    "max_tokens": 4,
+    "reasoning": "default",
+    "slow_threshold": 3.0,
+    "stream": "false",
+}
+
+THINK_BLOCK = re.compile(r"<think>.*?(</think>|$)", re.DOTALL | re.IGNORECASE)
+# A number opening the reply: "3", "Option 3", "**Answer: 3**"
+LEADING_NUMBER = re.compile(r"[\s\"'*(\[]*(?:(?:option|answer)\s*(?:number|no\.?)?\s*[:#]?\s*)?(\d+)(\D?)", re.I)
+# A number named as the answer anywhere in prose: "the answer is 3", "option 2", "choice #4"
+NAMED_NUMBER = re.compile(r"\b(?:option|choice|answer(?:\s+is)?)\s*(?:number|no\.?)?\s*[:#]?\s*(\d+)\b", re.I)
+
+
+class PromptTemplate:
+    def __init__(self, name, instruction, max_tokens, reasoning, slow_threshold, stream):
+        self.name = name
+        self.instruction = instruction
+        self.max_tokens = int(max_tokens)
+        self.reasoning = reasoning.lower()
+        self.slow_threshold = float(slow_threshold)
+        self.stream = str(stream).lower() in ('true', 'yes', '1')
+
+    def build(self, question, options):
+        """Compact numbered-option prompt, answered with a single index"""
+        lines = [f"Q: {question}"]
+        for i, option in enumerate(options, 1):
+            lines.append(f"{i}. {option}")
+        lines.append(self.instruction)
+        return "\n".join(lines)
+
+
+class PromptRegistry:
+    """Templates from [prompts_<source>:<model>], [prompts_<source>] or [prompts_default] sections"""
+
+    def __init__(self, config):
+        self.config = config
+        settings = config.get('prompts', {})
+        self.stats = PromptStats(settings.get('stats_file', os.path.join('metrics', 'prompt_stats.json')))
+
+    def get(self, source, model):
+        for key in (f"{source}:{model}", source, 'default'):
+            section = f"prompts_{key}"
+            if section in self.config:
+                values = dict(DEFAULT_TEMPLATE)
+                if key != 'default':
+                    values.update(self.config.get('prompts_default', {}))
+                values.update(self.config[section])
+                return PromptTemplate(key, values['instruction'], values['max_tokens'],
+                                      values['reasoning'], values['slow_threshold'], values['stream'])
+        return PromptTemplate('builtin', **DEFAULT_TEMPLATE)
+
+
+class PromptStats:
+    """Per-template token counts and time-to-answer, persisted as JSON"""
+
+    def __init__(self, stats_file):
+        self.stats_file = stats_file
+        self.lock = Lock()
+        self.data = {}
+        if os.path.exists(stats_file):
+            try:
+                with open(stats_file, "r", encoding="utf-8") as f:
+                    self.data = json.load(f)
+            except Exception as e:
+                print(f"Could not read prompt stats {stats_file}: {e}")
+
+    def record(self, template, source, seconds, input_tokens, output_tokens, ttft=None):
+        with self.lock:
+            entry = self.data.setdefault(template.name, {
+                "calls": 0, "input_tokens": 0, "output_tokens": 0,
+                "total_seconds": 0.0, "max_seconds": 0.0,
+            })
+            entry["calls"] += 1
+            entry["input_tokens"] += input_tokens
+            entry["output_tokens"] += output_tokens
+            entry["total_seconds"] += seconds
+            entry["max_seconds"] = max(entry["max_seconds"], seconds)
+            entry["avg_seconds"] = entry["total_seconds"] / entry["calls"]
+            entry["last_source"] = source
+            if ttft is not None:
+                # For streamed calls 'seconds' is the time-to-decision
+                entry["streamed_calls"] = entry.get("streamed_calls", 0) + 1
+                entry["total_ttft"] = entry.get("total_ttft", 0.0) + ttft
+                entry["avg_ttft"] = entry["total_ttft"] / entry["streamed_calls"]
+            self.save()
+        if seconds > template.slow_threshold:
+            print(f"Warning: template '{template.name}' took {seconds:.2f}s via {source} "
+                  f"({output_tokens} output tokens) - check reasoning/max_tokens settings")
+
+    def save(self):
+        directory = os.path.dirname(self.stats_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.stats_file, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, indent=4)
+
+
+def estimate_tokens(text):
+    # Rough fallback when the provider does not report usage
+    return max(1, len(text) // 4)
+
+
+def usage_from_result(result, llm, prompt, text):
+    # LangChain messages carry usage_metadata; ProviderLLM keeps the last completion's usage
+    usage = getattr(result, 'usage_metadata', None) or getattr(llm, 'last_usage', None)
+    if usage:
+        return usage.get('input_tokens', 0), usage.get('output_tokens', 0)
+    return estimate_tokens(prompt), estimate_tokens(text)
+
+
+def reasoning_kwargs(source, mode):
+    """Provider-specific switches to suppress reasoning output"""
+    if mode == 'default':
+        return {}
+    if source == 'openrouter':
+        # OpenRouter has no hard off switch for every model; lowest effort with the trace excluded
+        return {"reasoning": {"effort": "low", "exclude": True}}
+    if source == 'groq':
+        # Only valid for Groq reasoning models, so templates opt in per model
+        return {"reasoning_format": "hidden"}
+    if source == 'ollama':
+        return {"reasoning": False}
+    return {}
+
+
+def parse_option_index(text, options):
+    """Return the 0-based option index named in an LLM reply, or None.
+
+    Option text, then the last number named as the answer ("the answer is 3"), then a leading
+    number; a bare number in prose only counts when it is the only option number mentioned.
+    """
+    if not text:
+        return None
+    cleaned = THINK_BLOCK.sub("", text).strip()
+    lowered = cleaned.lower().rstrip('.')
+    for i, option in enumerate(options):
+        if option.strip().lower().rstrip('.') == lowered:
+            return i
+    in_range = lambda n: 1 <= int(n) <= len(options)
+    named = [n for n in NAMED_NUMBER.findall(cleaned) if in_range(n)]
+    if named:
+        return int(named[-1]) - 1
+    leading = LEADING_NUMBER.match(cleaned)
+    if leading and in_range(leading.group(1)):
+        return int(leading.group(1)) - 1
+    mentioned = {int(n) for n in re.findall(r"\b(\d+)\b", cleaned) if in_range(n)}
+    if len(mentioned) == 1:
+        return mentioned.pop() - 1
+    return None
@@ -0,0 +1,414 @@
+import os
+import json
+import time
+import atexit
+import hashlib
+import configparser
+from threading import Lock
+from collections import OrderedDict
+from edpuzzlesolver.prompts import THINK_BLOCK
+from edpuzzlesolver import metrics
+
+# One provider layer for both entry points: hi.py (vision + answer text) and LLMManager (option index).
+# SDK clients, provider health, the answer cache and latency metrics are process-wide, so a client
+# opened by one caller keeps its connection pool warm for the other.
+
+PROVIDER_KEYS = {'openrouter': 'OPENROUTER_API_KEY', 'groq': 'GROQ_API_KEY', 'ollama': None}
+
+# Used when neither [llms_<source>] nor the legacy [<source>] section names a model
+DEFAULT_MODELS = {
+    'openrouter': {'model': 'deepseek/deepseek-r1:free', 'vision_model': 'meta-llama/llama-3.2-11b-vision-instruct:free'},
+    'groq': {'model': 'llama-3.3-70b-versatile', 'vision_model': 'llama-3.2-90b-vision-preview'},
+    'ollama': {'model': 'mistral:latest', 'vision_model': 'llama3.2-vision:latest'},
+}
+LEGACY_KEYS = {'model': 'ANSWER_MODEL', 'vision_model': 'VISION_MODEL'}
+
+
+class ProviderError(Exception):
+    pass
+
+
+def config_value(config, section, key, fallback=None):
+    """Read from either a configparser (hi.py) or a ConfigObj (LLMManager) config"""
+    if isinstance(config, configparser.RawConfigParser):
+        return config.get(section, key, fallback=fallback)
+    value = config.get(section, {}).get(key, fallback)
+    return ", ".join(value) if isinstance(value, (list, tuple)) else value
+
+
+def provider_settings(config, source):
+    """Model names, temperature and endpoint for a source from [llms_<source>], then legacy [<source>]"""
+    section = f"llms_{source}"
+    settings = {}
+    for key, default in DEFAULT_MODELS.get(source, {}).items():
+        legacy = config_value(config, source, LEGACY_KEYS[key])
+        settings[key] = config_value(config, section, key) or legacy or default
+    settings['temperature'] = float(config_value(config, section, 'temperature', '0.0'))
+    settings['base_url'] = config_value(config, section, 'base_url') or None
+    settings['site_url'] = config_value(config, section, 'site_url', 'http://localhost')
+    settings['site_name'] = config_value(config, section, 'site_name', 'EdpuzzleSolver')
+    return settings
+
+
+class ProviderHealth:
+    """Skips a provider for `cooldown` seconds after `threshold` consecutive failures"""
+
+    def __init__(self, threshold=3, cooldown=30.0):
+        self.threshold = int(threshold)
+        self.cooldown = float(cooldown)
+        self.failures = {}
+        self.blocked_until = {}
+        self.lock = Lock()
+
+    def available(self, source):
+        return time.monotonic() >= self.blocked_until.get(source, 0.0)
+
+    def success(self, source):
+        with self.lock:
+            self.failures[source] = 0
+            self.blocked_until.pop(source, None)
+
+    def failure(self, source):
+        with self.lock:
+            self.failures[source] = self.failures.get(source, 0) + 1
+            if self.failures[source] >= self.threshold:
+                self.blocked_until[source] = time.monotonic() + self.cooldown
+                print(f"{source} failed {self.failures[source]} times in a row; skipping it for {self.cooldown:.0f}s")
+
+
+class LatencyMetrics:
+    """Call latencies per provider and call kind, summarised as p50/p95 and written at exit"""
+
+    def __init__(self, path):
+        self.path = path
+        self.samples = {}
+        self.lock = Lock()
+
+    def observe(self, source, kind, seconds, cached=False):
+        key = f"{source}/{kind}" + ("/cached" if cached else "")
+        with self.lock:
+            self.samples.setdefault(key, []).append(seconds)
+
+    def summary(self):
+        result = {}
+        with self.lock:
+            for key, values in self.samples.items():
+                ordered = sorted(values)
+                result[key] = {
+                    "calls": len(ordered),
+                    "p50": round(ordered[len(ordered) // 2], 4),
+                    "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4),
+                }
+        return result
+
+    def save(self):
+        summary = self.summary()
+        if not summary or not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=4)
+
+
+class AnswerCache:
+    """LRU of deterministic (temperature 0) completions keyed by provider, model and messages"""
+
+    def __init__(self, path, max_entries=1000):
+        self.path = path
+        self.max_entries = int(max_entries)
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.dirty = False
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.entries.update(json.load(f))
+            except Exception as e:
+                print(f"Could not read answer cache {path}: {e}")
+
+    @staticmethod
+    def key(source, base_url, model, messages, max_tokens):
+        # The endpoint is part of the key so replies from the local mock never answer real runs
+        payload = json.dumps([source, base_url, model, messages, max_tokens], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            text = self.entries.get(key)
+            if text is not None:
+                self.entries.move_to_end(key)
+            return text
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.dirty = True
+
+    def put(self, key, text):
+        with self.lock:
+            self.entries[key] = text
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.dirty = True
+
+    def save(self):
+        if not self.path or not self.dirty:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self.lock:
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f)
+            self.dirty = False
+
+
+def record_request(source, kind, seconds, status):
+    metrics.counter("llm_requests_total", "LLM calls by provider, kind and outcome",
+                    ("provider", "kind", "status")).inc(provider=source, kind=kind, status=status)
+    if status == "ok":
+        metrics.histogram("llm_request_seconds", "LLM call latency by provider and kind",
+                          ("provider", "kind")).observe(seconds, provider=source, kind=kind)
+
+
+def count_fallback(source, reason):
+    metrics.counter("llm_fallbacks_total", "Times a provider was passed over for the next one",
+                    ("provider", "reason")).inc(provider=source, reason=reason)
+
+
+def ollama_chat(client, extra, **kwargs):
+    """client.chat with thinking switched off when the template asks for no reasoning"""
+    if extra.get("reasoning") is False:
+        try:
+            return client.chat(think=False, **kwargs)
+        except TypeError:
+            # ollama-python before 0.5 has no think argument; the reply is still stripped of <think>
+            print("Installed ollama client cannot disable thinking; upgrade to ollama>=0.5")
+    return client.chat(**kwargs)
+
+
+class ProviderLayer:
+    """Text and vision chat calls against openrouter / groq / ollama with shared clients and state"""
+
+    _shared = None
+    _shared_lock = Lock()
+
+    def __init__(self, config):
+        self.config = config
+        get = lambda key, fallback: config_value(config, 'providers', key, fallback)
+        self.health = ProviderHealth(get('failure_threshold', '3'), get('cooldown', '30'))
+        self.metrics = LatencyMetrics(get('metrics_file', os.path.join('metrics', 'provider_latency.json')))
+        use_cache = str(get('answer_cache', 'true')).lower() in ('true', 'yes', '1')
+        # ANSWER_CACHE_PATH keeps replay and benchmark runs away from the real cache file
+        cache_path = os.getenv('ANSWER_CACHE_PATH') or get('answer_cache_path', os.path.join('cache', 'answer_cache.json'))
+        self.cache = AnswerCache(cache_path,
+                                 get('answer_cache_size', '1000')) if use_cache else None
+        self.clients = {}
+        self.clients_lock = Lock()
+        self.client_locks = {}
+        atexit.register(self.close)
+
+    @classmethod
+    def shared(cls, config):
+        """The process-wide layer; the first caller's config decides cache and health settings"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(config)
+            return cls._shared
+
+    @classmethod
+    def clear_shared_cache(cls):
+        """Forget cached completions of the process-wide layer, if one exists (cold benchmark runs)"""
+        with cls._shared_lock:
+            layer = cls._shared
+        if layer is not None and layer.cache is not None:
+            layer.cache.clear()
+
+    def settings(self, source):
+        return provider_settings(self.config, source)
+
+    def endpoint(self, source):
+        settings = self.settings(source)
+        env_key = PROVIDER_KEYS.get(source)
+        return settings['base_url'], os.getenv(env_key) if env_key else None
+
+    def client(self, source, base_url=None, api_key=None):
+        """SDK client per (source, endpoint, key), created once and reused for its connection pool"""
+        if source not in PROVIDER_KEYS:
+            raise ProviderError(f"Unsupported provider: {source}")
+        if base_url is None and api_key is None:
+            base_url, api_key = self.endpoint(source)
+        if PROVIDER_KEYS[source] and not api_key:
+            raise ProviderError(f"{PROVIDER_KEYS[source]} not found")
+        key = (source, base_url, api_key)
+        with self.clients_lock:
+            client = self.clients.get(key)
+            lock = self.client_locks.setdefault(key, Lock())
+        if client is not None:
+            return client
+        # Per-endpoint lock: different providers import their SDKs and connect in parallel
+        with lock:
+            if key not in self.clients:
+                start = time.perf_counter()
+                if source == 'openrouter':
+                    from openai import OpenAI
+                    client = OpenAI(base_url=base_url or "https://openrouter.ai/api/v1", api_key=api_key)
+                elif source == 'groq':
+                    from groq import Groq
+                    client = Groq(api_key=api_key, base_url=base_url)
+                else:
+                    from ollama import Client
+                    client = Client(host=base_url)
+                print(f"Loaded {source} client in {time.perf_counter() - start:.2f}s")
+                with self.clients_lock:
+                    self.clients[key] = client
+            return self.clients[key]
+
+    def chat(self, source, messages, model=None, kind="text", temperature=None, max_tokens=None,
+             extra=None, endpoint=None):
+        """Full reply text and usage dict (or None) for one chat call"""
+        settings = self.settings(source)
+        model = model or settings['vision_model' if kind == "vision" else 'model']
+        temperature = settings['temperature'] if temperature is None else float(temperature)
+        cache_key = None
+        if self.cache is not None and temperature == 0.0:
+            base_url = endpoint[0] if endpoint else self.endpoint(source)[0]
+            cache_key = AnswerCache.key(source, base_url, model, messages, max_tokens)
+            cached = self.cache.get(cache_key)
+            metrics.cache_lookup("answer_cache", cached is not None)
+            if cached is not None:
+                self.metrics.observe(source, kind, 0.0, cached=True)
+                return cached, None
+        client = self.client(source, *(endpoint or (None, None)))
+        start = time.perf_counter()
+        try:
+            text, usage = self._complete(source, client, settings, model, messages, temperature, max_tokens, extra or {})
+        except Exception:
+            self.health.failure(source)
+            record_request(source, kind, time.perf_counter() - start, "error")
+            raise
+        self.health.success(source)
+        self.metrics.observe(source, kind, time.perf_counter() - start)
+        record_request(source, kind, time.perf_counter() - start, "ok")
+        if not text:
+            raise ProviderError(f"{source} returned an empty response")
+        if cache_key is not None:
+            self.cache.put(cache_key, text)
+        return text, usage
+
+    def _complete(self, source, client, settings, model, messages, temperature, max_tokens, extra):
+        if source == 'ollama':
+            options = {"temperature": temperature}
+            if max_tokens:
+                options["num_predict"] = int(max_tokens)
+            response = ollama_chat(client, extra, model=model, messages=messages, options=options)
+            text = response['message']['content']
+            if extra.get("reasoning") is False:
+                # Models without thinking support ignore the switch and may still emit a block
+                text = THINK_BLOCK.sub("", text).strip()
+            usage = {"input_tokens": response.get('prompt_eval_count') or 0,
+                     "output_tokens": response.get('eval_count') or 0}
+            return text, usage
+        kwargs = {"model": model, "messages": messages, "temperature": temperature}
+        if max_tokens:
+            kwargs["max_tokens"] = int(max_tokens)
+        if source == 'openrouter':
+            kwargs["extra_headers"] = {"HTTP-Referer": settings['site_url'], "X-Title": settings['site_name']}
+        if extra:
+            kwargs["extra_body"] = extra
+        completion = client.chat.completions.create(**kwargs)
+        usage = getattr(completion, 'usage', None)
+        usage = {"input_tokens": usage.prompt_tokens, "output_tokens": usage.completion_tokens} if usage else None
+        return completion.choices[0].message.content, usage
+
+    def stream(self, source, messages, model=None, temperature=None, max_tokens=None, extra=None, endpoint=None):
+        """Yield content deltas; closing the generator closes the HTTP stream"""
+        settings = self.settings(source)
+        model = model or settings['model']
+        temperature = settings['temperature'] if temperature is None else float(temperature)
+        client = self.client(source, *(endpoint or (None, None)))
+        start = time.perf_counter()
+        if source == 'ollama':
+            options = {"temperature": temperature}
+            if max_tokens:
+                options["num_predict"] = int(max_tokens)
+            stream = ollama_chat(client, extra or {}, model=model, messages=messages, options=options, stream=True)
+            deltas = (part['message']['content'] for part in stream)
+        else:
+            kwargs = {"model": model, "messages": messages, "temperature": temperature, "stream": True}
+            if max_tokens:
+                kwargs["max_tokens"] = int(max_tokens)
+            if source == 'openrouter':
+                kwargs["extra_headers"] = {"HTTP-Referer": settings['site_url'], "X-Title": settings['site_name']}
+            if extra:
+                kwargs["extra_body"] = extra
+            try:
+                stream = client.chat.completions.create(**kwargs)
+            except Exception:
+                self.health.failure(source)
+                record_request(source, "stream", time.perf_counter() - start, "error")
+                raise
+            deltas = (chunk.choices[0].delta.content for chunk in stream
+                      if chunk.choices and chunk.choices[0].delta.content)
+        status = "ok"
+        try:
+            for delta in deltas:
+                if delta:
+                    yield delta
+            self.health.success(source)
+        except GeneratorExit:
+            self.health.success(source)
+            raise
+        except Exception:
+            self.health.failure(source)
+            status = "error"
+            raise
+        finally:
+            self.metrics.observe(source, "stream", time.perf_counter() - start)
+            record_request(source, "stream", time.perf_counter() - start, status)
+            if hasattr(stream, 'close'):
+                stream.close()
+
+    def vision(self, source, instruction, image_b64, mime="image/png", model=None):
+        """Text extracted from an image with the source's vision model"""
+        if source == 'ollama':
+            messages = [
+                {"role": "system", "content": instruction},
+                {"role": "user", "content": "Webpage screenshot:", "images": [image_b64]},
+            ]
+        else:
+            messages = [{"role": "user", "content": [
+                {"type": "text", "text": instruction},
+                {"type": "image_url", "image_url": {"url": f"data:{mime};base64,{image_b64}"}},
+            ]}]
+        text, _ = self.chat(source, messages, model=model, kind="vision")
+        return text
+
+    def with_fallback(self, order, call):
+        """call(source) for each healthy source in order; returns (source, result) of the first success"""
+        errors = []
+        for source in order:
+            if not self.health.available(source):
+                errors.append(f"{source}: cooling down after repeated failures")
+                count_fallback(source, "cooldown")
+                continue
+            try:
+                return source, call(source)
+            except Exception as e:
+                print(f"Error with {source}: {e}")
+                errors.append(f"{source}: {e}")
+                count_fallback(source, "error")
+        raise ProviderError("; ".join(errors) or "no providers configured")
+
+    def report(self):
+        lines = [f"{key}: {values['calls']} calls, p50 {values['p50']:.2f}s, p95 {values['p95']:.2f}s"
+                 for key, values in sorted(self.metrics.summary().items())]
+        return "\n".join(lines) or "no provider calls"
+
+    def close(self):
+        self.metrics.save()
+        if self.cache is not None:
+            self.cache.save()
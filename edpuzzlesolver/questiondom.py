@@ -0,0 +1,45 @@
+from selenium.webdriver.common.by import By
+
+# EdPuzzle question panel read straight from the DOM. Shared by the LMS automation (whynot.py) and
+# the voice assistant (hi.py), so neither has to import the other.
+
+QUESTION_DOM_JS = """
+const question = document.querySelector('section.qtU_WlqWdC p') || document.querySelector('div.qtU_WlqWdC p');
+if (!question) return null;
+let options = document.querySelectorAll('section.xpe9TO2_Hw ul.S22KF9HiqC li label span p');
+if (!options.length) options = document.querySelectorAll('ul.S22KF9HiqC li label span p');
+return {question: question.innerText.trim(),
+        options: Array.from(options).map(o => o.innerText.trim()).filter(t => t)};
+"""
+
+
+def read_question_from_dom(driver):
+    """Question and options from the current frame in one script call, or None. No waits, no files."""
+    data = driver.execute_script(QUESTION_DOM_JS)
+    if not data or not data.get("question") or not data.get("options"):
+        return None
+    output = {"Question": data["question"]}
+    for i, option in enumerate(data["options"], 1):
+        output[f"Option {i}"] = option
+    return output
+
+
+def find_question_in_frames(driver):
+    """Try the current frame, then the top document and each iframe; stays in the frame that matched"""
+    output = read_question_from_dom(driver)
+    if output:
+        return output
+    driver.switch_to.default_content()
+    output = read_question_from_dom(driver)
+    if output:
+        return output
+    for frame in driver.find_elements(By.TAG_NAME, "iframe"):
+        try:
+            driver.switch_to.frame(frame)
+            output = read_question_from_dom(driver)
+            if output:
+                return output
+        except Exception as e:
+            print(f"Could not read iframe: {e}")
+        driver.switch_to.default_content()
+    return None
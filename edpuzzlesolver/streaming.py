@@ -0,0 +1,71 @@
+import time
+from edpuzzlesolver.prompts import THINK_BLOCK, LEADING_NUMBER, parse_option_index
+
+# Only a number opening the reply decides early; a digit later in prose ("Between 1 and 4, it's 3")
+# waits for the full text
+
+
+class IncrementalAnswerParser:
+    """Consumes a token stream and decides as soon as the reply names one option unambiguously"""
+
+    def __init__(self, options):
+        self.options = options
+        self.normalized = [option.strip().lower().rstrip('.') for option in options]
+        self.buffer = ""
+
+    def visible_text(self):
+        # Hide reasoning; an unterminated <think> block hides everything after it
+        return THINK_BLOCK.sub("", self.buffer).lstrip()
+
+    def feed(self, chunk):
+        """Add a chunk; return the 0-based option index once it is certain, else None"""
+        self.buffer += chunk
+        text = self.visible_text()
+        if not text or text.startswith("<"):
+            return None
+
+        lowered = text.lower().rstrip('.')
+        candidates = [i for i, option in enumerate(self.normalized) if option.startswith(lowered)]
+        if len(candidates) == 1 and self.normalized[candidates[0]] == lowered:
+            return candidates[0]
+        if candidates:
+            # Still a prefix of option text (which may itself contain digits)
+            return None
+
+        number = LEADING_NUMBER.match(text)
+        if number:
+            value = int(number.group(1))
+            finished = bool(number.group(2)) or len(self.options) < 10
+            if finished and 1 <= value <= len(self.options):
+                return value - 1
+        return None
+
+    def finish(self):
+        """Decision on the complete reply, by the same rules as a non-streamed one"""
+        return parse_option_index(self.buffer, self.options)
+
+
+def stream_decide(chunks, options):
+    """Read text chunks until a decision; closes the stream early. Returns (index, text, ttft, ttd)"""
+    parser = IncrementalAnswerParser(options)
+    start = time.perf_counter()
+    ttft = None
+    index = None
+    try:
+        for chunk in chunks:
+            text = chunk.content if hasattr(chunk, 'content') else chunk
+            if not text:
+                continue
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            index = parser.feed(text)
+            if index is not None:
+                break
+        else:
+            index = parser.finish()
+    finally:
+        # Cancels the remaining completion on the provider side
+        close = getattr(chunks, 'close', None)
+        if close:
+            close()
+    return index, parser.buffer, ttft, time.perf_counter() - start
@@ -0,0 +1,295 @@
+import os
+import sys
+import json
+import time
+import atexit
+import hashlib
+import argparse
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager
+from edpuzzlesolver.providers import config_value
+
+# Lightweight tracing: nested spans with attributes and durations, one JSON object per line.
+# Spans nest through a context variable, so a span opened inside another becomes its child; work
+# handed to another thread keeps its parent when run under contextvars.copy_context().run.
+# With [tracing] otlp_endpoint set, finished spans are also posted in OTLP/HTTP JSON batches to a
+# local collector (Jaeger, the OpenTelemetry Collector) for a flame view. Offline, fold the JSONL
+# for speedscope/flamegraph.pl: python -m edpuzzlesolver.tracing logs/trace.jsonl --folded
+
+_current = contextvars.ContextVar("edpuzzle_span", default=None)
+
+
+def text_hash(text):
+    """Short stable id for a question or prompt, so traces do not carry the full text"""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+
+class Span:
+    def __init__(self, tracer, name, parent, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes)
+        self.error = None
+        self.start_ns = time.time_ns()
+        self.start = time.perf_counter()
+        self.duration = None
+        self.thread = threading.current_thread().name
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def record(self):
+        record = {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start_ns / 1e9,
+            "duration_ms": round(self.duration * 1000, 3),
+            "thread": self.thread,
+            "attributes": self.attributes,
+        }
+        if self.error:
+            record["error"] = self.error
+        return record
+
+
+class Tracer:
+    """Buffers finished spans and writes them to a JSONL file (and an OTLP collector) in the background"""
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, path="logs/trace.jsonl", enabled=True, otlp_endpoint=None, service_name="edpuzzlesolver",
+                 flush_every=64, flush_interval=2.0):
+        self.path = path
+        self.enabled = enabled
+        self.otlp_endpoint = otlp_endpoint or None
+        self.service_name = service_name
+        self.flush_every = int(flush_every)
+        self.flush_interval = float(flush_interval)
+        self.buffer = []
+        self.lock = threading.Lock()
+        self.closed = False
+        self.otlp_failed = False
+        self.file = None
+        if not enabled:
+            return
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, "a", encoding="utf-8")
+        self.last_flush = time.monotonic()
+        threading.Thread(target=self._flush_periodically, daemon=True).start()
+        atexit.register(self.close)
+
+    @classmethod
+    def from_config(cls, config):
+        enabled = str(config_value(config, 'tracing', 'enabled', 'true')).lower() in ('true', 'yes', '1')
+        return cls(
+            path=config_value(config, 'tracing', 'path', 'logs/trace.jsonl'),
+            enabled=enabled,
+            otlp_endpoint=config_value(config, 'tracing', 'otlp_endpoint', ''),
+            service_name=config_value(config, 'tracing', 'service_name', 'edpuzzlesolver'),
+            flush_every=config_value(config, 'tracing', 'flush_every', '64'),
+            flush_interval=config_value(config, 'tracing', 'flush_interval', '2.0'),
+        )
+
+    @classmethod
+    def shared(cls, config=None):
+        """The process-wide tracer; built from config (or ./config.ini) on first use"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                if config is None:
+                    from configobj import ConfigObj
+                    config = ConfigObj('config.ini')
+                cls._shared = cls.from_config(config)
+            return cls._shared
+
+    @contextmanager
+    def span(self, name, **attributes):
+        if not self.enabled:
+            yield Span(self, name, None, attributes)
+            return
+        span = Span(self, name, _current.get(), attributes)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.duration = time.perf_counter() - span.start
+            _current.reset(token)
+            self._finish(span)
+
+    def _finish(self, span):
+        with self.lock:
+            if self.closed:
+                return
+            self.buffer.append(span)
+            if len(self.buffer) >= self.flush_every:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if not self.buffer:
+            return
+        spans, self.buffer = self.buffer, []
+        self.file.write("".join(json.dumps(s.record(), ensure_ascii=False, default=str) + "\n" for s in spans))
+        self.file.flush()
+        self.last_flush = time.monotonic()
+        if self.otlp_endpoint and not self.otlp_failed:
+            self._export_otlp(spans)
+
+    def _export_otlp(self, spans):
+        import urllib.request
+
+        body = json.dumps(otlp_payload(spans, self.service_name), default=str).encode("utf-8")
+        request = urllib.request.Request(self.otlp_endpoint, data=body, headers={"Content-Type": "application/json"})
+        try:
+            urllib.request.urlopen(request, timeout=2).close()
+        except Exception as e:
+            # The JSONL file still has every span; stop retrying a collector that is not running
+            self.otlp_failed = True
+            print(f"Tracing: OTLP export to {self.otlp_endpoint} failed ({e}); writing JSONL only")
+
+    def _flush_periodically(self):
+        while not self.closed:
+            time.sleep(self.flush_interval)
+            with self.lock:
+                if not self.closed and time.monotonic() - self.last_flush >= self.flush_interval:
+                    self._flush_locked()
+
+    def flush(self):
+        with self.lock:
+            if not self.closed and self.file:
+                self._flush_locked()
+
+    def close(self):
+        with self.lock:
+            if self.closed or not self.file:
+                return
+            self._flush_locked()
+            self.closed = True
+            self.file.close()
+
+
+def otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_payload(spans, service_name):
+    """ExportTraceServiceRequest in the OTLP/HTTP JSON encoding"""
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+        "scopeSpans": [{
+            "scope": {"name": "edpuzzlesolver.tracing"},
+            "spans": [{
+                "traceId": s.trace_id,
+                "spanId": s.span_id,
+                "parentSpanId": s.parent_id or "",
+                "name": s.name,
+                "kind": 1,
+                "startTimeUnixNano": str(s.start_ns),
+                "endTimeUnixNano": str(s.start_ns + int(s.duration * 1e9)),
+                "attributes": [{"key": k, "value": otlp_value(v)} for k, v in s.attributes.items()],
+                "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+            } for s in spans],
+        }],
+    }]}
+
+
+def span(name, **attributes):
+    """Context manager for a span on the shared tracer"""
+    return Tracer.shared().span(name, **attributes)
+
+
+def current_span():
+    """Innermost open span in this context, or None"""
+    return _current.get()
+
+
+def annotate(**attributes):
+    """Add attributes to the innermost open span, if any"""
+    current = _current.get()
+    if current is not None:
+        current.set(**attributes)
+
+
+def traced(name=None, **attributes):
+    """Decorator: run the function inside a span named `name` (default module.function)"""
+    def decorate(func):
+        span_name = name or f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name, **attributes):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def load_spans(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def folded_stacks(spans):
+    """'root;child;leaf <self microseconds>' lines for flamegraph.pl or speedscope"""
+    by_id = {s["span_id"]: s for s in spans}
+    child_ms = {}
+    for s in spans:
+        if s["parent_id"] in by_id:
+            child_ms[s["parent_id"]] = child_ms.get(s["parent_id"], 0.0) + s["duration_ms"]
+    totals = {}
+    for s in spans:
+        names, node = [], s
+        while node is not None:
+            names.append(node["name"])
+            node = by_id.get(node["parent_id"])
+        stack = ";".join(reversed(names))
+        self_ms = max(0.0, s["duration_ms"] - child_ms.get(s["span_id"], 0.0))
+        totals[stack] = totals.get(stack, 0) + int(self_ms * 1000)
+    return [f"{stack} {value}" for stack, value in totals.items() if value > 0]
+
+
+def summarize(spans):
+    by_name = {}
+    for s in spans:
+        by_name.setdefault(s["name"], []).append(s["duration_ms"])
+    lines = [f"{'span':<48}{'count':>7}{'p50 ms':>11}{'p95 ms':>11}{'total s':>10}"]
+    for name, values in sorted(by_name.items(), key=lambda item: -sum(item[1])):
+        ordered = sorted(values)
+        p50 = ordered[int(0.5 * (len(ordered) - 1))]
+        p95 = ordered[int(round(0.95 * (len(ordered) - 1)))]
+        lines.append(f"{name:<48}{len(values):>7}{p50:>11.1f}{p95:>11.1f}{sum(values) / 1000:>10.2f}")
+    errors = sum(1 for s in spans if s.get("error"))
+    lines.append(f"{len(spans)} spans, {errors} with errors")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a span JSONL file")
+    parser.add_argument("path")
+    parser.add_argument("--folded", action="store_true", help="print folded stacks for a flame graph")
+    args = parser.parse_args()
+    spans = load_spans(args.path)
+    if args.folded:
+        sys.stdout.write("\n".join(folded_stacks(spans)) + "\n")
+    else:
+        print(summarize(spans))
+
+
+if __name__ == "__main__":
+    main()
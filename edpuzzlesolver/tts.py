@@ -0,0 +1,157 @@
+import os
+import time
+import wave
+import queue
+import hashlib
+import itertools
+import threading
+
+try:
+    import winsound
+except ImportError:  # not on Windows: pre-synthesized clips are skipped, the engine speaks everything
+    winsound = None
+
+PRIORITY_INTERRUPT = 0
+PRIORITY_ANSWER = 1
+PRIORITY_ANNOUNCE = 2
+
+
+class TTSWorker:
+    """One long-lived pyttsx3 engine on its own thread, fed by a priority queue.
+
+    The engine is created once (voices queried once) and driven with startLoop/iterate so the
+    worker can stop the utterance in progress. Fixed phrases are rendered to WAV at startup and
+    played asynchronously, so announcements do not wait on synthesis and can be cut off too.
+
+    Every stop() starts a new generation and queued items carry the generation they were queued
+    in, so an interrupt only ever cuts speech that was queued before it.
+    """
+
+    def __init__(self, voice_index=1, rate=None, phrases=(), cache_dir=os.path.join("cache", "tts")):
+        self.voice_index = int(voice_index)
+        self.rate = rate
+        self.phrases = list(phrases)
+        self.cache_dir = cache_dir
+        self.clips = {}
+        self.queue = queue.PriorityQueue()
+        self.order = itertools.count()
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.ready = threading.Event()
+        self.running = True
+        self.engine_busy = False
+        self.clip_playing = False
+        self.clip_ends = 0.0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    @property
+    def speaking(self):
+        return self.engine_busy or self.clip_playing or not self.queue.empty()
+
+    def say(self, text, priority=PRIORITY_ANNOUNCE, interrupt=False):
+        with self.lock:
+            if interrupt:
+                self._stop_locked()
+            self.queue.put((priority, next(self.order), self.generation, text))
+
+    def stop(self):
+        """Cut off the current utterance and drop anything still queued"""
+        with self.lock:
+            self._stop_locked()
+
+    def _stop_locked(self):
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+        self.generation += 1
+
+    def shutdown(self):
+        self.stop()
+        self.running = False
+
+    def _clip_path(self, text):
+        digest = hashlib.sha1(f"{self.voice_index}:{self.rate}:{text}".encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"{digest}.wav")
+
+    @staticmethod
+    def _clip_seconds(path):
+        with wave.open(path, "rb") as clip:
+            return clip.getnframes() / float(clip.getframerate())
+
+    def _play_clip(self, clip):
+        """Start a WAV without blocking the worker; returns False if it cannot be played"""
+        try:
+            seconds = self._clip_seconds(clip)
+            winsound.PlaySound(clip, winsound.SND_FILENAME | winsound.SND_ASYNC)
+        except Exception as e:
+            print(f"Could not play {clip}: {e}")
+            return False
+        self.clip_ends = time.monotonic() + seconds
+        self.clip_playing = True
+        return True
+
+    def _presynthesize(self, engine):
+        if winsound is None or not self.phrases:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        pending = []
+        for phrase in self.phrases:
+            path = self._clip_path(phrase)
+            if not os.path.exists(path):
+                engine.save_to_file(phrase, path)
+                pending.append(path)
+            self.clips[phrase] = path
+        if pending:
+            engine.runAndWait()
+
+    def _run(self):
+        import pyttsx3
+
+        engine = pyttsx3.init()
+        voices = engine.getProperty('voices')
+        if len(voices) > self.voice_index:
+            engine.setProperty('voice', voices[self.voice_index].id)
+        if self.rate:
+            engine.setProperty('rate', int(self.rate))
+        try:
+            self._presynthesize(engine)
+        except Exception as e:
+            print(f"Could not pre-synthesize phrases: {e}")
+            self.clips.clear()
+        self.ready.set()
+
+        engine.startLoop(False)
+        # Generation of the utterance or clip in progress, None when idle
+        active = None
+        try:
+            while self.running:
+                if active is not None and active != self.generation:
+                    engine.stop()
+                    if winsound and self.clip_playing:
+                        winsound.PlaySound(None, 0)
+                    self.clip_playing = False
+                    active = None
+                if self.clip_playing and time.monotonic() >= self.clip_ends:
+                    self.clip_playing = False
+                self.engine_busy = engine.isBusy()
+                if not self.engine_busy and not self.clip_playing:
+                    active = None
+                    try:
+                        _, _, generation, text = self.queue.get(timeout=0.05)
+                    except queue.Empty:
+                        continue
+                    if generation != self.generation:
+                        # Queued before a stop() that has not drained it yet
+                        continue
+                    active = generation
+                    clip = self.clips.get(text)
+                    if clip and self._play_clip(clip):
+                        continue
+                    engine.say(text)
+                    self.engine_busy = True
+                engine.iterate()
+        finally:
+            engine.endLoop()
@@ -0,0 +1,167 @@
+import os
+import json
+import difflib
+from io import BytesIO
+from threading import Lock
+from collections import OrderedDict
+from edpuzzlesolver.metrics import cache_lookup
+from edpuzzlesolver.ocr import normalize, TESSERACT_CONFIG
+
+
+def dhash(image_bytes, hash_size=16):
+    """Difference hash of an encoded image as an int (hash_size * hash_size bits)"""
+    from PIL import Image
+
+    image = Image.open(BytesIO(image_bytes)).convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = list(image.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def content_hash(image_bytes, hash_size=32):
+    """Finer difference hash of just the text (dark pixels; margins, panels and borders cropped),
+    to tell apart screenshots that share a layout but carry different question text"""
+    from PIL import Image
+
+    image = Image.open(BytesIO(image_bytes)).convert("L")
+    box = image.point(lambda p: 255 if p < 100 else 0).getbbox()
+    if box:
+        image = image.crop(box)
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return dhash(buffer.getvalue(), hash_size)
+
+
+def ocr_text(image_bytes):
+    """Normalized Tesseract text of the image, or None when pytesseract/Tesseract is unavailable"""
+    try:
+        import pytesseract
+        from PIL import Image
+
+        return normalize(pytesseract.image_to_string(Image.open(BytesIO(image_bytes)).convert("L"),
+                                                     config=TESSERACT_CONFIG))
+    except Exception:
+        return None
+
+
+class VisionKey:
+    """Hashes of one screenshot; its OCR text is read at most once, and only when a lookup needs it"""
+
+    def __init__(self, image_bytes, coarse, detail):
+        self.image_bytes = image_bytes
+        self.coarse = coarse
+        self.detail = detail
+        self._text = False
+
+    @property
+    def text(self):
+        if self._text is False:
+            self._text = ocr_text(self.image_bytes)
+        return self._text
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class VisionCache:
+    """LRU cache of vision extraction text keyed by perceptual hash, persisted across runs.
+
+    A near match on the coarse whole-image hash is only a candidate. It is served when the OCR text
+    of the new screenshot matches the stored OCR text (similarity >= verify_ratio); without
+    Tesseract, only when the text-region hash is within verify_distance (0: pixel-identical text).
+    """
+
+    def __init__(self, path, max_entries=500, max_distance=3, hash_size=16, verify_distance=0,
+                 verify_hash_size=32, verify_ratio=0.98):
+        self.path = path
+        self.max_entries = int(max_entries)
+        self.max_distance = int(max_distance)
+        self.hash_size = int(hash_size)
+        self.verify_distance = int(verify_distance)
+        self.verify_hash_size = int(verify_hash_size)
+        self.verify_ratio = float(verify_ratio)
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    for entry in json.load(f):
+                        # Entries written before verification existed carry no text-region hash
+                        if len(entry) == 4:
+                            key, text, detail, ocr = entry
+                            self.entries[int(key, 16)] = (text, int(detail, 16), ocr)
+            except Exception as e:
+                print(f"Could not read vision cache {path}: {e}")
+
+    @classmethod
+    def from_config(cls, config):
+        if not config.getboolean('vision_cache', 'enabled', fallback=True):
+            return None
+        return cls(
+            config.get('vision_cache', 'path', fallback=os.path.join('cache', 'vision_cache.json')),
+            config.get('vision_cache', 'max_entries', fallback='500'),
+            config.get('vision_cache', 'max_distance', fallback='3'),
+            config.get('vision_cache', 'hash_size', fallback='16'),
+            config.get('vision_cache', 'verify_distance', fallback='0'),
+            config.get('vision_cache', 'verify_hash_size', fallback='32'),
+            config.get('vision_cache', 'verify_ratio', fallback='0.98'),
+        )
+
+    def key_for(self, image_bytes):
+        return VisionKey(image_bytes, dhash(image_bytes, self.hash_size),
+                         content_hash(image_bytes, self.verify_hash_size))
+
+    def verified(self, key, stored_detail, stored_ocr):
+        if stored_ocr and key.text:
+            return difflib.SequenceMatcher(None, stored_ocr, key.text).ratio() >= self.verify_ratio
+        return hamming(key.detail, stored_detail) <= self.verify_distance
+
+    def get(self, key):
+        """Stored text for the closest verified candidate within max_distance, or None"""
+        with self.lock:
+            candidates = sorted((hamming(key.coarse, stored), stored) for stored in self.entries)
+            best = None
+            for distance, stored in candidates:
+                if distance > self.max_distance:
+                    break
+                _, stored_detail, stored_ocr = self.entries[stored]
+                if self.verified(key, stored_detail, stored_ocr):
+                    best = stored
+                    break
+            if best is None:
+                self.misses += 1
+                cache_lookup("vision_cache", False)
+                return None
+            self.hits += 1
+            cache_lookup("vision_cache", True)
+            self.entries.move_to_end(best)
+            return self.entries[best][0]
+
+    def put(self, key, text):
+        ocr = key.text
+        with self.lock:
+            self.entries[key.coarse] = (text, key.detail, ocr)
+            self.entries.move_to_end(key.coarse)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.save()
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump([[format(key, 'x'), text, format(detail, 'x'), ocr]
+                       for key, (text, detail, ocr) in self.entries.items()], f)
+
+    def report(self):
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups if lookups else 0.0
+        return f"vision cache: {self.hits}/{lookups} hits ({rate:.0%}), {len(self.entries)} entries"
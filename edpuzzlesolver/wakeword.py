@@ -0,0 +1,200 @@
+import sys
+import json
+import math
+import time
+import wave
+import array
+import argparse
+from collections import deque
+
+COMMANDS = ("wake up", "silence", "close")
+
+
+def frame_rms(frame):
+    """RMS level of a little-endian 16-bit mono PCM frame"""
+    samples = array.array('h', frame)
+    if sys.byteorder != 'little':
+        samples.byteswap()
+    if not samples:
+        return 0.0
+    return math.sqrt(sum(s * s for s in samples) / len(samples))
+
+
+class EnergyVAD:
+    """Speech gate on frame energy against a slowly tracked noise floor.
+
+    A frame counts as speech when it is `ratio` times louder than the floor (and above `min_rms`);
+    the gate stays open for `hangover` frames after the last loud frame so word endings get through.
+    The floor starts at the quietest of the first `seed_frames` frames.
+    """
+
+    def __init__(self, ratio=3.0, min_rms=300.0, hangover=10, floor_decay=0.95, seed_frames=10):
+        self.ratio = float(ratio)
+        self.min_rms = float(min_rms)
+        self.hangover = int(hangover)
+        self.floor_decay = float(floor_decay)
+        self.seed_frames = int(seed_frames)
+        self.seed = []
+        self.floor = None
+        self.remaining = 0
+
+    def is_speech(self, frame):
+        level = frame_rms(frame)
+        if len(self.seed) < self.seed_frames:
+            # One click or breath in the first frame must not set the floor for the whole session
+            self.seed.append(level)
+            self.floor = min(self.seed)
+        loud = level > max(self.min_rms, self.floor * self.ratio)
+        if loud:
+            self.remaining = self.hangover
+        else:
+            self.floor = self.floor * self.floor_decay + level * (1 - self.floor_decay)
+            self.remaining = max(0, self.remaining - 1)
+        return loud or self.remaining > 0
+
+
+class KeywordSpotter:
+    """Streaming offline spotter for a fixed command set: Vosk restricted to a command grammar, fed only
+    while the energy VAD is open. Commands fire on partial results, without waiting for end of utterance.
+    The last `preroll_ms` of audio before the gate opens is fed first, so the quiet start of the
+    first word is not cut off.
+    """
+
+    def __init__(self, model_path, commands=COMMANDS, sample_rate=16000, frame_ms=30, vad=None, preroll_ms=240):
+        from vosk import Model, KaldiRecognizer, SetLogLevel
+
+        SetLogLevel(-1)
+        self.commands = [c.lower() for c in commands]
+        self.sample_rate = int(sample_rate)
+        self.frame_samples = self.sample_rate * int(frame_ms) // 1000
+        self.frame_seconds = self.frame_samples / float(self.sample_rate)
+        self.vad = vad or EnergyVAD()
+        self.preroll = deque(maxlen=max(0, int(preroll_ms) // int(frame_ms)))
+        self.recognizer = KaldiRecognizer(Model(model_path), self.sample_rate, json.dumps(self.commands + ["[unk]"]))
+        self.in_speech = False
+        self.fired = False
+        self.onset = None
+        self.audio_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.latencies = []
+
+    @classmethod
+    def from_config(cls, config):
+        get = lambda key, fallback: config.get('wakeword', key, fallback=fallback)
+        frame_ms = int(get('frame_ms', '30'))
+        vad = EnergyVAD(
+            ratio=get('vad_ratio', '3.0'),
+            min_rms=get('vad_min_rms', '300'),
+            hangover=max(1, int(get('vad_hangover_ms', '300')) // frame_ms),
+            seed_frames=max(1, int(get('vad_seed_ms', '300')) // frame_ms),
+        )
+        return cls(
+            get('model_path', 'models/vosk-model-small-en-us-0.15'),
+            commands=[c.strip() for c in get('commands', ', '.join(COMMANDS)).split(',') if c.strip()],
+            sample_rate=get('sample_rate', '16000'),
+            frame_ms=frame_ms,
+            vad=vad,
+            preroll_ms=get('vad_preroll_ms', '240'),
+        )
+
+    def _match(self, text):
+        for command in self.commands:
+            if command in text:
+                return command
+        return None
+
+    def feed(self, frame, now=None):
+        """Process one frame; returns the command it completed, or None. `now` defaults to audio time."""
+        cpu_start = time.process_time()
+        self.audio_seconds += self.frame_seconds
+        now = self.audio_seconds if now is None else now
+        command = None
+        if self.vad.is_speech(frame):
+            if not self.in_speech:
+                self.in_speech, self.fired, self.onset = True, False, now - self.frame_seconds
+                frame = b"".join(self.preroll) + frame
+                self.preroll.clear()
+            final = self.recognizer.AcceptWaveform(frame)
+            text = json.loads(self.recognizer.Result() if final else self.recognizer.PartialResult())
+            if not self.fired:
+                command = self._match(text.get("text") or text.get("partial") or "")
+            if command:
+                # One trigger per utterance; drop the rest of it from the decoder
+                self.fired = True
+                self.latencies.append(now - self.onset)
+                self.recognizer.Reset()
+        else:
+            if self.in_speech:
+                self.in_speech = False
+                self.recognizer.Reset()
+            self.preroll.append(frame)
+        self.cpu_seconds += time.process_time() - cpu_start
+        return command
+
+    def run(self, frames, on_command, clock=time.monotonic):
+        for frame in frames:
+            command = self.feed(frame, clock() if clock else None)
+            if command:
+                on_command(command)
+
+    def report(self):
+        rtf = self.cpu_seconds / self.audio_seconds if self.audio_seconds else 0.0
+        latency = sorted(self.latencies)
+        median = latency[len(latency) // 2] if latency else 0.0
+        return (f"wake word: {len(latency)} triggers, median latency {median * 1000:.0f} ms, "
+                f"CPU {rtf:.1%} of real time over {self.audio_seconds:.1f}s audio")
+
+
+def microphone_frames(sample_rate, frame_samples, should_continue=lambda: True):
+    import pyaudio
+
+    audio = pyaudio.PyAudio()
+    stream = audio.open(format=pyaudio.paInt16, channels=1, rate=sample_rate, input=True,
+                        frames_per_buffer=frame_samples)
+    try:
+        while should_continue():
+            yield stream.read(frame_samples, exception_on_overflow=False)
+    finally:
+        stream.stop_stream()
+        stream.close()
+        audio.terminate()
+
+
+def wav_frames(path, frame_samples, sample_rate):
+    with wave.open(path, "rb") as wav:
+        if wav.getnchannels() != 1 or wav.getsampwidth() != 2 or wav.getframerate() != sample_rate:
+            raise ValueError(f"{path}: expected mono 16-bit PCM at {sample_rate} Hz")
+        while True:
+            frame = wav.readframes(frame_samples)
+            if len(frame) < frame_samples * 2:
+                break
+            yield frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline command spotter over WAV files instead of a microphone")
+    parser.add_argument("wavs", nargs="+", help="Mono 16-bit PCM files at the configured sample rate")
+    parser.add_argument("--config", default="config.ini")
+    parser.add_argument("--expect", help="Command each file should trigger; exits non-zero on a miss")
+    args = parser.parse_args()
+
+    import configparser
+    config = configparser.ConfigParser()
+    config.read(args.config)
+
+    failures = 0
+    for path in args.wavs:
+        spotter = KeywordSpotter.from_config(config)
+        triggered = []
+        frames = wav_frames(path, spotter.frame_samples, spotter.sample_rate)
+        spotter.run(frames, lambda command: triggered.append((command, spotter.audio_seconds)), clock=None)
+        hits = ", ".join(f"{command} @ {at:.2f}s" for command, at in triggered) or "nothing"
+        print(f"{path}: {hits}")
+        print(f"  {spotter.report()}")
+        if args.expect and args.expect.lower() not in [command for command, _ in triggered]:
+            failures += 1
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
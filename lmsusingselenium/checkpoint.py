@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime
+from edpuzzlesolver.providers import config_value
+
+# Crash-safe checkpoint journal for lecture runs. Each run appends one JSON object per line to
+# <folder>/<run id>.jsonl and fsyncs it, so a killed process loses at most the record being written:
+#   {"event": "lecture", "url": ..., "subject": ..., "module": ..., "week": ..., "lecture": ...}
+#   {"event": "interactions", "times": [6, 14]}
+#   {"event": "position", "seconds": 12.4}
+#   {"event": "interaction_done", "time": 6}
+#   {"event": "completed"}
+#   {"event": "resumed"}
+#   {"event": "abandoned", "reason": ...}
+# On restart main.py replays the newest journal; if it never reached "completed" the run resumes at
+# the same lecture URL, seeks back to the saved position and schedules only the remaining interactions.
+# A resume that raises marks the journal abandoned, and after max_resumes resumes a journal is given
+# up on too, so one bad checkpoint cannot keep every later start resuming it.
+
+
+def load_journal(path):
+    """Replay a journal into {url, selection, times, position, completed_times, completed}"""
+    state = {"path": path, "url": None, "selection": {}, "times": [], "position": 0.0,
+             "completed_times": set(), "completed": False, "resumes": 0, "abandoned": False, "valid_bytes": 0}
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                record = json.loads(line.decode("utf-8"))
+            except ValueError:
+                # Torn last line from a crash mid-write; open() cuts it off before appending
+                break
+            if not line.endswith(b"\n"):
+                break
+            state["valid_bytes"] += len(line)
+            event = record.pop("event", None)
+            record.pop("at", None)
+            if event == "lecture":
+                state["url"] = record.pop("url")
+                state["selection"] = record
+            elif event == "interactions":
+                state["times"] = list(record["times"])
+            elif event == "position":
+                state["position"] = float(record["seconds"])
+            elif event == "interaction_done":
+                state["completed_times"].add(record["time"])
+            elif event == "completed":
+                state["completed"] = True
+            elif event == "resumed":
+                state["resumes"] += 1
+            elif event == "abandoned":
+                state["abandoned"] = True
+    return state
+
+
+def resume_position(state):
+    """Saved position, moved back before the first interaction that was reached but not finished"""
+    position = state["position"]
+    pending = [t for t in state["times"] if t not in state["completed_times"] and t <= position]
+    if pending:
+        position = min(pending) - 1
+    return max(0.0, position)
+
+
+class CheckpointJournal:
+    def __init__(self, folder="checkpoints", position_interval=5.0, keep=10, max_resumes=3, enabled=True):
+        self.folder = folder
+        self.position_interval = float(position_interval)
+        self.keep = int(keep)
+        self.max_resumes = int(max_resumes)
+        self.enabled = enabled
+        self.path = None
+        self.file = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        enabled = str(config_value(config, 'checkpoint', 'enabled', 'true')).lower() in ('true', 'yes', '1')
+        return cls(
+            folder=config_value(config, 'checkpoint', 'folder', 'checkpoints'),
+            position_interval=config_value(config, 'checkpoint', 'position_interval', '5.0'),
+            keep=config_value(config, 'checkpoint', 'keep', '10'),
+            max_resumes=config_value(config, 'checkpoint', 'max_resumes', '3'),
+            enabled=enabled,
+        )
+
+    def journals(self):
+        if not os.path.isdir(self.folder):
+            return []
+        paths = [os.path.join(self.folder, name) for name in os.listdir(self.folder) if name.endswith(".jsonl")]
+        return sorted(paths, key=os.path.getmtime)
+
+    def unfinished(self):
+        """State of the newest journal if that run did not complete its lecture, else None"""
+        journals = self.journals() if self.enabled else []
+        if not journals:
+            return None
+        state = load_journal(journals[-1])
+        if state["completed"] or not state["url"]:
+            return None
+        if state["abandoned"] or state["resumes"] >= self.max_resumes:
+            print(f"Not resuming {state['path']}: abandoned after {state['resumes']} resume attempt(s)")
+            return None
+        return state
+
+    def open(self, state=None):
+        """Start this run's journal; a resumed run continues appending to the journal it resumes"""
+        if not self.enabled:
+            return self
+        os.makedirs(self.folder, exist_ok=True)
+        if state:
+            self.path = state["path"]
+            with open(self.path, "r+b") as f:
+                f.truncate(state["valid_bytes"])
+        else:
+            self.path = os.path.join(self.folder, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}.jsonl")
+            journals = self.journals()
+            for old in journals[:max(0, len(journals) - (self.keep - 1))]:
+                os.remove(old)
+        self.file = open(self.path, "a", encoding="utf-8")
+        return self
+
+    def _append(self, event, **fields):
+        line = json.dumps(dict({"event": event, "at": round(time.time(), 3)}, **fields), ensure_ascii=False)
+        with self.lock:
+            if not self.file:
+                return
+            self.file.write(line + "\n")
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def lecture(self, url, **selection):
+        self._append("lecture", url=url, **selection)
+
+    def interactions(self, times):
+        self._append("interactions", times=list(times))
+
+    def position(self, seconds):
+        self._append("position", seconds=round(seconds, 2))
+
+    def interaction_done(self, interaction_time):
+        self._append("interaction_done", time=interaction_time)
+
+    def resumed(self):
+        self._append("resumed")
+
+    def completed(self):
+        self._append("completed")
+        self.close()
+
+    def abandoned(self, reason):
+        """Give up on this journal's lecture; later starts will not resume it"""
+        self._append("abandoned", reason=reason)
+        self.close()
+
+    def close(self):
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
+
+
+def seek_video(driver, seconds):
+    """Move the player (driver already inside the content iframe) to `seconds`"""
+    driver.execute_script("const v = document.querySelector('video'); v.currentTime = arguments[0];", seconds)
+    print(f"Resumed video at {seconds:.1f}s")
+
+
+def video_state(driver):
+    """(currentTime, playbackRate, ended) of the player"""
+    return driver.execute_script(
+        "const v = document.querySelector('video'); return v ? [v.currentTime, v.playbackRate, v.ended] : null;")
@@ -0,0 +1,133 @@
+import os
+import time
+import queue
+import atexit
+import shutil
+import threading
+from datetime import datetime
+from edpuzzlesolver.capture import Screenshot
+from edpuzzlesolver.providers import config_value
+from edpuzzlesolver.tracing import current_span
+
+# Debug screenshots for the LMS automation. The capture itself is one WebDriver round trip on the
+# calling thread (the page has to be caught as it is); decoding and the disk write happen on a
+# background thread. Files go to <folder>/<run id>/<seq>_<step>_<name>.png, where step is the
+# current tracing span, so nothing is overwritten between questions or runs.
+# [debug_screenshots] level: off | error (failure paths only) | debug (also the normal-path
+# captures). DEBUG_SCREENSHOTS=<level> overrides the config for one run.
+
+LEVELS = {"off": 0, "error": 1, "debug": 2}
+
+
+class DebugCapture:
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, level="error", folder=os.path.join("screenshots", "debug"), min_interval=5.0,
+                 max_files=200, max_runs=5, max_pending=8):
+        self.level = LEVELS.get(str(level).lower(), LEVELS["error"])
+        self.min_interval = float(min_interval)
+        self.max_files = int(max_files)
+        self.max_runs = int(max_runs)
+        self.run_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+        self.folder = os.path.join(folder, self.run_id)
+        self.root = folder
+        self.sequence = 0
+        self.last_taken = {}
+        self.lock = threading.Lock()
+        # Bounded: when the disk falls behind, new captures are dropped rather than queued in memory
+        self.queue = queue.Queue(maxsize=int(max_pending))
+        self.thread = None
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            level=os.getenv('DEBUG_SCREENSHOTS') or config_value(config, 'debug_screenshots', 'level', 'error'),
+            folder=config_value(config, 'debug_screenshots', 'folder', os.path.join('screenshots', 'debug')),
+            min_interval=config_value(config, 'debug_screenshots', 'min_interval', '5.0'),
+            max_files=config_value(config, 'debug_screenshots', 'max_files', '200'),
+            max_runs=config_value(config, 'debug_screenshots', 'max_runs', '5'),
+            max_pending=config_value(config, 'debug_screenshots', 'max_pending', '8'),
+        )
+
+    @classmethod
+    def shared(cls, config=None):
+        """The process-wide capture service; built from config (or ./config.ini) on first use"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                if config is None:
+                    from configobj import ConfigObj
+                    config = ConfigObj('config.ini')
+                cls._shared = cls.from_config(config)
+            return cls._shared
+
+    def enabled(self, level):
+        return self.level >= LEVELS[level]
+
+    def capture(self, driver, name, level="debug"):
+        """Queue a screenshot named after the run, step and name; returns its path or None when skipped"""
+        if not self.enabled(level):
+            return None
+        current = current_span()
+        step = current.name if current else "untraced"
+        now = time.monotonic()
+        with self.lock:
+            # min_interval only thins out repeated normal-path captures of the same step; failures are always kept
+            if level != "error" and now - self.last_taken.get((step, name), float("-inf")) < self.min_interval:
+                return None
+            self.last_taken[(step, name)] = now
+            if self.thread is None:
+                os.makedirs(self.folder, exist_ok=True)
+                self.prune_runs()
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+                # Failure captures are often the last thing a run does; let them reach the disk
+                atexit.register(self.flush)
+        try:
+            screenshot = Screenshot(base64_data=driver.get_screenshot_as_base64())
+        except Exception as e:
+            print(f"Debug screenshot {name} failed: {e}")
+            return None
+        with self.lock:
+            # Numbered only once queued, so the sequence has no gaps from failed or dropped captures
+            if self.queue.full():
+                print(f"Debug screenshot {name} dropped: writer is behind")
+                return None
+            self.sequence += 1
+            screenshot.path = os.path.join(self.folder, f"{self.sequence:04d}_{step}_{name}.png")
+            self.queue.put_nowait(screenshot)
+        return screenshot.path
+
+    def _run(self):
+        while True:
+            screenshot = self.queue.get()
+            try:
+                with open(screenshot.path, "wb") as f:
+                    f.write(screenshot.data)
+                self.prune_files()
+            except Exception as e:
+                print(f"Failed to save debug screenshot {screenshot.path}: {e}")
+            finally:
+                self.queue.task_done()
+
+    def prune_files(self):
+        """Keep the newest max_files screenshots of this run"""
+        names = sorted(os.listdir(self.folder))
+        for old in names[:max(0, len(names) - self.max_files)]:
+            os.remove(os.path.join(self.folder, old))
+
+    def prune_runs(self):
+        """Keep the newest max_runs run folders, this one included"""
+        others = [os.path.join(self.root, d) for d in os.listdir(self.root)
+                  if d != self.run_id and os.path.isdir(os.path.join(self.root, d))]
+        others.sort(key=os.path.getmtime)
+        for old in others[:max(0, len(others) - (self.max_runs - 1))]:
+            shutil.rmtree(old, ignore_errors=True)
+
+    def flush(self):
+        self.queue.join()
+
+
+def debug_screenshot(driver, name, level="debug"):
+    """Screenshot for debugging at the given verbosity (debug or error), written in the background"""
+    return DebugCapture.shared().capture(driver, name, level)
@@ -11,12 +11,25 @@ import os
 import traceback
 import re
 from selenium.webdriver import ActionChains
+from lmsusingselenium.profiler import instrument_driver
+
+def lms_base_url():
+    """LMS origin; LMS_BASE_URL points the automation at another host, e.g. the local fixture server"""
+    return os.getenv('LMS_BASE_URL', 'https://iitjbsc.futurense.com').rstrip('/')
+
+def headless_enabled():
+    return os.getenv('LMS_HEADLESS', '').lower() in ('1', 'true', 'yes')
 
 def setup_driver():
     options = webdriver.ChromeOptions()
-    options.add_argument("--start-maximized")
-    
-    options.add_experimental_option("detach", True)  # Keeps browser open after script ends
+    if headless_enabled():
+        # Replay runs on a display-less box; keep the real window size so layouts match
+        options.add_argument("--headless=new")
+        options.add_argument("--window-size=1920,1080")
+        options.add_argument("--autoplay-policy=no-user-gesture-required")
+    else:
+        options.add_argument("--start-maximized")
+        options.add_experimental_option("detach", True)  # Keeps browser open after script ends
     
     # Block all permissions
     options.add_argument("--disable-notifications")    
@@ -39,11 +52,13 @@ def setup_driver():
     options.add_experimental_option("useAutomationExtension", False)
    
     
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
+    # CHROMEDRIVER_PATH skips the webdriver-manager download (offline replay)
+    driver_path = os.getenv('CHROMEDRIVER_PATH') or ChromeDriverManager().install()
+    driver = instrument_driver(webdriver.Chrome(service=Service(driver_path), options=options))
     
     driver.execute_cdp_cmd("Browser.grantPermissions", {
         "permissions": [],
-        "origin": "https://iitjbsc.futurense.com"
+        "origin": lms_base_url()
     })
     
     # Get session ID
@@ -0,0 +1,273 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from string import Template
+from html import escape
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Offline stand-in for the LMS (Moodle) and the EdPuzzle player. The pages in fixtures/ are
+# sanitized snapshots that keep only the markup and class names lms.py and whynot.py select on;
+# fixtures/site.json supplies the courses, sections, activities and lecture questions.
+# Start with `python -m lmsusingselenium.fixtureserver` and set LMS_BASE_URL to its address.
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+EDPUZZLE_ICON = "https://edpuzzle.imgix.net/favicons/favicon-32.png"
+RESOURCE_ICON = "/theme/image.php/pdf-24.png"
+
+
+class FixtureSite:
+    """Site description plus the answers submitted by the fake player"""
+
+    def __init__(self, fixtures_dir=FIXTURES_DIR):
+        self.fixtures_dir = fixtures_dir
+        with open(os.path.join(fixtures_dir, "site.json"), encoding="utf-8") as f:
+            self.site = json.load(f)
+        self.templates = {}
+        self.lock = threading.Lock()
+        self.answers = []
+        self.logins = 0
+        # Activity ids are stable per course: course 2, third activity -> 2003
+        self.activities = {}
+        for course_id in range(1, len(self.site["subjects"]) + 1):
+            number = 0
+            for module in self.site["modules"]:
+                for week in module["weeks"]:
+                    for activity in week["activities"]:
+                        number += 1
+                        self.activities[course_id * 1000 + number] = dict(activity, course_id=course_id)
+
+    def template(self, name):
+        if name not in self.templates:
+            with open(os.path.join(self.fixtures_dir, name), encoding="utf-8") as f:
+                self.templates[name] = Template(f.read())
+        return self.templates[name]
+
+    def render(self, name, **values):
+        return self.template(name).substitute(**values)
+
+    def subject(self, course_id):
+        subjects = self.site["subjects"]
+        return subjects[course_id - 1] if 1 <= course_id <= len(subjects) else None
+
+    def lecture(self, key):
+        return self.site["lectures"].get(key)
+
+    def expected_answers(self, activity_id):
+        """Number of questions the player will ask for an activity"""
+        activity = self.activities.get(activity_id)
+        lecture = self.lecture(activity.get("lecture")) if activity else None
+        if not lecture:
+            return 0
+        return sum(len(interaction["questions"]) for interaction in lecture["interactions"])
+
+    def record_answer(self, answer):
+        with self.lock:
+            answer["received_at"] = time.time()
+            self.answers.append(answer)
+
+    def reset(self):
+        with self.lock:
+            self.answers = []
+            self.logins = 0
+
+    def dashboard(self):
+        cards = []
+        for course_id, subject in enumerate(self.site["subjects"], 1):
+            cards.append(
+                f'    <div class="card dashboard-card" role="listitem">\n'
+                f'      <a href="/course/view.php?id={course_id}" class="card-img-link" tabindex="-1">\n'
+                f'        <span class="sr-only">{escape(subject)}</span>\n'
+                f'        <div class="card-img dashboard-card-img"></div>\n'
+                f'      </a>\n'
+                f'      <div class="card-body"><span class="multiline">{escape(subject)}</span></div>\n'
+                f'    </div>')
+        return self.render("dashboard.html", user=escape(self.site["user"]["name"]), cards="\n".join(cards))
+
+    def section_page(self, course_id):
+        blocks = []
+        number = 0
+        activity_id = course_id * 1000
+        for m, module in enumerate(self.site["modules"], 1):
+            number += 1
+            module_number = number
+            weeks = []
+            for w, week in enumerate(module["weeks"], 1):
+                number += 1
+                items = []
+                for activity in week["activities"]:
+                    activity_id += 1
+                    icon = EDPUZZLE_ICON if activity.get("edpuzzle") else RESOURCE_ICON
+                    kind = "lti" if activity.get("edpuzzle") else "resource"
+                    label = "External tool" if activity.get("edpuzzle") else "File"
+                    items.append(
+                        f'            <li class="activity modtype_{kind}">\n'
+                        f'              <div class="activity-item" data-activityname="{escape(activity["title"])}">\n'
+                        f'                <img src="{icon}" class="activityicon" alt="">\n'
+                        f'                <div class="activityname">\n'
+                        f'                  <a href="/mod/{kind}/view.php?id={activity_id}" class="aalink stretched-link">'
+                        f'<span class="instancename">{escape(activity["title"])}'
+                        f'<span class="accesshide"> {label}</span></span></a>\n'
+                        f'                </div>\n'
+                        f'              </div>\n'
+                        f'            </li>')
+                weeks.append(self.section_block(f"m{m}w{w}", number, week["title"], "\n".join(items), indent=8))
+            blocks.append(self.section_block(f"m{m}", module_number, module["title"], "\n".join(weeks), indent=4))
+        return self.render("section.html", modules="\n".join(blocks))
+
+    @staticmethod
+    def section_block(name, number, title, content, indent):
+        pad = " " * indent
+        return (f'{pad}<li class="section course-section" id="section-{name}">\n'
+                f'{pad}  <div class="course-section-header d-flex" data-id="{name}" data-number="{number}">\n'
+                f'{pad}    <a class="btn btn-icon icons-collapse-expand" data-toggle="collapse" href="#{name}-content"'
+                f' aria-expanded="false" aria-controls="{name}-content">+</a>\n'
+                f'{pad}    <h3 class="sectionname">{escape(title)}</h3>\n'
+                f'{pad}  </div>\n'
+                f'{pad}  <div id="{name}-content" class="content course-content-item-content collapse">\n'
+                f'{pad}    <ul class="section">\n{content}\n{pad}    </ul>\n'
+                f'{pad}  </div>\n'
+                f'{pad}</li>')
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    site = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body, content_type="text/html; charset=utf-8", headers=None):
+        body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status, payload):
+        self.send_body(status, json.dumps(payload), "application/json")
+
+    def redirect(self, location, headers=None):
+        self.send_body(303, "", headers=dict(headers or {}, Location=location))
+
+    def not_found(self):
+        self.send_body(404, "<h1>Not found</h1>")
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        path = url.path
+        if path == "/":
+            self.redirect("/login/index.php")
+        elif path == "/login/index.php":
+            self.send_body(200, self.site.render("login.html"))
+        elif path == "/my/":
+            self.send_body(200, self.site.dashboard())
+        elif path == "/course/view.php":
+            self.course_page(int(query.get("id", 0)))
+        elif path == "/course/section.php":
+            course_id = int(query.get("id", 0))
+            if self.site.subject(course_id) is None:
+                return self.not_found()
+            self.send_body(200, self.site.section_page(course_id))
+        elif path == "/mod/lti/view.php":
+            self.activity_page(int(query.get("id", 0)))
+        elif path == "/edpuzzle/player":
+            self.player_page(query.get("lecture"), int(query.get("activity", 0)))
+        elif path == "/api/answers":
+            with self.site.lock:
+                self.send_json(200, {"answers": list(self.site.answers), "logins": self.site.logins})
+        elif path == "/api/activity":
+            activity_id = int(query.get("id", 0))
+            activity = self.site.activities.get(activity_id)
+            if activity is None:
+                return self.send_json(404, {"error": "unknown activity"})
+            lecture = self.site.lecture(activity.get("lecture")) or {}
+            self.send_json(200, dict(activity, id=activity_id, duration=lecture.get("duration"),
+                                     expected_answers=self.site.expected_answers(activity_id)))
+        else:
+            self.not_found()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length).decode("utf-8") if length else ""
+        path = urlparse(self.path).path
+        if path == "/login/index.php":
+            form = {k: v[0] for k, v in parse_qs(body).items()}
+            if not form.get("username") or not form.get("password"):
+                return self.send_body(200, self.site.render("login.html"))
+            with self.site.lock:
+                self.site.logins += 1
+            self.redirect("/my/", {"Set-Cookie": "MoodleSession=fixture; Path=/"})
+        elif path == "/api/answers":
+            try:
+                self.site.record_answer(json.loads(body or "{}"))
+            except json.JSONDecodeError:
+                return self.send_json(400, {"error": "invalid json"})
+            self.send_json(200, {"ok": True})
+        elif path == "/api/reset":
+            self.site.reset()
+            self.send_json(200, {"ok": True})
+        else:
+            self.not_found()
+
+    def course_page(self, course_id):
+        subject = self.site.subject(course_id)
+        if subject is None:
+            return self.not_found()
+        self.send_body(200, self.site.render("course.html", subject=escape(subject), course_id=course_id))
+
+    def activity_page(self, activity_id):
+        activity = self.site.activities.get(activity_id)
+        if activity is None or not activity.get("edpuzzle"):
+            return self.not_found()
+        self.send_body(200, self.site.render("activity.html", title=escape(activity["title"]),
+                                             lecture=activity["lecture"], activity_id=activity_id))
+
+    def player_page(self, key, activity_id):
+        lecture = self.site.lecture(key)
+        if lecture is None:
+            return self.not_found()
+        data = dict(lecture, id=activity_id)
+        # </ cannot appear inside the inline script
+        lecture_json = json.dumps(data).replace("</", "<\\/")
+        title = self.site.activities.get(activity_id, {}).get("title", key)
+        self.send_body(200, self.site.render("player.html", title=escape(title), lecture_json=lecture_json))
+
+
+def start_fixture_server(host="127.0.0.1", port=8766, fixtures_dir=FIXTURES_DIR):
+    """Start the fixture site in a daemon thread; returns the server (call shutdown() to stop)"""
+    handler = type("ConfiguredFixtureHandler", (FixtureHandler,), {"site": FixtureSite(fixtures_dir)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"LMS fixture server listening on http://{host}:{server.server_address[1]}")
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline LMS and EdPuzzle fixture pages")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    args = parser.parse_args()
+
+    server = start_fixture_server(args.host, args.port, args.fixtures)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        site = server.RequestHandlerClass.site
+        print(f"Stopping fixture server. {site.logins} logins, {len(site.answers)} answers recorded")
+        server.shutdown()
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
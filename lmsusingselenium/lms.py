@@ -11,7 +11,9 @@ import os
 import traceback
 import re
 from selenium.webdriver import ActionChains
-from lmsusingselenium.driver import setup_driver
+from lmsusingselenium.driver import setup_driver, lms_base_url
+from lmsusingselenium.debugcapture import debug_screenshot
+from edpuzzlesolver.tracing import traced, annotate
 # def setup_driver():
 #     options = webdriver.ChromeOptions()
 #     options.add_argument("--start-maximized")
@@ -62,6 +64,23 @@ from lmsusingselenium.driver import setup_driver
     
     # return driver
 
+def choose_number(prompt, count, selection=None):
+    """1..count choice: the given selection when set (non-interactive runs), else asked on stdin"""
+    if selection is not None:
+        if 1 <= int(selection) <= count:
+            return int(selection)
+        print(f"Selection {selection} is out of range (1-{count}).")
+        return None
+    while True:
+        try:
+            choice = int(input(prompt))
+            if 1 <= choice <= count:
+                return choice
+            print(f"Please enter a number between 1 and {count}.")
+        except ValueError:
+            print("Please enter a valid number.")
+
+@traced("lms.login")
 def login_to_lms():
     load_dotenv()
     USER_ID = os.getenv('USER_ID')
@@ -71,10 +90,11 @@ def login_to_lms():
         raise ValueError("USER_ID or PASSWORD not found in .env file")
 
     driver = setup_driver()
+    login_url = f"{lms_base_url()}/login/index.php"
     
     try:
         print("Navigating to login page...")
-        driver.get('https://iitjbsc.futurense.com/login/index.php')
+        driver.get(login_url)
         
         wait = WebDriverWait(driver, 20)
         time.sleep(2)
@@ -94,7 +114,7 @@ def login_to_lms():
         login_button = driver.find_element(By.ID, 'loginbtn')
         login_button.click()
         
-        wait.until(EC.url_changes('https://iitjbsc.futurense.com/login/index.php'))
+        wait.until(EC.url_changes(login_url))
         
         current_url = driver.current_url
         print(f"Current URL after login: {current_url}")
@@ -121,7 +141,8 @@ def login_to_lms():
         driver.quit()
         return None
 
-def select_and_navigate_to_subject(driver):
+@traced("lms.select_subject")
+def select_and_navigate_to_subject(driver, selection=None):
     subjects = {
         1: "Batch 01_B.Sc_Semester-1_Academic Information",
         2: "Batch-01_BSc_Semester-01_Algorithmic Thinking and its Applications",
@@ -134,17 +155,13 @@ def select_and_navigate_to_subject(driver):
     for num, subject in subjects.items():
         print(f"{num}. {subject}")
     
-    while True:
-        try:
-            time.sleep(5)
-            selection = int(input("\nEnter the number of the subject you want to access (1-5): "))
-            if 1 <= selection <= 5:
-                selected_subject = subjects[selection]
-                break
-            else:
-                print("Please enter a number between 1 and 5.")
-        except ValueError:
-            print("Please enter a valid number.")
+    if selection is None:
+        time.sleep(5)
+    selection = choose_number("\nEnter the number of the subject you want to access (1-5): ", len(subjects), selection)
+    if selection is None:
+        return None
+    selected_subject = subjects[selection]
+    annotate(subject=selected_subject)
     
     print(f"\nNavigating to: {selected_subject}")
     
@@ -213,20 +230,20 @@ def select_and_navigate_to_subject(driver):
         print(f"Error navigating to subject: {str(e)}")
         traceback.print_exc()
         print("Taking a screenshot for debugging...")
-        driver.save_screenshot("navigation_error.png")
+        debug_screenshot(driver, "navigation_error", "error")
         with open("dashboard.html", "w", encoding="utf-8") as f:
             f.write(driver.page_source)
         print("Page source saved as 'dashboard.html'")
         return None
 
+@traced("lms.self_paced_learning")
 def navigate_to_self_paced_learning(driver):
     try:
         time.sleep(2)
         wait = WebDriverWait(driver, 10)
         print("Looking for 'Self Paced Learning' link...")
         
-        driver.save_screenshot("before_self_paced.png")
-        print("Screenshot saved as 'before_self_paced.png' for reference")
+        debug_screenshot(driver, "before_self_paced")
         
         try:
             self_paced_link = wait.until(
@@ -257,16 +274,16 @@ def navigate_to_self_paced_learning(driver):
         
     except Exception as e:
         print(f"Error navigating to Self Paced Learning: {str(e)}")
-        driver.save_screenshot("self_paced_error.png")
+        debug_screenshot(driver, "self_paced_error", "error")
         return False
 
-def select_and_open_module(driver):
+@traced("lms.select_module")
+def select_and_open_module(driver, selection=None):
     try:
         wait = WebDriverWait(driver, 10)
         time.sleep(2)
         
-        print("Taking screenshot of self-paced learning page...")
-        driver.save_screenshot("self_paced_learning.png")
+        debug_screenshot(driver, "self_paced_learning")
         
         # Find all module sections using the specified class
         print("\nSearching for available modules...")
@@ -345,7 +362,7 @@ def select_and_open_module(driver):
         
         if not modules:
             print("No modules found with either method. Taking screenshot...")
-            driver.save_screenshot("no_modules_found.png")
+            debug_screenshot(driver, "no_modules_found", "error")
             return None
         
         print("\nAvailable modules:")
@@ -353,16 +370,12 @@ def select_and_open_module(driver):
             print(f"{num}. {module_info['name']} - {module_info['full_text']}")
         
         # Get user module selection
-        while True:
-            try:
-                module_selection = int(input(f"\nEnter the number of the module to access (1-{len(modules)}): "))
-                if 1 <= module_selection <= len(modules):
-                    selected_module = modules[module_selection]
-                    break
-                else:
-                    print(f"Please enter a number between 1 and {len(modules)}.")
-            except ValueError:
-                print("Please enter a valid number.")
+        module_selection = choose_number(f"\nEnter the number of the module to access (1-{len(modules)}): ",
+                                         len(modules), selection)
+        if module_selection is None:
+            return None
+        selected_module = modules[module_selection]
+        annotate(module=selected_module['name'])
         
         print(f"\nSelected: {selected_module['name']} - {selected_module['full_text']}")
         
@@ -395,7 +408,7 @@ def select_and_open_module(driver):
                 except Exception as e3:
                     print(f"All click attempts failed: {e3}")
                     print("Taking screenshot for debugging...")
-                    driver.save_screenshot("click_failure.png")
+                    debug_screenshot(driver, "click_failure", "error")
         
         time.sleep(3)
         print(f"Module operation complete for: {selected_module['name']}")
@@ -404,10 +417,11 @@ def select_and_open_module(driver):
     except Exception as e:
         print(f"Error selecting and opening module: {str(e)}")
         traceback.print_exc()
-        driver.save_screenshot("module_open_error.png")
+        debug_screenshot(driver, "module_open_error", "error")
         return None
 
-def select_and_open_week(driver):
+@traced("lms.select_week")
+def select_and_open_week(driver, selection=None):
     try:
         wait = WebDriverWait(driver, 10)
         time.sleep(2)
@@ -488,7 +502,7 @@ def select_and_open_week(driver):
         
         if not weeks:
             print("No weeks found with either method. Taking screenshot...")
-            driver.save_screenshot("no_weeks_found.png")
+            debug_screenshot(driver, "no_weeks_found", "error")
             return None
         
         print("\nAvailable weeks:")
@@ -496,16 +510,12 @@ def select_and_open_week(driver):
             print(f"{num}. {week_info['name']} - {week_info['full_text']}")
         
         # Get user week selection
-        while True:
-            try:
-                week_selection = int(input(f"\nEnter the number of the week to access (1-{len(weeks)}): "))
-                if 1 <= week_selection <= len(weeks):
-                    selected_week = weeks[week_selection]
-                    break
-                else:
-                    print(f"Please enter a number between 1 and {len(weeks)}.")
-            except ValueError:
-                print("Please enter a valid number.")
+        week_selection = choose_number(f"\nEnter the number of the week to access (1-{len(weeks)}): ",
+                                       len(weeks), selection)
+        if week_selection is None:
+            return None
+        selected_week = weeks[week_selection]
+        annotate(week=selected_week['name'])
         
         print(f"\nSelected: {selected_week['name']} - {selected_week['full_text']}")
         
@@ -538,7 +548,7 @@ def select_and_open_week(driver):
                 except Exception as e3:
                     print(f"All click attempts failed: {e3}")
                     print("Taking screenshot for debugging...")
-                    driver.save_screenshot("click_failure.png")
+                    debug_screenshot(driver, "click_failure", "error")
         
         time.sleep(3)
         print(f"Week operation complete for: {selected_week['name']}")
@@ -547,17 +557,18 @@ def select_and_open_week(driver):
     except Exception as e:
         print(f"Error selecting and opening week: {str(e)}")
         traceback.print_exc()
-        driver.save_screenshot("week_open_error.png")
+        debug_screenshot(driver, "week_open_error", "error")
         return None
 
 
-def select_and_open_lecture(driver):
+@traced("lms.select_lecture")
+def select_and_open_lecture(driver, selection=None):
     try:
         wait = WebDriverWait(driver, 10)
         time.sleep(2)
         
         print("\nSearching for available lectures within the selected week containing Edpuzzle link...")
-        driver.save_screenshot("lectures_page.png")
+        debug_screenshot(driver, "lectures_page")
         
         # Find all activity items
         activity_blocks = driver.find_elements(By.CSS_SELECTOR, "div.activity-item")
@@ -611,7 +622,7 @@ def select_and_open_lecture(driver):
         
         if not lectures:
             print("No Edpuzzle lectures found. Taking screenshot...")
-            driver.save_screenshot("no_edpuzzle_lectures.png")
+            debug_screenshot(driver, "no_edpuzzle_lectures", "error")
             return None
         
         print("\nAvailable Edpuzzle lectures:")
@@ -619,16 +630,12 @@ def select_and_open_lecture(driver):
             print(f"{num}. {lecture_info['title']}")
         
         # Get user lecture selection
-        while True:
-            try:
-                lecture_selection = int(input(f"\nEnter the number of the lecture to access (1-{len(lectures)}): "))
-                if 1 <= lecture_selection <= len(lectures):
-                    selected_lecture = lectures[lecture_selection]
-                    break
-                else:
-                    print(f"Please enter a number between 1 and {len(lectures)}.")
-            except ValueError:
-                print("Please enter a valid number.")
+        lecture_selection = choose_number(f"\nEnter the number of the lecture to access (1-{len(lectures)}): ",
+                                          len(lectures), selection)
+        if lecture_selection is None:
+            return None
+        selected_lecture = lectures[lecture_selection]
+        annotate(lecture=selected_lecture['title'], lecture_id=selected_lecture['url'].rsplit("id=", 1)[-1])
         
         print(f"\nSelected lecture: {selected_lecture['title']}")
         
@@ -669,7 +676,7 @@ def select_and_open_lecture(driver):
         except Exception as e:
             print(f"Error opening lecture: {str(e)}")
             traceback.print_exc()
-            driver.save_screenshot("lecture_open_error.png")
+            debug_screenshot(driver, "lecture_open_error", "error")
         
         # Try navigating directly to the URL as fallback
         try:
@@ -692,14 +699,15 @@ def select_and_open_lecture(driver):
     except Exception as e:
         print(f"Error selecting and opening lecture: {str(e)}")
         traceback.print_exc()
-        driver.save_screenshot("lecture_selection_error.png")
+        debug_screenshot(driver, "lecture_selection_error", "error")
         return None
 
 
+@traced("lms.play_video")
 def play_video(driver):
     try:
         # Take a screenshot before switching to iframe for debugging
-        driver.save_screenshot("before_iframe.png")
+        debug_screenshot(driver, "before_iframe")
         
         # Switch to the iframe with improved error handling
         try:
@@ -722,7 +730,7 @@ def play_video(driver):
                 raise Exception("No iframes found on the page")
         
         # Take a screenshot inside iframe for debugging
-        driver.save_screenshot("inside_iframe.png")
+        debug_screenshot(driver, "inside_iframe")
         
         # Wait for the play button to be clickable
         try:
@@ -787,7 +795,7 @@ def play_video(driver):
     except Exception as e:
         print(f"An error occurred in play_video: {e}")
         traceback.print_exc()
-        driver.save_screenshot("play_video_error.png")
+        debug_screenshot(driver, "play_video_error", "error")
         
         # Try to switch back to default content in case we're stuck in a frame
         try:
@@ -840,13 +848,13 @@ def set_video_speed(driver):
             return True
         except Exception as js_error:
             print(f"JavaScript speed setting failed: {js_error}")
-            driver.save_screenshot("speed_options.png")
+            debug_screenshot(driver, "speed_options")
             return False
         
     except Exception as e:
         print(f"Error setting video speed: {str(e)}")
         traceback.print_exc()
-        driver.save_screenshot("speed_error.png")
+        debug_screenshot(driver, "speed_error", "error")
         
         # Try direct JavaScript approach as last resort
         try:
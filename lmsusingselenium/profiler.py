@@ -0,0 +1,179 @@
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+from collections import Counter
+from edpuzzlesolver import metrics
+from edpuzzlesolver.tracing import current_span
+
+# WebDriver round-trip profiler. Every Selenium command (find_element, .text, get_attribute,
+# execute_script, ...) is one HTTP request to chromedriver; instrument_driver hooks the command
+# executor once, counts every request in webdriver_commands_total by step (the innermost tracing
+# span, e.g. lms.select_module) and, when profiling, times it and charges it to the pipeline line
+# that caused it.
+# Enable profiling with WEBDRIVER_PROFILE=1; the report is printed and saved to WEBDRIVER_PROFILE_PATH
+# (default logs/webdriver_profile.json) at exit. Replay and the pipeline benchmark take
+# --command-budget STEP=COUNT and fail when a step sends more commands than that.
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Frames in these files are plumbing, not call sites worth reporting
+SKIP_FILES = {os.path.join(PACKAGE_DIR, name) for name in ("profiler.py", "driver.py")}
+PIPELINE_DIRS = (PACKAGE_DIR, os.path.dirname(PACKAGE_DIR))
+
+
+class CommandBudgetExceeded(Exception):
+    pass
+
+
+def call_site():
+    """file:line function of the innermost pipeline frame (lms.py, whynot.py, main.py, ...) on the stack"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        path = frame.f_code.co_filename
+        if path not in SKIP_FILES and os.path.dirname(path) in PIPELINE_DIRS:
+            return f"{os.path.basename(path)}:{frame.f_lineno} {frame.f_code.co_name}"
+        frame = frame.f_back
+    return "other"
+
+
+def parse_command_budgets(specs):
+    """['lms.select_module=40', ...] -> {'lms.select_module': 40}"""
+    budgets = {}
+    for spec in specs or []:
+        step, _, count = spec.partition("=")
+        if not step or not count.isdigit():
+            raise ValueError(f"Command budget must be <step>=<count>: {spec}")
+        budgets[step] = int(count)
+    return budgets
+
+
+class CommandProfiler:
+    """Counts and times WebDriver commands by call site and by step"""
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, budgets=None):
+        self.budgets = dict(budgets or {})
+        self.lock = threading.Lock()
+        self.reset()
+
+    @classmethod
+    def shared(cls):
+        """The process-wide profiler; reports at exit"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+                atexit.register(cls._shared.report_at_exit)
+            return cls._shared
+
+    def reset(self):
+        with self.lock:
+            self.sites = {}
+            self.steps = {}
+            self.commands = Counter()
+            self.total_seconds = 0.0
+
+    def record(self, site, step, command, seconds):
+        with self.lock:
+            entry = self.sites.setdefault(site, {"count": 0, "seconds": 0.0, "max": 0.0, "commands": Counter()})
+            entry["count"] += 1
+            entry["seconds"] += seconds
+            entry["max"] = max(entry["max"], seconds)
+            entry["commands"][command] += 1
+            totals = self.steps.setdefault(step, {"count": 0, "seconds": 0.0})
+            totals["count"] += 1
+            totals["seconds"] += seconds
+            self.commands[command] += 1
+            self.total_seconds += seconds
+
+    def budget_violations(self, budgets=None):
+        """[(step, commands, budget)] for every step over its command budget"""
+        budgets = self.budgets if budgets is None else budgets
+        with self.lock:
+            return [(step, self.steps.get(step, {}).get("count", 0), budget) for step, budget in budgets.items()
+                    if self.steps.get(step, {}).get("count", 0) > budget]
+
+    def assert_budgets(self, budgets=None):
+        violations = self.budget_violations(budgets)
+        if violations:
+            raise CommandBudgetExceeded("; ".join(f"{step}: {count} commands > budget {budget}"
+                                                  for step, count, budget in violations))
+
+    def to_dict(self, top=20):
+        violations = self.budget_violations()
+        with self.lock:
+            sites = sorted(self.sites.items(), key=lambda item: -item[1]["seconds"])
+            return {
+                "commands": sum(self.commands.values()),
+                "seconds": round(self.total_seconds, 3),
+                "by_command": dict(self.commands.most_common()),
+                "steps": {step: {"count": t["count"], "seconds": round(t["seconds"], 3)}
+                          for step, t in sorted(self.steps.items(), key=lambda item: -item[1]["seconds"])},
+                "top_sites": [{"site": site, "count": e["count"], "seconds": round(e["seconds"], 3),
+                               "mean_ms": round(e["seconds"] / e["count"] * 1000, 1),
+                               "max_ms": round(e["max"] * 1000, 1), "commands": dict(e["commands"].most_common())}
+                              for site, e in sites[:top]],
+                "budget_violations": [{"step": s, "commands": c, "budget": b} for s, c, b in violations],
+            }
+
+    def report(self, top=20):
+        data = self.to_dict(top)
+        lines = [f"WebDriver commands: {data['commands']} in {data['seconds']:.2f}s",
+                 f"{'step':<44}{'commands':>10}{'seconds':>10}"]
+        for step, totals in data["steps"].items():
+            budget = self.budgets.get(step)
+            flag = f"  (budget {budget})" if budget is not None else ""
+            lines.append(f"{step:<44}{totals['count']:>10}{totals['seconds']:>10.2f}{flag}")
+        lines.append(f"Top {len(data['top_sites'])} call sites by time:")
+        for row in data["top_sites"]:
+            commands = ", ".join(f"{name} x{n}" for name, n in row["commands"].items())
+            lines.append(f"  {row['seconds']:>7.2f}s {row['count']:>5}x  {row['site']}  [{commands}]")
+        for violation in data["budget_violations"]:
+            lines.append(f"OVER BUDGET {violation['step']}: {violation['commands']} > {violation['budget']}")
+        return "\n".join(lines)
+
+    def report_at_exit(self):
+        if not self.commands:
+            return
+        path = os.getenv("WEBDRIVER_PROFILE_PATH", os.path.join("logs", "webdriver_profile.json"))
+        print(self.report())
+        self.save(path)
+        print(f"WebDriver profile written to {path}")
+
+    def save(self, path, top=20):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(top), f, indent=4)
+
+
+def profiling_enabled():
+    return os.getenv("WEBDRIVER_PROFILE", "").lower() in ("1", "true", "yes")
+
+
+def instrument_driver(driver):
+    """Single hook on driver.command_executor.execute feeding the command counter and, when
+    WEBDRIVER_PROFILE is set, the shared profiler; returns the driver"""
+    executor = driver.command_executor
+    execute = executor.execute
+    commands = metrics.counter("webdriver_commands_total", "WebDriver round trips by step", ("step",))
+    profiler = CommandProfiler.shared() if profiling_enabled() else None
+
+    def instrumented(command, params=None):
+        current = current_span()
+        step = current.name if current else "untraced"
+        commands.inc(step=step)
+        if profiler is None:
+            return execute(command, params)
+        site = call_site()
+        start = time.perf_counter()
+        try:
+            return execute(command, params)
+        finally:
+            profiler.record(site, step, command, time.perf_counter() - start)
+    executor.execute = instrumented
+    return driver
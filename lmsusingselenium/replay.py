@@ -0,0 +1,253 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import traceback
+from configobj import ConfigObj
+from lmsusingselenium.fixtureserver import start_fixture_server, FIXTURES_DIR
+from lmsusingselenium.profiler import CommandProfiler, CommandBudgetExceeded, parse_command_budgets
+
+# End-to-end offline replay: serves the LMS and EdPuzzle fixtures locally, runs the same chain as
+# main.py headless with fixed selections, and checks each stage against a time budget.
+#
+#   python -m lmsusingselenium.replay --mock-llm --budget login=10 --budget interactions=120
+#
+# Exits non-zero when a stage fails or runs over its budget, or with --command-budget when a step
+# (tracing span, e.g. lms.select_module=40) sends more WebDriver commands than allowed.
+# Set CHROMEDRIVER_PATH when the box has no network access for webdriver-manager.
+
+STAGES = ["login", "subject", "self_paced", "module", "week", "lecture", "player", "interactions"]
+DEFAULT_BUDGETS = {"login": 20, "subject": 30, "self_paced": 10, "module": 20, "week": 20, "lecture": 20,
+                   "player": 30}
+
+
+def parse_budgets(specs):
+    budgets = dict(DEFAULT_BUDGETS)
+    for spec in specs or []:
+        name, _, seconds = spec.partition("=")
+        if name not in STAGES or not seconds:
+            raise ValueError(f"Budget must be <stage>=<seconds> with stage one of {', '.join(STAGES)}: {spec}")
+        budgets[name] = float(seconds)
+    return budgets
+
+
+def write_mock_answers(fixtures_dir):
+    """Answers file for the mock LLM: every fixture question mapped to its correct option number"""
+    with open(os.path.join(fixtures_dir, "site.json"), encoding="utf-8") as f:
+        site = json.load(f)
+    answers = {}
+    for lecture in site["lectures"].values():
+        for interaction in lecture["interactions"]:
+            for question in interaction["questions"]:
+                answers[question["question"]] = question["correct"] + 1
+    path = os.path.join(tempfile.mkdtemp(prefix="replay-"), "answers.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(answers, f, indent=2)
+    return path
+
+
+class StageTimer:
+    def __init__(self, budgets):
+        self.budgets = budgets
+        self.results = []
+
+    def run(self, name, call, *args):
+        """Run one stage; a falsy result or an exception marks it failed"""
+        print(f"\n=== Replay stage: {name} ===")
+        start = time.perf_counter()
+        try:
+            result = call(*args)
+            error = None if result else "returned no result"
+        except Exception as e:
+            traceback.print_exc()
+            result, error = None, str(e)
+        self.record(name, time.perf_counter() - start, error)
+        return result
+
+    def record(self, name, seconds, error=None):
+        budget = self.budgets.get(name)
+        over = budget is not None and seconds > budget
+        self.results.append({"stage": name, "seconds": round(seconds, 3), "budget": budget,
+                             "ok": error is None and not over,
+                             "error": error or (f"over budget by {seconds - budget:.2f}s" if over else None)})
+
+    @property
+    def passed(self):
+        return bool(self.results) and all(r["ok"] for r in self.results)
+
+    def report(self):
+        lines = [f"{'stage':<14}{'seconds':>10}{'budget':>10}  status"]
+        for r in self.results:
+            budget = f"{r['budget']:g}" if r["budget"] is not None else "-"
+            status = "ok" if r["ok"] else f"FAIL ({r['error']})"
+            lines.append(f"{r['stage']:<14}{r['seconds']:>10.2f}{budget:>10}  {status}")
+        return "\n".join(lines)
+
+
+def wait_for_answers(site, activity_id, timeout, interval=0.5):
+    """Block until the fake player has recorded every question of the activity; returns the answers"""
+    expected = site.expected_answers(activity_id)
+    deadline = time.monotonic() + timeout
+    while True:
+        with site.lock:
+            answers = [a for a in site.answers if a.get("lecture") == activity_id]
+        if len(answers) >= expected or time.monotonic() >= deadline:
+            return answers, expected
+        time.sleep(interval)
+
+
+def start_services(args):
+    """Fixture server (and the mock LLM with --mock-llm) plus the environment the automation reads"""
+    server = start_fixture_server(args.host, args.port, args.fixtures)
+    os.environ["LMS_BASE_URL"] = f"http://{args.host}:{server.server_address[1]}"
+    os.environ["LMS_HEADLESS"] = "0" if args.headed else "1"
+    os.environ.setdefault("USER_ID", "fixture-student")
+    os.environ.setdefault("PASSWORD", "fixture-password")
+    os.environ["ANSWER_DWELL_SECONDS"] = str(args.dwell)
+    # Questions, stored answers and the LLM answer cache go to a scratch folder, never the real ones
+    args.workdir = args.workdir or tempfile.mkdtemp(prefix="replay-")
+    os.environ["QUESTION_DIR"] = os.path.join(args.workdir, "Question")
+    os.environ["ANSWER_DIR"] = os.path.join(args.workdir, "answer")
+    os.environ["ANSWER_CACHE_PATH"] = os.path.join(args.workdir, "answer_cache.json")
+    print(f"Replay working folder: {args.workdir}")
+    if args.profile_commands or args.command_budgets:
+        os.environ["WEBDRIVER_PROFILE"] = "1"
+
+    mock = None
+    if args.mock_llm:
+        from edpuzzlesolver.mockllm import start_mock_server
+
+        settings = dict(ConfigObj(args.config).get('mock_llm', {}))
+        settings['answers_file'] = write_mock_answers(args.fixtures)
+        mock = start_mock_server(settings)
+        os.environ["MOCK_LLM"] = "1"
+    return server, mock
+
+
+def run_pipeline(site, timer, args):
+    """The main.py chain with fixed selections; returns (activity id, recorded answers, expected count)"""
+    # Imported after start_services; whynot reads the dwell time at import
+    from lmsusingselenium.lms import (login_to_lms, select_and_navigate_to_subject, navigate_to_self_paced_learning,
+                                      select_and_open_module, select_and_open_week, select_and_open_lecture,
+                                      play_video)
+    from lmsusingselenium.whynot import extract_interaction_times, cancel_scheduled_interactions, start_lecture
+
+    def start_player(driver):
+        # play_video leaves the driver inside the player iframe
+        play_video(driver)
+        return driver.execute_script("const v = document.querySelector('video'); return v && !v.paused;")
+
+    # Each run is a fresh lecture: nothing answered by an earlier run in this process counts
+    start_lecture()
+    driver = timer.run("login", login_to_lms)
+    activity_id, answers, expected = None, [], 0
+    try:
+        steps = [
+            ("subject", select_and_navigate_to_subject, args.subject),
+            ("self_paced", navigate_to_self_paced_learning),
+            ("module", select_and_open_module, args.module),
+            ("week", select_and_open_week, args.week),
+            ("lecture", select_and_open_lecture, args.lecture),
+            ("player", start_player),
+        ]
+        completed = driver is not None
+        for name, call, *selection in (steps if completed else []):
+            if name == "player":
+                activity_id = int(driver.current_url.rsplit("id=", 1)[-1])
+            if not timer.run(name, call, driver, *selection):
+                completed = False
+                break
+        if completed:
+            start = time.perf_counter()
+            times = extract_interaction_times(driver)
+            answers, expected = wait_for_answers(site, activity_id, args.timeout)
+            error = None if times and len(answers) >= expected else f"{len(answers)} of {expected} questions answered"
+            timer.record("interactions", time.perf_counter() - start, error)
+    finally:
+        cancel_scheduled_interactions()
+        if driver:
+            driver.quit()
+    return activity_id, answers, expected
+
+
+def command_profile(args):
+    """Profiler report for the run just finished, or None when profiling is off"""
+    if not (args.profile_commands or args.command_budgets):
+        return None
+    profiler = CommandProfiler.shared()
+    profiler.budgets = args.command_budgets
+    print("\n" + profiler.report(args.profile_top))
+    return profiler.to_dict(args.profile_top)
+
+
+def within_command_budgets(args):
+    """False, with the overruns printed, when a step sent more commands than its --command-budget"""
+    try:
+        CommandProfiler.shared().assert_budgets(args.command_budgets)
+    except CommandBudgetExceeded as e:
+        print(f"Command budget exceeded: {e}")
+        return False
+    return True
+
+
+def replay(args):
+    server, mock = start_services(args)
+    timer = StageTimer(args.budgets)
+    try:
+        _, answers, expected = run_pipeline(server.RequestHandlerClass.site, timer, args)
+    finally:
+        server.shutdown()
+        if mock:
+            mock.shutdown()
+
+    correct = sum(1 for a in answers if a.get("correct"))
+    print("\nReplay results:\n" + timer.report())
+    print(f"Answers: {len(answers)} of {expected} recorded, {correct} correct")
+    profile = command_profile(args)
+    passed = within_command_budgets(args) and timer.passed
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"stages": timer.results, "answers": answers, "expected_answers": expected,
+                       "commands": profile, "passed": passed}, f, indent=2)
+        print(f"Wrote {args.output}")
+    return passed
+
+
+def add_pipeline_arguments(parser):
+    """Options shared by the replay and the lecture pipeline benchmark"""
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0, help="fixture server port (0 picks a free one)")
+    parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    parser.add_argument("--config", default="config.ini")
+    parser.add_argument("--subject", type=int, default=2)
+    parser.add_argument("--module", type=int, default=1)
+    parser.add_argument("--week", type=int, default=1)
+    parser.add_argument("--lecture", type=int, default=1)
+    parser.add_argument("--workdir", help="folder for questions, stored answers and the answer cache "
+                                           "(default: a new temp folder)")
+    parser.add_argument("--dwell", type=float, default=1.0, help="seconds to wait after selecting an answer")
+    parser.add_argument("--timeout", type=float, default=300.0, help="seconds to wait for all questions")
+    parser.add_argument("--headed", action="store_true", help="show the browser window")
+    parser.add_argument("--profile-commands", action="store_true", help="count and time every WebDriver command")
+    parser.add_argument("--profile-top", type=int, default=20, help="call sites to list in the command report")
+    parser.add_argument("--command-budget", action="append", metavar="STEP=COUNT",
+                        help="fail when a tracing step sends more WebDriver commands (implies --profile-commands)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the LMS automation headless against local fixtures")
+    add_pipeline_arguments(parser)
+    parser.add_argument("--mock-llm", action="store_true", help="answer through the local mock LLM")
+    parser.add_argument("--budget", action="append", metavar="STAGE=SECONDS")
+    parser.add_argument("--output", help="write stage timings and answers as JSON")
+    args = parser.parse_args()
+    args.budgets = parse_budgets(args.budget)
+    args.command_budgets = parse_command_budgets(args.command_budget)
+    sys.exit(0 if replay(args) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,21 +2,42 @@ import os
 import json
 import time
 import re
-from threading import Timer, Lock
+import contextvars
+from threading import Timer, Lock, current_thread
 from lmsusingselenium.driver import setup_driver
+from lmsusingselenium.debugcapture import debug_screenshot
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
 from edpuzzlesolver.llminit import LLMManager
+from edpuzzlesolver.tracing import traced, annotate, text_hash
+from edpuzzlesolver import metrics
 
 interaction_timing = {
     "scheduled_timers": [],
-    "timing_lock": Lock()
+    "timing_lock": Lock(),
+    # Interaction times already handled (restored from a checkpoint on resume) and a callback
+    # called with each newly finished one
+    "completed": set(),
+    "on_complete": None
 }
 
-a = 15
+# Seconds to dwell on a selected answer before submitting; the offline replay shortens it
+a = float(os.getenv('ANSWER_DWELL_SECONDS', 15))
+
+def count_interaction(kind):
+    metrics.counter("interactions_total", "Interactions handled, by kind (single, multiple, skipped, error)",
+                    ("kind",)).inc(kind=kind)
+
+def question_folder():
+    """Where extracted questions are saved; QUESTION_DIR moves them out of the tree (replay, benchmarks)"""
+    return os.getenv('QUESTION_DIR', 'Question')
+
+def answer_folder():
+    """Where settled answers are stored and reused; ANSWER_DIR as for question_folder"""
+    return os.getenv('ANSWER_DIR', 'answer')
 
 def sanitize_filename(name):
     return re.sub(r'[^a-zA-Z0-9_-]', '', name[:50])
@@ -61,28 +82,70 @@ def extract_interaction_times(driver):
         
     except Exception as e:
         print(f"Error extracting interaction times: {str(e)}")
-        driver.save_screenshot("interaction_extraction_error.png")
+        debug_screenshot(driver, "interaction_extraction_error", "error")
         return []
 
+def update_scheduled_gauge():
+    """Publish the number of pending interaction timers; call with timing_lock held"""
+    metrics.gauge("interactions_scheduled", "Interaction timers waiting to fire").set(
+        len(interaction_timing["scheduled_timers"]))
+
+def cancel_timers_locked():
+    for timer in interaction_timing["scheduled_timers"]:
+        timer.cancel()
+    interaction_timing["scheduled_timers"].clear()
+    update_scheduled_gauge()
+
+def cancel_scheduled_interactions():
+    with interaction_timing["timing_lock"]:
+        cancel_timers_locked()
+
+def interaction_fired(driver, interaction_time):
+    """Timer callback: the timer is no longer pending once it fires"""
+    with interaction_timing["timing_lock"]:
+        if current_thread() in interaction_timing["scheduled_timers"]:
+            interaction_timing["scheduled_timers"].remove(current_thread())
+        update_scheduled_gauge()
+    process_interaction(driver, interaction_time)
+
 def schedule_interactions(driver, interaction_times):
     with interaction_timing["timing_lock"]:
-        for timer in interaction_timing["scheduled_timers"]:
-            timer.cancel()
-        interaction_timing["scheduled_timers"].clear()
+        cancel_timers_locked()
         
         current_time = driver.execute_script("return document.querySelector('video').currentTime;")
         playback_rate = driver.execute_script("return document.querySelector('video').playbackRate;")
         print(f"Current video time: {current_time:.2f}s, Playback rate: {playback_rate}x")
         
         for interaction_time in interaction_times:
+            if interaction_time in interaction_timing["completed"]:
+                print(f"Interaction at {interaction_time}s already completed, not scheduling")
+                continue
             if interaction_time > current_time:
                 wait_seconds = (interaction_time - current_time) / playback_rate
                 print(f"Scheduling interaction at {interaction_time}s (wait: {wait_seconds:.2f}s)")
                 
-                timer = Timer(wait_seconds, process_interaction, args=[driver, interaction_time])
+                # Run under a copy of this context so the interaction span is a child of the scheduling span
+                timer = Timer(wait_seconds, contextvars.copy_context().run,
+                              args=[interaction_fired, driver, interaction_time])
                 timer.daemon = True
                 timer.start()
                 interaction_timing["scheduled_timers"].append(timer)
+        update_scheduled_gauge()
+
+def start_lecture(completed=(), on_complete=None):
+    """Reset the per-lecture interaction state: cancel pending timers and start the completed set
+    from `completed` (times restored from a checkpoint)"""
+    with interaction_timing["timing_lock"]:
+        cancel_timers_locked()
+        interaction_timing["completed"] = set(completed)
+        interaction_timing["on_complete"] = on_complete
+
+def mark_interaction_completed(interaction_time):
+    if interaction_time is None:
+        return
+    interaction_timing["completed"].add(interaction_time)
+    if interaction_timing["on_complete"]:
+        interaction_timing["on_complete"](interaction_time)
 
 def check_and_skip_attempted_question(driver):
     try:
@@ -100,8 +163,10 @@ def check_and_skip_attempted_question(driver):
         print(f"Error checking attempted status: {str(e)}")
         return False
 
+@traced("whynot.process_interaction")
 def process_interaction(driver, interaction_time=None):
     print(f"\n=== Interaction at {interaction_time}s reached ===")
+    annotate(interaction_time=interaction_time)
     
     if interaction_time:
         current_time = driver.execute_script("return document.querySelector('video').currentTime;")
@@ -110,38 +175,50 @@ def process_interaction(driver, interaction_time=None):
     
     time.sleep(5)
     if check_and_skip_attempted_question(driver):
+        count_interaction("skipped")
+        mark_interaction_completed(interaction_time)
         reschedule_remaining_interactions(driver)
         return
     
+    # Only an answered (or already attempted) interaction is marked completed; anything else is
+    # left for a resumed run to retry
+    answered = False
     try:
         # Check for pagination or "Next question" button to determine multiple interactions
         pagination_elements = driver.find_elements(By.CSS_SELECTOR, "div.pagination-indicator")
         next_question_button = driver.find_elements(By.CSS_SELECTOR, 'div.n_fDEjdOhe button span.vRiXkQIxXS')
         is_multiple = len(pagination_elements) > 0 or (next_question_button and next_question_button[0].text == "Next question")
+        annotate(multiple=bool(is_multiple))
+        count_interaction("multiple" if is_multiple else "single")
         
         if is_multiple:
             if pagination_elements:
-                process_multiple_interactions(driver, pagination_elements)
+                answered = process_multiple_interactions(driver, pagination_elements)
             else:
                 # Handle "Next question" as multiple interaction
                 print("Detected 'Next question' - Treating as multiple interaction")
                 extracted_data = extract_question_and_options(driver)
                 if extracted_data:
                     answer = answer_question_with_fallback(extracted_data)
-                    select_answer_in_ui(driver, answer, is_multiple=True)
+                    answered = select_answer_in_ui(driver, answer, is_multiple=True)
         else:
-            process_single_interaction(driver)
+            answered = process_single_interaction(driver)
             
     except Exception as e:
         print(f"Error processing interaction: {str(e)}")
-        driver.save_screenshot("interaction_error.png")
+        count_interaction("error")
+        debug_screenshot(driver, "interaction_error", "error")
         try:
             extracted_data = extract_question_and_options(driver)
             if extracted_data:
                 answer = answer_question_with_fallback(extracted_data)
-                select_answer_in_ui(driver, answer)
+                answered = select_answer_in_ui(driver, answer)
         except:
             print("Failed to salvage interaction")
+    if answered:
+        mark_interaction_completed(interaction_time)
+    else:
+        print(f"Interaction at {interaction_time}s not answered; not marking it completed")
 
 def reschedule_remaining_interactions(driver):
     interaction_times = extract_interaction_times(driver)
@@ -149,10 +226,12 @@ def reschedule_remaining_interactions(driver):
         schedule_interactions(driver, interaction_times)
 
 def process_multiple_interactions(driver, pagination_elements):
+    """True when every question of the interaction was answered"""
     pagination_text = pagination_elements[0].text
     total_interactions = int(pagination_text.split("of")[1].strip())
     print(f"Processing {total_interactions} interactions")
     
+    answered = True
     for i in range(total_interactions):
         pagination_elements = driver.find_elements(By.CSS_SELECTOR, "div.pagination-indicator")
         if pagination_elements:
@@ -161,26 +240,30 @@ def process_multiple_interactions(driver, pagination_elements):
             extracted_data = extract_question_and_options(driver)
             if extracted_data:
                 answer = answer_question_with_fallback(extracted_data)
-                select_answer_in_ui(driver, answer, is_multiple=True)
+                answered = select_answer_in_ui(driver, answer, is_multiple=True) and answered
+            else:
+                answered = False
         else:
             break
+    return answered
 
 def process_single_interaction(driver):
     print("Processing single interaction")
     extracted_data = extract_question_and_options(driver)
     if extracted_data:
         answer = answer_question_with_fallback(extracted_data)
-        select_answer_in_ui(driver, answer, is_multiple=False)
-    else:
-        print("Failed to extract question")
-        driver.save_screenshot("interaction_question_error.png")
+        return select_answer_in_ui(driver, answer, is_multiple=False)
+    print("Failed to extract question")
+    debug_screenshot(driver, "interaction_question_error", "error")
+    return False
 
+@traced("whynot.extract_question_and_options")
 def extract_question_and_options(driver):
     try:
-        os.makedirs("Question", exist_ok=True)
+        os.makedirs(question_folder(), exist_ok=True)
         
         # Take a screenshot for debugging
-        driver.save_screenshot("extraction_attempt.png")
+        debug_screenshot(driver, "extraction_attempt")
         print( "sleeping for")
         # Add a small fixed delay to ensure page has loaded
         time.sleep(5)
@@ -220,11 +303,12 @@ def extract_question_and_options(driver):
             for i, option in enumerate(options, 1):
                 output[f"Option {i}"] = option
             
-            file_name = f"Question/{sanitize_filename(question)}.json"
+            file_name = os.path.join(question_folder(), f"{sanitize_filename(question)}.json")
             with open(file_name, "w", encoding="utf-8") as json_file:
                 json.dump(output, json_file, ensure_ascii=False, indent=4)
             
             print(f"Extracted question saved to {file_name}")
+            annotate(question_hash=text_hash(question), options=len(options))
             return output
         
         print("Question or options empty after extraction")
@@ -232,13 +316,13 @@ def extract_question_and_options(driver):
         
     except Exception as e:
         print(f"Error extracting question/options: {str(e)}")
-        driver.save_screenshot("extraction_error.png")
+        debug_screenshot(driver, "extraction_error", "error")
         return None
     
         
     except TimeoutException:
         print("Timeout waiting for question/options to load.")
-        driver.save_screenshot("question_extraction_timeout.png")
+        debug_screenshot(driver, "question_extraction_timeout", "error")
         # Fallback: Retry once after a short delay
         try:
             time.sleep(2)  # Brief pause for UI to settle
@@ -252,7 +336,7 @@ def extract_question_and_options(driver):
                 for i, option in enumerate(options, 1):
                     output[f"Option {i}"] = option
                 
-                file_name = f"Question/{sanitize_filename(question)}.json"
+                file_name = os.path.join(question_folder(), f"{sanitize_filename(question)}.json")
                 with open(file_name, "w", encoding="utf-8") as json_file:
                     json.dump(output, json_file, ensure_ascii=False, indent=4)
                 
@@ -265,32 +349,58 @@ def extract_question_and_options(driver):
             return None
     except Exception as e:
         print(f"Unexpected error extracting question/options: {str(e)}")
-        driver.save_screenshot("question_extraction_error.png")
+        debug_screenshot(driver, "question_extraction_error", "error")
         return None
 
+@traced("whynot.answer_question_with_fallback")
 def answer_question_with_fallback(question_data):
-    os.makedirs("answer", exist_ok=True)
+    os.makedirs(answer_folder(), exist_ok=True)
     
     question = question_data["Question"]
-    file_name = f"answer/{sanitize_filename(question)}.json"
+    annotate(question_hash=text_hash(question))
+    file_name = os.path.join(answer_folder(), f"{sanitize_filename(question)}.json")
+    llm_manager = LLMManager()
+    ensemble = llm_manager.ensemble_settings()
     
     # Check if the answer is already stored
+    stored_answer_data = None
     if os.path.exists(file_name):
         with open(file_name, "r", encoding="utf-8") as json_file:
             stored_answer_data = json.load(json_file)
-            if "Final Answer" in stored_answer_data:
+        if "Final Answer" in stored_answer_data:
+            settled = (stored_answer_data.get("Agreement", 0.0) >= ensemble["settled_agreement"]
+                       and sum(stored_answer_data.get("Votes", {}).values()) >= ensemble["quorum"])
+            if not ensemble["enabled"] or settled:
                 print(f"Using stored answer for question: {question}")
+                annotate(stored=True)
+                metrics.cache_lookup("stored_answer", True)
                 return stored_answer_data["Final Answer"]
+            print(f"Stored answer not settled (agreement {stored_answer_data.get('Agreement', 'n/a')}), re-voting")
 
     # If not stored, proceed with LLM-based answering
-    llm_manager = LLMManager()
-    llm_instances = llm_manager.setup_llm_with_fallback()
-    
+    metrics.cache_lookup("stored_answer", False)
     options = [value for key, value in question_data.items() if key.startswith("Option")]
-    formatted_input = f"Question: {question}\nOptions:\n" + "\n".join(options) + "\nAnswer based only on the options. Output only the answer."
-    
-    final_answer = llm_manager.invoke_with_fallback(llm_instances, llm_manager.DEFAULT_FALLBACK_ORDER, formatted_input)
+    if ensemble["enabled"]:
+        llm_instances = llm_manager.setup_llm_with_fallback(ensemble["providers"])
+        index, agreement, votes = llm_manager.answer_with_vote(
+            llm_instances, ensemble["providers"], question, options, ensemble["quorum"], ensemble["samples"])
+        if index is None and stored_answer_data and "Final Answer" in stored_answer_data:
+            print("Vote failed, keeping stored answer")
+            return stored_answer_data["Final Answer"]
+        reply = "Error: All LLMs in ensemble failed."
+        question_data["Agreement"] = round(agreement, 3)
+        question_data["Votes"] = votes
+        print(f"Ensemble agreement {agreement:.0%} with votes {votes}")
+    else:
+        llm_instances = llm_manager.setup_llm_with_fallback()
+        index, reply = llm_manager.answer_with_fallback(llm_instances, llm_manager.DEFAULT_FALLBACK_ORDER, question, options)
+    if index is not None:
+        final_answer = options[index]
+        question_data["Answer Index"] = index + 1
+    else:
+        final_answer = reply
     question_data["Final Answer"] = final_answer
+    annotate(stored=False, ensemble=ensemble["enabled"], answer_index=index + 1 if index is not None else None)
     
     # Save the answer for future use
     with open(file_name, "w", encoding="utf-8") as json_file:
@@ -299,6 +409,7 @@ def answer_question_with_fallback(question_data):
     print(f"Answer saved in {file_name}")
     return final_answer
 
+@traced("whynot.select_answer_in_ui")
 def select_answer_in_ui(driver, answer, is_multiple=False):
     try:
         option_elements = driver.find_elements(By.CSS_SELECTOR, 'section.xpe9TO2_Hw ul.S22KF9HiqC li label')
@@ -340,25 +451,24 @@ def select_answer_in_ui(driver, answer, is_multiple=False):
                             extracted_data = extract_question_and_options(driver)
                             if extracted_data:
                                 answer = answer_question_with_fallback(extracted_data)
-                                select_answer_in_ui(driver, answer, is_multiple=True)
-                                return True
+                                return select_answer_in_ui(driver, answer, is_multiple=True)
                             else:
                                 print("Failed to extract next question")
-                                driver.save_screenshot("next_question_failed.png")
+                                debug_screenshot(driver, "next_question_failed", "error")
                                 return False
                         except TimeoutException:
                             print("Timeout waiting for next question to load")
-                            driver.save_screenshot("next_question_timeout.png")
+                            debug_screenshot(driver, "next_question_timeout", "error")
                             return False
                 except Exception as e:
                     print(f"Error with button action: {str(e)}")
                     return False
                 
         print(f"Could not find option: {answer}")
-        driver.save_screenshot("answer_selection_error.png")
+        debug_screenshot(driver, "answer_selection_error", "error")
         return False
         
     except Exception as e:
         print(f"Error selecting answer: {str(e)}")
-        driver.save_screenshot("answer_selection_error.png")
+        debug_screenshot(driver, "answer_selection_error", "error")
         return False
\ No newline at end of file
@@ -1,13 +1,70 @@
 from lmsusingselenium.lms import login_to_lms,select_and_navigate_to_subject, navigate_to_self_paced_learning, select_and_open_lecture,select_and_open_module,select_and_open_week,set_video_speed,play_video
-from lmsusingselenium.whynot import extract_question_and_options,answer_question_with_fallback ,extract_interaction_times
+from lmsusingselenium.whynot import extract_question_and_options,answer_question_with_fallback ,extract_interaction_times, start_lecture
+from lmsusingselenium.checkpoint import CheckpointJournal, resume_position, seek_video, video_state
 import time
+import argparse
 import traceback
+from configobj import ConfigObj
+from edpuzzlesolver import metrics
+from lmsusingselenium.debugcapture import debug_screenshot
+
+def wait_for_interactions(driver, journal, interaction_times):
+    """Keep the script running until the interactions are processed, journaling the video position"""
+    state = video_state(driver)
+    position = state[0] if state else 0
+    if interaction_times:
+        max_time = max(interaction_times) - position + 30  # Add 30 seconds buffer
+        print(f"Script will run for approximately {max_time:.0f} seconds")
+    else:
+        # Default wait time if no interaction points are found
+        max_time = 180
+    deadline = time.monotonic() + max_time
+    while time.monotonic() < deadline:
+        time.sleep(max(0, min(journal.position_interval, deadline - time.monotonic())))
+        try:
+            state = video_state(driver)
+        except Exception as e:
+            print(f"Could not read video position: {e}")
+            continue
+        if state:
+            journal.position(state[0])
+            if state[2]:
+                print("Video ended")
+                break
 
 def main():
+    parser = argparse.ArgumentParser(description="LMS lecture automation")
+    parser.add_argument("--fresh", action="store_true", help="ignore an unfinished run's checkpoint")
+    args = parser.parse_args()
+
+    journal = CheckpointJournal.from_config(ConfigObj('config.ini'))
+    resume = None if args.fresh else journal.unfinished()
     print("Starting LMS automation...")
     driver = login_to_lms()
     
-    if driver:
+    if driver and resume:
+        try:
+            # Pick up an interrupted lecture: same page, same position, only the interactions left
+            print(f"Resuming unfinished run from {resume['path']}: {resume['selection']}")
+            journal.open(resume)
+            journal.resumed()
+            start_lecture(resume["completed_times"], journal.interaction_done)
+            driver.get(resume["url"])
+            time.sleep(5) # Wait for lecture to load
+            play_video(driver)
+            seek_video(driver, resume_position(resume))
+            interaction_times = extract_interaction_times(driver)
+            remaining = [t for t in interaction_times if t not in resume["completed_times"]]
+            print(f"{len(remaining)} of {len(interaction_times)} interactions left")
+            wait_for_interactions(driver, journal, remaining)
+            journal.completed()
+            metrics.counter("lectures_completed_total", "Lectures played through to the end").inc()
+        except Exception as e:
+            print(f"An error occurred while resuming: {str(e)}")
+            traceback.print_exc()
+            debug_screenshot(driver, "resume_error", "error")
+            journal.abandoned(str(e))
+    elif driver:
         try:
             selected_subject = select_and_navigate_to_subject(driver)
             if not selected_subject:
@@ -40,6 +97,10 @@ def main():
                 return
                 
             print(f"\nSuccessfully navigated to {selected_module} > {selected_week} > {selected_lecture}")
+            journal.open()
+            journal.lecture(driver.current_url, subject=selected_subject, module=selected_module,
+                            week=selected_week, lecture=selected_lecture)
+            start_lecture(on_complete=journal.interaction_done)
             time.sleep(5) # Wait for lecture to load  
             play_video(driver)
             
@@ -48,22 +109,19 @@ def main():
             
             if interaction_times:
                 print(f"Found {len(interaction_times)} interaction points. Automation will process them as they occur.")
-                
-                # Keep the script running until all interactions are processed  and..
-                max_time = max(interaction_times) + 30  # Add 30 seconds buffer
-                print(f"Script will run for approximately {max_time} seconds")
-                
-                # Sleep until all interactions should be processed
-                time.sleep(max_time)
+                journal.interactions(interaction_times)
             else:
                 print("No interaction points found. Video will play without automation.")
-                # Default wait time if no interaction points are found
-                time.sleep(180)
+            
+            # Sleep until all interactions should be processed
+            wait_for_interactions(driver, journal, interaction_times)
+            journal.completed()
+            metrics.counter("lectures_completed_total", "Lectures played through to the end").inc()
                 
         except Exception as e:
             print(f"An error occurred during automation: {str(e)}")
             traceback.print_exc()
-            driver.save_screenshot("automation_error.png")
+            debug_screenshot(driver, "automation_error", "error")
     else:
         print("Login failed. Cannot proceed with navigation.")
 
@@ -8,15 +8,31 @@ from io import BytesIO
 from PIL import Image
 from openai import OpenAI
 import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from stateclassifier import StateClassifier
+from loginflow import LoginFlow, Transition, ScreenCheck, distinct_references, reject_ambiguous_checks
 
 load_dotenv()
 
+# detect_current_state() names for each flow step's reference image
+STEP_STATES = {"logged_in": "logged_in", "password_screen": "password", "lms_open": "lms", "profile_selected": "profile"}
+# LLM comparisons run concurrently; the first match in this order wins
+STATE_PRIORITY = ["logged_in", "password_screen", "lms_open", "profile_selected"]
+# Longest side of images sent to the vision model
+MAX_IMAGE_SIDE = 1024
+# Detected states that the login graph handles like another one
+STATE_ALIASES = {"password": "lms", "login_error": "lms", None: "not_browser"}
+# Postcondition region per state (fractions of the screen); the Chrome window only, not the desktop around it
+CHECK_REGIONS = {"browser_other": {"region": (0.165, 0.035, 0.835, 0.96)}}
+
 class LMSAutomator:
     def __init__(self):
         self.password = os.environ.get('PASSWORD')
         self.user_id = os.environ.get('USER_ID')
         self.openrouter_api_key = os.environ.get('OPENROUTER_API_KEY')
         self.max_login_attempts = 3
+        # Below this local classifier confidence the screen is checked with the vision LLM
+        self.state_confidence = float(os.environ.get('STATE_CONFIDENCE', '0.6'))
         
         if not self.password:
             print("Error: PASSWORD environment variable not set.")
@@ -48,13 +64,8 @@ class LMSAutomator:
             absolute_path = os.path.abspath(image_path)
             if os.path.exists(absolute_path):
                 try:
-                    with open(absolute_path, "rb") as image_file:
-                        if image_file is None:
-                            print(f"CRITICAL: open({absolute_path}, 'rb') returned None")
-                            self.reference_images[step["name"]] = None
-                            continue
-                        img_data = base64.b64encode(image_file.read()).decode('utf-8')
-                        self.reference_images[step["name"]] = img_data
+                    # Downscaled and encoded once; every comparison reuses the same payload
+                    self.reference_images[step["name"]] = self.encode_screenshot(Image.open(absolute_path))
                 except Exception as e:
                     print(f"Error loading reference image {absolute_path}: {e}")
                     self.reference_images[step["name"]] = None
@@ -62,14 +73,28 @@ class LMSAutomator:
                 print(f"Reference image not found: {absolute_path}")
                 self.reference_images[step["name"]] = None
         
+        references = {STEP_STATES[step["name"]]: step["image_path"] for step in self.flow_steps
+                      if self.reference_images.get(step["name"])}
+        browser_reference = "lmsopen/reference_images/browser_opened.png"
+        if os.path.exists(browser_reference):
+            references["browser_other"] = browser_reference
+        references = distinct_references(references)
+        self.state_classifier = StateClassifier(references)
+        self.detection_times = {}
+        self.login_flow = self.build_login_flow(references)
+        
         self.smart_execute_flow()
 
     def capture_screenshot(self):
-        screenshot = pyautogui.screenshot()
+        return self.encode_screenshot(pyautogui.screenshot())
+
+    def encode_screenshot(self, screenshot):
+        """Base64 JPEG no larger than MAX_IMAGE_SIDE on its longest side"""
+        image = screenshot.convert("RGB")
+        image.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE), Image.LANCZOS)
         buffered = BytesIO()
-        screenshot.save(buffered, format="PNG")
-        img_str = base64.b64encode(buffered.getvalue()).decode('utf-8')
-        return img_str
+        image.save(buffered, format="JPEG", quality=85)
+        return base64.b64encode(buffered.getvalue()).decode('utf-8')
 
     def compare_with_openrouter(self, screenshot_base64, reference_base64, step_name):
         if reference_base64 is None:
@@ -102,7 +127,9 @@ class LMSAutomator:
                         "role": "user",
                         "content": [
                             {"type": "text", "text": prompt},
-                            {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{screenshot_base64}"}},
+                            {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{screenshot_base64}"}},
+                            {"type": "text", "text": f"Reference image of the '{step_name}' step:"},
+                            {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{reference_base64}"}},
                         ]
                     }
                 ],
@@ -133,38 +160,96 @@ class LMSAutomator:
             print(f"Error in OpenRouter comparison for {step_name}: {e}")
             return {"is_match": False, "is_browser": False, "is_login_error": False}
 
+    def compare_in_parallel(self, screenshot, step_names):
+        """Run the comparisons concurrently; returns (winning step or None, results by step).
+
+        A match is accepted once every higher-priority step has answered without one; the
+        remaining requests are then abandoned.
+        """
+        results = {}
+        start = time.perf_counter()
+        executor = ThreadPoolExecutor(max_workers=len(step_names))
+        try:
+            futures = {executor.submit(self.timed_compare, screenshot, name): name for name in step_names}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+                for name in step_names:
+                    if name not in results:
+                        break
+                    result = results[name]
+                    if result.get("is_match", False) or (name == "logged_in" and result.get("is_login_error", False)):
+                        print(f"LLM state decided by {name} in {time.perf_counter() - start:.2f}s")
+                        return name, results
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        print(f"LLM comparisons finished without a match in {time.perf_counter() - start:.2f}s")
+        return None, results
+
+    def timed_compare(self, screenshot, step_name):
+        start = time.perf_counter()
+        result = self.compare_with_openrouter(screenshot, self.reference_images[step_name], step_name)
+        if not isinstance(result, dict):
+            result = {"is_match": False, "is_browser": False, "is_login_error": False}
+        self.detection_times.setdefault(step_name, []).append(time.perf_counter() - start)
+        return result
+
+    def report_detection_times(self):
+        for name, times in self.detection_times.items():
+            print(f"  {name}: {len(times)} comparison(s), last {times[-1]:.2f}s, mean {sum(times) / len(times):.2f}s")
+
     def detect_current_state(self):
-        screenshot = self.capture_screenshot()
+        start = time.perf_counter()
+        image = pyautogui.screenshot()
+        state, confidence, candidates = self.state_classifier.classify(image)
+        if state and confidence >= self.state_confidence:
+            self.detection_times.setdefault("local", []).append(time.perf_counter() - start)
+            return state
         
-        logged_in_result = self.compare_with_openrouter(screenshot, self.reference_images["logged_in"], "logged_in")
-        if logged_in_result.get("is_match", False):
-            return "logged_in"
+        screenshot = self.encode_screenshot(image)
+        steps = {state: name for name, state in STEP_STATES.items()}
+        step_names = STATE_PRIORITY
+        if candidates and all(c in steps for c in candidates):
+            # Only the look-alike references are in doubt: ask about those alone
+            print(f"Low confidence ({confidence:.2f}); asking the LLM about {', '.join(candidates)}")
+            step_names = [name for name in STATE_PRIORITY if STEP_STATES[name] in candidates]
         
-        if logged_in_result.get("is_login_error", False):
-            return "login_error"
-            
-        password_result = self.compare_with_openrouter(screenshot, self.reference_images["password_screen"], "password_screen")
-        if password_result.get("is_match", False):
-            return "password"
-            
-        lms_result = self.compare_with_openrouter(screenshot, self.reference_images["lms_open"], "lms_open")
-        if lms_result.get("is_match", False):
-            return "lms"
-            
-        profile_result = self.compare_with_openrouter(screenshot, self.reference_images["profile_selected"], "profile_selected")
-        if profile_result.get("is_match", False):
-            return "profile"
-            
-        is_browser = any([
-            result.get("is_browser", False) 
-            for result in [logged_in_result, password_result, lms_result, profile_result]
-            if result is not None and isinstance(result, dict)
-        ])
+        try:
+            winner, results = self.compare_in_parallel(screenshot, step_names)
+            if winner is None and step_names != STATE_PRIORITY:
+                # The candidates were wrong after all; check the remaining states
+                rest = [name for name in STATE_PRIORITY if name not in step_names]
+                winner, more = self.compare_in_parallel(screenshot, rest)
+                results.update(more)
+        finally:
+            print(f"State detection took {time.perf_counter() - start:.2f}s; per-state LLM times:")
+            self.report_detection_times()
         
-        if is_browser:
+        if winner:
+            return "login_error" if results[winner].get("is_login_error", False) and not results[winner].get("is_match", False) else STEP_STATES[winner]
+        if any(result.get("is_browser", False) for result in results.values()):
             return "browser_other"
-        else:
-            return "not_browser"
+        return "not_browser"
+
+    def build_login_flow(self, references):
+        """Transitions with the screen each one must reach; checks exist only for screens with a reference"""
+        checks = {}
+        for state, path in references.items():
+            try:
+                checks[state] = ScreenCheck(path, **CHECK_REGIONS.get(state, {}))
+            except Exception as e:
+                print(f"No postcondition check for {state}: {e}")
+        transitions = [
+            Transition("open_browser", "not_browser", "profile", self.openapp, timeout=10),
+            Transition("select_profile", "profile", "browser_other", self.openprofilecoord, timeout=8),
+            Transition("open_lms", "browser_other", "lms", self.openlms, timeout=10),
+            Transition("log_in", "lms", "logged_in", lambda: self.inputpassword(self.password), timeout=12,
+                       retries=self.max_login_attempts - 1, idempotent=False),
+        ]
+        return LoginFlow(transitions, reject_ambiguous_checks(transitions, checks, references))
+
+    def detect_flow_state(self):
+        state = self.detect_current_state()
+        return STATE_ALIASES.get(state, state)
 
     def smart_execute_flow(self):
         print("Analyzing current screen state...")
@@ -174,89 +259,13 @@ class LMSAutomator:
         if current_state == "logged_in":
             print("Already logged in! No further action needed.")
             return
-            
-        if current_state == "not_browser":
-            print("Browser not detected. Starting complete flow...")
-            self.openapp()
-            time.sleep(3)
-            self.attempt_login_flow()
-            return
-            
-        if current_state == "profile":
-            print("Profile screen detected. Continuing from profile selection...")
-            self.openprofilecoord()
-            time.sleep(2)
-            self.openlms()
-            time.sleep(2)
-            self.attempt_login_with_retries()
-            return
-            
-        if current_state == "browser_other":
-            print("Browser detected but not on LMS. Opening LMS...")
-            self.openlms()
-            time.sleep(5)
-            self.attempt_login_with_retries()
-            return
-            
-        if current_state == "lms":
-            print("LMS login screen detected. Continuing with password entry...")
-            self.openlms()
-            time.sleep(2)
-            self.attempt_login_with_retries()
-            return
-            
-        if current_state == "password":
-            print("Password screen detected. Entering password...")
-            self.attempt_login_with_retries()
-            return
-            
-        if current_state == "login_error":
-            print("Login error detected. Retrying login process...")
-            self.attempt_login_with_retries()
-            return
-            
-        print("Unknown state detected. Starting complete flow...")
-        self.openapp()
-        time.sleep(3)
-        self.attempt_login_flow()
-
-    def attempt_login_flow(self):
-        self.openprofilecoord()
-        time.sleep(5)
-        self.openlms()
-        time.sleep(5)
-        self.attempt_login_with_retries()
-
-    def attempt_login_with_retries(self):
-        for attempt in range(1, self.max_login_attempts + 1):
-            print(f"Login attempt {attempt} of {self.max_login_attempts}...")
-            self.inputpassword(self.password)
-            time.sleep(7)
-            
-            screenshot = self.capture_screenshot()
-            result = self.compare_with_openrouter(screenshot, self.reference_images["logged_in"], "logged_in")
-            
-            if result.get("is_match", False):
-                print("Successfully logged in!")
-                return True
-            
-            if attempt < self.max_login_attempts:
-                if result.get("is_login_error", False):
-                    print(f"Login failed (attempt {attempt}). Retrying...")
-                    time.sleep(3)
-                    continue
-                else:
-                    current_state = self.detect_current_state()
-                    if current_state == "logged_in":
-                        print("Successfully logged in!")
-                        return True
-                    elif current_state == "password" or current_state == "lms":
-                        print(f"Still at login screen (attempt {attempt}). Retrying...")
-                    else:
-                        print(f"Unknown state after login attempt {attempt}. Retrying...")
-            else:
-                print(f"Failed to log in after {self.max_login_attempts} attempts. Please check credentials or try manually.")
-                return False
+        
+        state = STATE_ALIASES.get(current_state, current_state)
+        if self.login_flow.run(state, "logged_in", redetect=self.detect_flow_state):
+            print("Successfully logged in!")
+        else:
+            print(f"Failed to log in after {self.max_login_attempts} attempts. Please check credentials or try manually.")
+        print(self.login_flow.report())
 
     def openapp(self):
         try:
@@ -0,0 +1,181 @@
+import time
+import hashlib
+import numpy as np
+from PIL import Image
+
+# Declarative login flow: each transition runs an action and then polls a cheap postcondition
+# (a difference hash of one screen region against the expected screen) until it holds, instead
+# of sleeping for a fixed time and re-running full state detection.
+
+
+def distinct_references(references):
+    """Drop reference images that are byte-identical to another state's; such states cannot be told
+    apart locally and are left to the LLM comparison"""
+    by_digest = {}
+    for state, path in references.items():
+        with open(path, "rb") as f:
+            by_digest.setdefault(hashlib.sha1(f.read()).hexdigest(), []).append(state)
+    kept = dict(references)
+    for states in by_digest.values():
+        if len(states) > 1:
+            print(f"Reference images for {', '.join(states)} are identical; not using them for those states")
+            for state in states:
+                kept.pop(state)
+    return kept
+
+
+def region_hash(image, hash_size=16):
+    gray = np.asarray(image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR), dtype=np.int16)
+    return (gray[:, 1:] > gray[:, :-1]).flatten()
+
+
+def fraction_box(size, region):
+    """(left, top, width, height) pixels for a (left, top, right, bottom) fraction region"""
+    width, height = size
+    left, top, right, bottom = region
+    return int(left * width), int(top * height), max(1, int((right - left) * width)), max(1, int((bottom - top) * height))
+
+
+class ScreenCheck:
+    """True when the live screen region hashes within max_distance bits of the same region of a reference"""
+
+    def __init__(self, reference_path, region=(0.0, 0.0, 1.0, 1.0), max_distance=20, hash_size=16):
+        self.region = region
+        self.max_distance = max_distance
+        self.hash_size = hash_size
+        self.reference = self.image_hash(Image.open(reference_path))
+        self.last_distance = None
+
+    def image_hash(self, image):
+        x, y, w, h = fraction_box(image.size, self.region)
+        return region_hash(image.crop((x, y, x + w, y + h)), self.hash_size)
+
+    def distance_to(self, other_path):
+        """Bits between this reference and the same region of another reference image"""
+        return int(np.count_nonzero(self.image_hash(Image.open(other_path)) != self.reference))
+
+    def __call__(self):
+        import pyautogui
+
+        box = fraction_box(pyautogui.size(), self.region)
+        live = region_hash(pyautogui.screenshot(region=box), self.hash_size)
+        self.last_distance = int(np.count_nonzero(live != self.reference))
+        return self.last_distance <= self.max_distance
+
+
+def reject_ambiguous_checks(transitions, checks, references):
+    """Drop postconditions that would already hold on the transition's source screen: a target
+    reference within max_distance of the source reference proves nothing about the action"""
+    for transition in transitions:
+        check = checks.get(transition.target)
+        source = references.get(transition.source)
+        if check is None or source is None:
+            continue
+        distance = check.distance_to(source)
+        if distance <= check.max_distance:
+            print(f"{transition.name}: reference for {transition.target} is {distance} bits from {transition.source} "
+                  f"(limit {check.max_distance}); re-detecting the screen instead")
+            checks.pop(transition.target)
+    return checks
+
+
+class Transition:
+    """idempotent=False marks actions that must not be repeated blindly (typing a password):
+    before a retry the screen is re-detected and the action only runs again from its source state"""
+
+    def __init__(self, name, source, target, action, timeout=10.0, retries=0, idempotent=True):
+        self.name = name
+        self.source = source
+        self.target = target
+        self.action = action
+        self.timeout = timeout
+        self.retries = retries
+        self.idempotent = idempotent
+
+
+class LoginFlow:
+    """State graph over transitions; checks maps a state name to its postcondition callable"""
+
+    def __init__(self, transitions, checks, interval=0.25, max_replans=2, settle=3.0):
+        self.edges = {t.source: t for t in transitions}
+        self.checks = checks
+        self.interval = interval
+        self.settle = settle
+        self.max_replans = max_replans
+        self.stats = {t.name: {"latencies": [], "retries": 0, "failures": 0} for t in transitions}
+
+    def wait_for(self, state, timeout, redetect=None):
+        check = self.checks.get(state)
+        if check is None:
+            # No cheap check for this screen: wait as long as the old fixed sleeps did, then ask the
+            # full detector; without one the state cannot be confirmed
+            if redetect is None:
+                print(f"No check or detector for {state}; cannot confirm it")
+                return False
+            time.sleep(min(timeout, self.settle))
+            return redetect() == state
+        deadline = time.monotonic() + timeout
+        while True:
+            if check():
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(self.interval)
+
+    def attempt(self, transition, redetect=None):
+        """Run a transition with its retries; returns the state it ended in (target on success),
+        or None when unknown"""
+        stats = self.stats[transition.name]
+        for attempt in range(1, transition.retries + 2):
+            if attempt > 1 and not transition.idempotent:
+                # The previous attempt may have landed anywhere; never retype into an unknown screen
+                state = redetect() if redetect else None
+                print(f"{transition.name}: re-detected {state} before retrying")
+                if state == transition.target:
+                    return state
+                if state != transition.source:
+                    stats["failures"] += 1
+                    return state
+            start = time.perf_counter()
+            transition.action()
+            if self.wait_for(transition.target, transition.timeout, redetect):
+                elapsed = time.perf_counter() - start
+                stats["latencies"].append(elapsed)
+                print(f"{transition.name}: reached {transition.target} in {elapsed:.2f}s (attempt {attempt})")
+                return transition.target
+            stats["retries"] += 1
+            check = self.checks.get(transition.target)
+            distance = getattr(check, "last_distance", None)
+            print(f"{transition.name}: {transition.target} not reached after {transition.timeout:g}s "
+                  f"(attempt {attempt}, hash distance {distance})")
+        stats["failures"] += 1
+        return None
+
+    def run(self, state, goal, redetect=None):
+        """Drive the graph from state to goal; on a dead end, re-detect the screen up to max_replans times"""
+        replans = 0
+        while state != goal:
+            transition = self.edges.get(state)
+            reached = self.attempt(transition, redetect) if transition else None
+            if transition and reached == transition.target:
+                state = reached
+                continue
+            if redetect is None or replans >= self.max_replans:
+                print(f"Login flow stopped at state {state}")
+                return False
+            replans += 1
+            if reached is not None and transition and reached != transition.source:
+                # attempt() already re-detected the screen
+                state = reached
+            else:
+                state = redetect()
+            print(f"Re-detected state: {state}")
+        return True
+
+    def report(self):
+        lines = []
+        for name, stats in self.stats.items():
+            latencies = stats["latencies"]
+            mean = f"{sum(latencies) / len(latencies):.2f}s" if latencies else "n/a"
+            lines.append(f"  {name}: {len(latencies)} ok, mean {mean}, {stats['retries']} retries, {stats['failures']} failures")
+        return "Login flow transitions:\n" + "\n".join(lines)
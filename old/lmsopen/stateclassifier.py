@@ -0,0 +1,69 @@
+import time
+import numpy as np
+from PIL import Image
+
+# Local screen-state classifier: compares a screenshot against the reference images with a
+# difference hash, a thumbnail correlation (coarse template match) and a colour histogram.
+# A full-screen classification takes a few milliseconds, so the LLM is only asked when the
+# best reference does not clearly beat the runner-up.
+
+HASH_SIZE = 16
+THUMB_SIZE = (48, 27)
+HIST_SIZE = (96, 54)
+WEIGHTS = {"hash": 0.4, "thumb": 0.3, "hist": 0.3}
+
+
+def image_features(image):
+    gray = image.convert("L")
+    diff = np.asarray(gray.resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR), dtype=np.int16)
+    bits = (diff[:, 1:] > diff[:, :-1]).flatten()
+    thumb = np.asarray(gray.resize(THUMB_SIZE, Image.BILINEAR), dtype=np.float32).flatten()
+    thumb = (thumb - thumb.mean()) / (thumb.std() + 1e-6)
+    # 8 levels per channel -> 512-bin colour histogram
+    rgb = (np.asarray(image.convert("RGB").resize(HIST_SIZE, Image.BILINEAR)) // 32).reshape(-1, 3).astype(np.int32)
+    hist = np.bincount(rgb[:, 0] * 64 + rgb[:, 1] * 8 + rgb[:, 2], minlength=512) / float(len(rgb))
+    return {"hash": bits, "thumb": thumb, "hist": hist}
+
+
+def similarity(a, b):
+    """Weighted similarity in [0, 1] between two feature sets"""
+    hash_score = 1.0 - float(np.mean(a["hash"] != b["hash"]))
+    thumb_score = max(0.0, float(a["thumb"] @ b["thumb"]) / len(a["thumb"]))
+    hist_score = float(np.minimum(a["hist"], b["hist"]).sum())
+    return WEIGHTS["hash"] * hash_score + WEIGHTS["thumb"] * thumb_score + WEIGHTS["hist"] * hist_score
+
+
+class StateClassifier:
+    """Nearest-reference classifier over {state: reference image path}"""
+
+    def __init__(self, references, min_score=0.75, margin=0.15):
+        self.min_score = min_score
+        self.margin = margin
+        self.references = {}
+        for state, path in references.items():
+            try:
+                self.references[state] = image_features(Image.open(path))
+            except Exception as e:
+                print(f"State classifier: could not load reference for {state} ({path}): {e}")
+        states = list(self.references)
+        for i, a in enumerate(states):
+            for b in states[i + 1:]:
+                if similarity(self.references[a], self.references[b]) > 1.0 - self.margin:
+                    print(f"State classifier: references for {a} and {b} look alike; those screens will need the LLM")
+
+    def classify(self, image):
+        """Returns (state or None, confidence 0..1, candidate states worth asking the LLM about)"""
+        start = time.perf_counter()
+        features = image_features(image)
+        scores = sorted(((similarity(features, ref), state) for state, ref in self.references.items()), reverse=True)
+        elapsed = (time.perf_counter() - start) * 1000
+        if not scores or scores[0][0] < self.min_score:
+            best = f"{scores[0][1]} {scores[0][0]:.2f}" if scores else "no references"
+            print(f"State classifier: no reference matched ({best}) in {elapsed:.0f} ms")
+            return None, 0.0, []
+        best_score, state = scores[0]
+        runner_up = scores[1][0] if len(scores) > 1 else 0.0
+        confidence = best_score * min(1.0, (best_score - runner_up) / self.margin)
+        candidates = [s for score, s in scores if best_score - score < self.margin]
+        print(f"State classifier: {state} score {best_score:.2f}, confidence {confidence:.2f} in {elapsed:.0f} ms")
+        return state, confidence, candidates